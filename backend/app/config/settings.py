@@ -66,6 +66,256 @@ class Settings(BaseSettings):
         description="Modèle à utiliser"
     )
 
+    # Client HTTP partagé (pool de connexions keep-alive)
+    BACKBOARD_HTTP2: bool = Field(
+        default=True,
+        description="Active HTTP/2 vers Backboard (multiplexage sur une seule connexion)"
+    )
+    BACKBOARD_MAX_CONNECTIONS: int = Field(
+        default=100,
+        description="Nombre maximum de connexions simultanées vers Backboard"
+    )
+    BACKBOARD_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=20,
+        description="Nombre de connexions gardées ouvertes au repos"
+    )
+    BACKBOARD_KEEPALIVE_EXPIRY: float = Field(
+        default=30.0,
+        description="Durée (secondes) avant fermeture d'une connexion inactive"
+    )
+    BACKBOARD_CONNECT_TIMEOUT: float = Field(
+        default=5.0,
+        description="Timeout d'établissement de connexion (secondes)"
+    )
+    BACKBOARD_POOL_TIMEOUT: float = Field(
+        default=10.0,
+        description="Attente maximale d'une connexion libre dans le pool (secondes)"
+    )
+    BACKBOARD_TIMEOUT: float = Field(
+        default=60.0,
+        description="Timeout de lecture pour les appels non streamés (secondes)"
+    )
+    BACKBOARD_STREAM_TIMEOUT: float = Field(
+        default=120.0,
+        description="Timeout de lecture pour les réponses streamées (secondes)"
+    )
+    BACKBOARD_STREAM_MAX_DURATION: float = Field(
+        default=600.0,
+        description="Durée totale maximale d'une réponse streamée (secondes, 0 = illimitée)"
+    )
+
+    # Résilience (retries, disjoncteur, hedging, deadlines)
+    BACKBOARD_DEADLINE: float = Field(
+        default=45.0,
+        description="Budget total d'un appel Backboard court (threads, lectures), retries inclus (secondes)"
+    )
+    BACKBOARD_MESSAGE_DEADLINE: float = Field(
+        default=90.0,
+        description="Budget total d'une génération non streamée (message, résultats de tools) ; jamais sous BACKBOARD_TIMEOUT (secondes)"
+    )
+    BACKBOARD_RETRY_ATTEMPTS: int = Field(
+        default=2,
+        description="Nombre de retries sur les appels idempotents"
+    )
+    BACKBOARD_RETRY_BASE_DELAY: float = Field(
+        default=0.2,
+        description="Délai de base du backoff exponentiel (secondes)"
+    )
+    BACKBOARD_RETRY_MAX_DELAY: float = Field(
+        default=2.0,
+        description="Délai maximum entre deux essais (secondes)"
+    )
+    BACKBOARD_BREAKER_FAILURE_THRESHOLD: int = Field(
+        default=5,
+        description="Échecs consécutifs avant ouverture du disjoncteur"
+    )
+    BACKBOARD_BREAKER_RESET_TIMEOUT: float = Field(
+        default=30.0,
+        description="Durée d'ouverture du disjoncteur avant un appel sonde (secondes)"
+    )
+    BACKBOARD_HEDGE_DELAY: Optional[float] = Field(
+        default=None,
+        description="Délai avant une requête de couverture sur les lectures (None = désactivé)"
+    )
+
+    # Réserve de threads pré-créés (création de session instantanée)
+    BACKBOARD_THREAD_POOL_SIZE: int = Field(
+        default=0,
+        description="Nombre de threads Backboard pré-créés par worker (0 = désactivé)"
+    )
+    BACKBOARD_THREAD_POOL_MAX_AGE: float = Field(
+        default=3600,
+        description="Âge maximum (secondes) d'un thread inutilisé avant recyclage"
+    )
+    BACKBOARD_THREAD_POOL_REFILL_INTERVAL: float = Field(
+        default=5,
+        description="Intervalle (secondes) entre deux passes de remplissage"
+    )
+
+    # Ordonnanceur d'admission (équité entre utilisateurs, poids par plan)
+    BACKBOARD_SCHEDULER_MAX_CONCURRENCY: int = Field(
+        default=32,
+        description="Requêtes LLM simultanées maximum par worker"
+    )
+    BACKBOARD_SCHEDULER_MAX_QUEUE: int = Field(
+        default=256,
+        description="Requêtes en attente maximum par worker (au-delà : 503)"
+    )
+    BACKBOARD_SCHEDULER_MAX_QUEUE_PER_USER: int = Field(
+        default=4,
+        description="Requêtes en attente maximum par utilisateur (au-delà : 429)"
+    )
+    BACKBOARD_SCHEDULER_QUEUE_TIMEOUT: float = Field(
+        default=30,
+        description="Attente maximum (secondes) dans la file avant un 503"
+    )
+    BACKBOARD_SCHEDULER_PLAN_WEIGHTS: dict[str, float] = Field(
+        default={"free": 1, "starter": 2, "pro": 4, "enterprise": 8},
+        description="Poids du round robin par plan d'abonnement"
+    )
+
+    # ============================================================
+    # MENTORAT
+    # ============================================================
+
+    MENTORING_MAX_TOOL_ITERATIONS: int = Field(
+        default=5,
+        description="Nombre maximum d'allers-retours de tools par message"
+    )
+    MENTORING_ANSWER_CACHE_ENABLED: bool = Field(
+        default=False,
+        description="Active le cache des réponses aux questions récurrentes"
+    )
+    MENTORING_ANSWER_CACHE_MAX_ENTRIES: int = Field(
+        default=5000,
+        description="Nombre maximum de réponses en cache (éviction LRU)"
+    )
+    MENTORING_ANSWER_CACHE_TTL: float = Field(
+        default=86400.0,
+        description="Durée de vie d'une réponse en cache (secondes)"
+    )
+    MENTORING_ANSWER_CACHE_MAX_QUESTION_LENGTH: int = Field(
+        default=300,
+        description="Longueur maximale d'une question éligible au cache (caractères)"
+    )
+    MENTORING_IDEMPOTENCY_TTL: float = Field(
+        default=300.0,
+        description="Durée (secondes) pendant laquelle une réponse est rejouée pour un même Idempotency-Key"
+    )
+    MENTORING_RECONCILE_LIMIT: int = Field(
+        default=200,
+        description="Nombre de messages relus depuis Backboard lors d'une réconciliation"
+    )
+    MENTORING_RECONCILE_INTERVAL: float = Field(
+        default=300.0,
+        description="Délai minimal (secondes) entre deux réconciliations automatiques d'une même session"
+    )
+    MENTORING_RECONCILE_MATCH_TOLERANCE: float = Field(
+        default=30.0,
+        description="Écart maximal (secondes) entre les dates locale et Backboard d'un même message"
+    )
+    MENTORING_STREAM_GRACE: float = Field(
+        default=10,
+        description="Délai (secondes) avant d'annuler un stream qui n'a plus d'abonné"
+    )
+    MENTORING_STREAM_RETENTION: float = Field(
+        default=60,
+        description="Durée (secondes) de conservation d'un stream terminé pour les reconnexions"
+    )
+    MENTORING_WRITE_BEHIND_MAX_QUEUE: int = Field(
+        default=1000,
+        description="Échanges en attente d'écriture maximum par worker (au-delà : attente)"
+    )
+    MENTORING_WRITE_BEHIND_BATCH_SIZE: int = Field(
+        default=100,
+        description="Nombre maximum d'échanges écrits par lot"
+    )
+    MENTORING_WRITE_BEHIND_FLUSH_INTERVAL: float = Field(
+        default=0.05,
+        description="Délai (secondes) laissé au remplissage d'un lot avant écriture"
+    )
+    MENTORING_SESSION_COUNT_TTL: float = Field(
+        default=30,
+        description="Durée (secondes) de cache du total de sessions dans la liste paginée"
+    )
+    MENTORING_EXPORT_BATCH_SIZE: int = Field(
+        default=500,
+        description="Lignes lues par lot depuis le curseur serveur lors d'un export"
+    )
+
+    # ============================================================
+    # CRÉDITS
+    # ============================================================
+
+    CREDITS_RESERVATION_TTL: float = Field(
+        default=600,
+        description="Durée de vie (secondes) d'une réservation de crédits non réglée"
+    )
+    CREDITS_PER_TOOL_ITERATION: int = Field(
+        default=0,
+        description="Crédits facturés par aller-retour de tool en plus du message"
+    )
+    CREDITS_SWEEP_INTERVAL: float = Field(
+        default=30,
+        description="Intervalle (secondes) entre deux passages du sweeper de réservations expirées"
+    )
+    CREDITS_SWEEP_BATCH_SIZE: int = Field(
+        default=500,
+        description="Réservations expirées rendues par lot"
+    )
+    CREDITS_BALANCE_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Nombre maximum de soldes en cache local (éviction LRU)"
+    )
+    CREDITS_BALANCE_CACHE_TTL: float = Field(
+        default=300,
+        description="Durée de vie (secondes) d'un solde en cache (borne les écritures hors application)"
+    )
+    CREDITS_BALANCE_CACHE_REDIS_URL: Optional[str] = Field(
+        default=None,
+        description="Redis partagé entre workers pour le cache des soldes (ex: redis://localhost:6379/0)"
+    )
+    CREDITS_BALANCE_CACHE_LOCAL_TTL: float = Field(
+        default=2,
+        description="Durée de vie (secondes) du cache local quand Redis est configuré"
+    )
+    CREDITS_LEDGER_MAINTENANCE_INTERVAL: float = Field(
+        default=3600,
+        description="Intervalle (secondes) de la maintenance du ledger (partitions, snapshots, archivage) ; 0 = désactivée"
+    )
+    CREDITS_LEDGER_PARTITIONS_AHEAD: int = Field(
+        default=3,
+        description="Nombre de partitions mensuelles du ledger créées à l'avance"
+    )
+    CREDITS_LEDGER_RETENTION_MONTHS: int = Field(
+        default=24,
+        description="Mois de ledger conservés dans la table principale avant archivage"
+    )
+    CREDITS_LEDGER_ARCHIVE_DROP: bool = Field(
+        default=False,
+        description="Supprime les partitions archivées au lieu de seulement les détacher"
+    )
+    CREDITS_SNAPSHOT_MIN_TRANSACTIONS: int = Field(
+        default=100,
+        description="Transactions depuis le dernier snapshot à partir desquelles un nouveau snapshot est pris"
+    )
+    CREDITS_SNAPSHOT_LAG: float = Field(
+        default=300,
+        description="Retard (secondes) du cutoff des snapshots sur l'heure courante (transactions en cours)"
+    )
+    CREDITS_SNAPSHOT_BATCH_SIZE: int = Field(
+        default=1000,
+        description="Utilisateurs traités par lot lors d'un snapshot"
+    )
+    CREDITS_REFILL_INTERVAL: float = Field(
+        default=3600,
+        description="Intervalle (secondes) entre deux lancements du job de recharge mensuelle ; 0 = désactivé"
+    )
+    CREDITS_REFILL_BATCH_SIZE: int = Field(
+        default=5000,
+        description="Abonnés rechargés par lot (une requête et une transaction par lot)"
+    )
+
     # ============================================================
     # AUTHENTIFICATION JWT
     # ============================================================
@@ -85,6 +335,72 @@ class Settings(BaseSettings):
         default=7,
         description="Durée de vie du refresh token en jours"
     )
+    JWT_ACCESS_TOKEN_CLAIMS: bool = Field(
+        default=True,
+        description="Embarque is_active/email_verified/plan dans l'access token (authentification sans BD)"
+    )
+    JWT_VERIFIED_TOKEN_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Access tokens déjà vérifiés gardés en cache par worker (0 = désactivé)"
+    )
+    AUTH_TOKEN_DENYLIST_REDIS_URL: Optional[str] = Field(
+        default=None,
+        description="Redis partagé entre workers pour la révocation des access tokens (sinon : par worker)"
+    )
+
+    # Hachage des mots de passe (coûts : voir scripts/calibrate_password_hash.py)
+    PASSWORD_HASH_SCHEME: str = Field(
+        default="bcrypt",
+        description="Schéma des nouveaux hashs : bcrypt | argon2 (les autres restent vérifiables)"
+    )
+    PASSWORD_BCRYPT_ROUNDS: Optional[int] = Field(
+        default=None,
+        description="Coût bcrypt (log2 des itérations, None = défaut passlib)"
+    )
+    PASSWORD_ARGON2_TIME_COST: Optional[int] = Field(
+        default=None,
+        description="Argon2 : nombre de passes (None = défaut passlib)"
+    )
+    PASSWORD_ARGON2_MEMORY_COST: Optional[int] = Field(
+        default=None,
+        description="Argon2 : mémoire en KiB (None = défaut passlib)"
+    )
+    PASSWORD_ARGON2_PARALLELISM: Optional[int] = Field(
+        default=None,
+        description="Argon2 : nombre de lanes (None = défaut passlib)"
+    )
+
+    # Exécution du hachage (bcrypt hors de la boucle d'événements)
+    PASSWORD_HASH_EXECUTOR: str = Field(
+        default="thread",
+        description="Exécuteur du hachage : thread | process"
+    )
+    PASSWORD_HASH_WORKERS: int = Field(
+        default=min(4, os.cpu_count() or 1),
+        description="Hachages simultanés maximum par worker"
+    )
+    PASSWORD_HASH_MAX_QUEUE: int = Field(
+        default=64,
+        description="Hachages en attente maximum par worker (au-delà : 503)"
+    )
+
+    # Cache de l'utilisateur authentifié (get_current_user)
+    AUTH_PRINCIPAL_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Nombre maximum d'utilisateurs en cache local (éviction LRU, 0 = désactivé)"
+    )
+    AUTH_PRINCIPAL_CACHE_TTL: float = Field(
+        default=30,
+        description="Durée de vie (secondes) d'un utilisateur en cache (0 = désactivé)"
+    )
+    AUTH_PRINCIPAL_CACHE_REDIS_URL: Optional[str] = Field(
+        default=None,
+        description="Redis partagé entre workers pour le cache des utilisateurs (ex: redis://localhost:6379/0)"
+    )
+    AUTH_PRINCIPAL_CACHE_LOCAL_TTL: float = Field(
+        default=5,
+        description="Durée de vie (secondes) du cache local quand Redis est configuré"
+    )
 
     # ============================================================
     # CORS - Cross-Origin Resource Sharing
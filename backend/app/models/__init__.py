@@ -18,6 +18,7 @@ from .enums import (
     SubscriptionStatusEnum,
     PlanTypeEnum,
     CreditTransactionTypeEnum,
+    CreditReservationStatusEnum,
     LearningStyleEnum,
     SessionStatusEnum,
     MessageRoleEnum,
@@ -74,6 +75,9 @@ from .billing import (
     UserSubscription,
     UserCredits,
     CreditTransaction,
+    CreditReservation,
+    CreditBalanceSnapshot,
+    CreditRefillRun,
 )
 
 # Badges
@@ -120,6 +124,7 @@ __all__ = [
     "SubscriptionStatusEnum",
     "PlanTypeEnum",
     "CreditTransactionTypeEnum",
+    "CreditReservationStatusEnum",
     "LearningStyleEnum",
     "SessionStatusEnum",
     "MessageRoleEnum",
@@ -162,6 +167,9 @@ __all__ = [
     "UserSubscription",
     "UserCredits",
     "CreditTransaction",
+    "CreditReservation",
+    "CreditBalanceSnapshot",
+    "CreditRefillRun",
     
     # Badges
     "Badge",
@@ -219,6 +227,9 @@ MODEL_CATEGORIES = {
         UserSubscription,
         UserCredits,
         CreditTransaction,
+        CreditReservation,
+        CreditBalanceSnapshot,
+        CreditRefillRun,
     ],
     "badges": [
         Badge,
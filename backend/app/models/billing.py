@@ -11,13 +11,15 @@ from uuid import UUID
 
 from sqlalchemy import (
     Boolean, Date, DateTime, ForeignKey, Integer, 
-    Numeric, String, Text, func, Index
+    Numeric, String, Text, func, text, Index
 )
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, UUIDMixin, TimestampMixin
-from .enums import SubscriptionStatusEnum, PlanTypeEnum, CreditTransactionTypeEnum
+from .enums import (
+    SubscriptionStatusEnum, PlanTypeEnum, CreditTransactionTypeEnum, CreditReservationStatusEnum
+)
 
 if TYPE_CHECKING:
     from .auth import User
@@ -227,6 +229,16 @@ class UserSubscription(Base, UUIDMixin, TimestampMixin):
         back_populates="subscriptions"
     )
     
+    # ===== Index =====
+    __table_args__ = (
+        # Job de recharge : abonnements rechargeables, par user_id (keyset)
+        Index(
+            "idx_user_subscriptions_refillable",
+            "user_id",
+            postgresql_where=text("status IN ('ACTIVE', 'TRIALING')")
+        ),
+    )
+    
     @property
     def is_active(self) -> bool:
         """Vérifie si l'abonnement est actif."""
@@ -444,10 +456,11 @@ class CreditTransaction(Base, UUIDMixin):
     )
     
     # ===== Timestamps =====
+    # Clé de partitionnement : incluse dans la clé primaire (id, created_at)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=func.now(),
-        nullable=False
+        primary_key=True
     )
     
     # ===== Relations =====
@@ -462,6 +475,11 @@ class CreditTransaction(Base, UUIDMixin):
     # ===== Index =====
     __table_args__ = (
         Index("idx_credit_trans_created", "created_at", postgresql_ops={"created_at": "DESC"}),
+        # Historique / audit d'un utilisateur depuis son dernier snapshot
+        Index("idx_credit_trans_user_created", "user_id", "created_at"),
+        # Partitions mensuelles (voir services/ledger_service.py) ;
+        # created_at fait partie de la clé primaire
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
     
     @property
@@ -533,3 +551,200 @@ class CreditTransaction(Base, UUIDMixin):
             stripe_payment_intent_id=stripe_payment_intent_id,
             balance_after=balance_after
         )
+
+
+class CreditReservation(Base, UUIDMixin):
+    """
+    Réservation de crédits (hold) pour un échange en cours.
+
+    Les crédits sont retirés du solde à la réservation, puis à la fin :
+    settle (montant réel débité, reste rendu), release (tout rendu) ou
+    expiration (rendu par le sweeper). La répartition bonus / balance est
+    conservée pour rendre les crédits dans leur compartiment d'origine.
+    """
+
+    __tablename__ = "credit_reservations"
+
+    # ===== Clés étrangères =====
+    user_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    session_id: Mapped[Optional[UUID]] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("mentoring_sessions.id", ondelete="SET NULL"),
+        nullable=True
+    )
+
+    # ===== Montants =====
+    amount: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False
+    )
+    # Part de amount prise sur les crédits bonus (le reste sur credits_balance)
+    bonus_amount: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+    settled_amount: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True
+    )
+
+    # ===== Statut =====
+    status: Mapped[CreditReservationStatusEnum] = mapped_column(
+        default=CreditReservationStatusEnum.HELD,
+        nullable=False
+    )
+    description: Mapped[Optional[str]] = mapped_column(
+        Text,
+        nullable=True
+    )
+
+    # ===== Timestamps =====
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=func.now(),
+        nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False
+    )
+    closed_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True
+    )
+
+    # ===== Index =====
+    __table_args__ = (
+        # Sweeper : réservations encore bloquées, par échéance
+        Index(
+            "idx_credit_reservations_held_expires",
+            "expires_at",
+            postgresql_where=text("status = 'HELD'")
+        ),
+    )
+
+    @property
+    def balance_amount(self) -> int:
+        """Part de amount prise sur credits_balance."""
+        return self.amount - self.bonus_amount
+
+
+class CreditBalanceSnapshot(Base, UUIDMixin):
+    """
+    Point de contrôle du solde d'un utilisateur selon le ledger.
+
+    Solde à une date = dernier snapshot antérieur + somme des transactions
+    postérieures (created_at > snapshot_at) : un audit ne relit que la fin
+    du ledger, et les partitions anciennes peuvent être archivées.
+    """
+
+    __tablename__ = "credit_balance_snapshots"
+
+    # ===== Clés étrangères =====
+    user_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    # ===== Solde =====
+    balance: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False
+    )
+    # Transactions intégrées depuis le snapshot précédent
+    transactions_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+
+    # ===== Timestamps =====
+    # Couvre toutes les transactions avec created_at <= snapshot_at
+    snapshot_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=func.now(),
+        nullable=False
+    )
+
+    # ===== Index =====
+    __table_args__ = (
+        Index(
+            "idx_credit_snapshots_user_at",
+            "user_id",
+            "snapshot_at",
+            unique=True,
+            postgresql_ops={"snapshot_at": "DESC"}
+        ),
+    )
+
+
+class CreditRefillRun(Base, UUIDMixin):
+    """
+    Exécution du job de recharge mensuelle (une par jour de traitement).
+
+    Le curseur (dernier user_id traité) est avancé dans la même transaction
+    que chaque lot de recharges : après un crash, le job reprend au lot
+    suivant sans rien recharger deux fois.
+    """
+
+    __tablename__ = "credit_refill_runs"
+
+    # ===== Période =====
+    run_date: Mapped[date] = mapped_column(
+        Date,
+        unique=True,
+        nullable=False
+    )
+
+    # ===== Progression =====
+    cursor: Mapped[Optional[UUID]] = mapped_column(
+        PG_UUID(as_uuid=True),
+        nullable=True
+    )
+    users_refilled: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+    credits_granted: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+    batches: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+
+    # ===== Timestamps =====
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=func.now(),
+        nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True
+    )
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished_at is not None
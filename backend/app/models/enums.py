@@ -76,6 +76,14 @@ class CreditTransactionTypeEnum(str, Enum):
     ADJUSTMENT = "adjustment"                     # Ajustement manuel admin
 
 
+class CreditReservationStatusEnum(str, Enum):
+    """Statut d'une réservation de crédits."""
+    HELD = "held"            # Crédits bloqués, en attente
+    SETTLED = "settled"      # Montant réel débité, reste rendu
+    RELEASED = "released"    # Annulée (erreur, déconnexion), tout rendu
+    EXPIRED = "expired"      # Expirée, rendue par le sweeper
+
+
 class LearningStyleEnum(str, Enum):
     """Styles d'apprentissage."""
     VISUAL = "visual"
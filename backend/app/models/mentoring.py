@@ -9,10 +9,10 @@ from typing import TYPE_CHECKING, Optional
 from uuid import UUID
 
 from sqlalchemy import (
-    Boolean, DateTime, ForeignKey, Integer, 
+    Boolean, Computed, DateTime, ForeignKey, Integer, 
     String, Text, func, Index
 )
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, UUIDMixin
@@ -23,6 +23,18 @@ if TYPE_CHECKING:
     from .skills import Skill, Topic
 
 
+def search_vector_expression(column: str) -> str:
+    """
+    Expression de la colonne générée de recherche plein texte : le texte est
+    indexé avec les configurations française et anglaise (les conversations
+    mélangent les deux). Maintenue par Postgres à chaque INSERT / UPDATE.
+    """
+    return (
+        f"to_tsvector('french'::regconfig, coalesce({column}, '')) || "
+        f"to_tsvector('english'::regconfig, coalesce({column}, ''))"
+    )
+
+
 class MentoringSession(Base, UUIDMixin):
     """
     Session de mentorat (conversation avec le mentor IA).
@@ -55,6 +67,12 @@ class MentoringSession(Base, UUIDMixin):
         String(255),
         nullable=True
     )
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(search_vector_expression("title"), persisted=True),
+        nullable=True,
+        deferred=True
+    )
     
     # ===== Statut =====
     status: Mapped[SessionStatusEnum] = mapped_column(
@@ -133,6 +151,18 @@ class MentoringSession(Base, UUIDMixin):
     # ===== Index =====
     __table_args__ = (
         Index("idx_sessions_last_message", "last_message_at", postgresql_ops={"last_message_at": "DESC"}),
+        # Liste paginée (keyset) des sessions d'un utilisateur, avec ou sans filtre de statut
+        Index(
+            "idx_sessions_user_status_last_message",
+            "user_id", "status", "last_message_at", "id",
+            postgresql_ops={"last_message_at": "DESC", "id": "DESC"}
+        ),
+        Index(
+            "idx_sessions_user_last_message",
+            "user_id", "last_message_at", "id",
+            postgresql_ops={"last_message_at": "DESC", "id": "DESC"}
+        ),
+        Index("idx_sessions_search", "search_vector", postgresql_using="gin"),
     )
     
     @property
@@ -215,6 +245,13 @@ class SessionMessage(Base, UUIDMixin):
 
     # ===== Contenu =====
     role: Mapped[MessageRoleEnum] = mapped_column(nullable=False)
+    content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(search_vector_expression("content"), persisted=True),
+        nullable=True,
+        deferred=True
+    )
 
     # ===== Métriques IA =====
     llm_used: Mapped[Optional[LLMProviderEnum]] = mapped_column(nullable=True)
@@ -236,6 +273,8 @@ class SessionMessage(Base, UUIDMixin):
 
     __table_args__ = (
         Index("idx_messages_created", "created_at"),
+        Index("idx_messages_session_created", "session_id", "created_at", "id"),
+        Index("idx_messages_search", "search_vector", postgresql_using="gin"),
     )
 
     tool_called: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -5,7 +5,7 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
 from sqlalchemy import select
 
-from app.utils.dependencies import DBSession, CurrentUser
+from app.utils.dependencies import DBSession, CurrentUser, CurrentUserForUpdate
 from app.schemas.assessment import (
     AssessmentStartRequest,
     AssessmentStartResponse,
@@ -36,6 +36,7 @@ from app.services.assessment_service import (
     calculate_question_xp,
     determine_level_from_score,
 )
+from app.services.principal_cache import principal_cache
 
 
 router = APIRouter(prefix="/assessment", tags=["Assessment"])
@@ -64,7 +65,7 @@ def question_to_response(question: Question, number: int = 1) -> QuestionForTest
 @router.post("/start", response_model=AssessmentStartResponse | AssessmentResumeResponse)
 async def start_assessment(
     data: AssessmentStartRequest,
-    current_user: CurrentUser,
+    current_user: CurrentUserForUpdate,
     db: DBSession
 ):
     """
@@ -297,7 +298,7 @@ async def get_hint(
 @router.post("/{session_id}/complete", response_model=AssessmentResultsResponse)
 async def complete_assessment(
     session_id: UUID,
-    current_user: CurrentUser,
+    current_user: CurrentUserForUpdate,
     db: DBSession
 ):
     """Termine l'assessment et calcule les résultats."""
@@ -356,6 +357,7 @@ async def complete_assessment(
         pass
     
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
     
     # 8. Construire les résultats
     # TODO: Calculer topics_breakdown depuis UserQuestionHistory
@@ -6,7 +6,7 @@ Routes pour l'authentification et la gestion des sessions.
 
 from datetime import datetime, timedelta, timezone
 from sys import displayhook
-from typing import Annotated, Dict
+from typing import Annotated, Dict, Optional
 from uuid import UUID
 import requests
 
@@ -19,9 +19,11 @@ from fastapi.responses import RedirectResponse
 from app.utils.dependencies import (
     DBSession, 
     CurrentUser, 
+    CurrentUserForUpdate,
     RateLimiter, 
     ClientInfo,
     get_current_user_optional,
+    oauth2_scheme_optional,
 )
 from app.schemas.auth import *
 from app.schemas.base import MessageResponse
@@ -29,6 +31,11 @@ from app.models import User, EmailVerificationToken, PasswordResetToken, Refresh
 from app.models import UserProfile, UserCredits, UserSubscription, SubscriptionPlan
 from app.utils.security import *
 from app.services.email_service import *
+from app.services.credit_service import get_cached_balance
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.token_denylist import token_denylist
+from app.services.llm_scheduler import get_user_plan
 from app.config.settings import settings
 
 import urllib.parse
@@ -72,7 +79,7 @@ async def register(
     # Créer l'utilisateur
     user = User(
         email=data.email.lower(),
-        password_hash=hash_password(data.password),
+        password_hash=await password_hasher.hash(data.password),
         email_verified=False,
     )
     db.add(user)
@@ -155,12 +162,15 @@ async def login(
             detail="Email ou mot de passe incorrect"
         )
     
-    # Vérifier le mot de passe
-    if not verify_password(data.password, user.password_hash):
+    # Vérifier le mot de passe (rehash si le schéma ou le coût a changé)
+    valid, new_hash = await password_hasher.verify_and_update(data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect"
         )
+    if new_hash is not None:
+        user.password_hash = new_hash
     
     # Vérifier que le compte est actif
     if not user.is_active:
@@ -170,7 +180,7 @@ async def login(
         )
     
     # Générer les tokens
-    access_token = create_access_token(subject=str(user.id))
+    access_token = await issue_access_token(user, db)
     refresh_token_value = create_refresh_token(subject=str(user.id))
     
     # Stocker le refresh token
@@ -186,6 +196,7 @@ async def login(
     user.last_login_at = datetime.utcnow()
     
     await db.commit()
+    await principal_cache.invalidate(user.id)
     
     return LoginResponse(
         access_token=access_token,
@@ -330,13 +341,17 @@ async def link_account(
     if not user:
         raise HTTPException(404, "Utilisateur non trouvé")
 
-    # Vérifier le mot de passe
-    if not verify_password(data.password, user.password_hash):
+    # Vérifier le mot de passe (rehash si le schéma ou le coût a changé)
+    valid, new_hash = await password_hasher.verify_and_update(data.password, user.password_hash)
+    if not valid:
         raise HTTPException(401, "Mot de passe incorrect")
+    if new_hash is not None:
+        user.password_hash = new_hash
 
     # Lier le compte Google
     user.google_id = link_data["google_id"]
     await db.commit()
+    await principal_cache.invalidate(user.id)
 
     # Générer tokens
     tokens : TokenResponse = await generate_and_store_tokens(user, db, request)
@@ -354,14 +369,19 @@ async def link_account(
 )
 async def logout(
     db: DBSession,
-    data: RefreshTokenRequest
+    data: RefreshTokenRequest,
+    access_token: Annotated[Optional[str], Depends(oauth2_scheme_optional)] = None
 ):
-    """Déconnexion (révocation du refresh token)."""
+    """Déconnexion (révocation du refresh token, et de l'access token s'il est fourni)."""
+    
+    # L'access token reste valide jusqu'à son expiration : le mettre en denylist
+    payload = decode_access_token(access_token) if access_token else None
+    if payload is not None and payload.jti is not None:
+        await token_denylist.revoke_token(payload.jti, payload.exp)
     
     # Trouver et révoquer le refresh token
     token_hash = hash_token(data.refresh_token)
     stmt = select(RefreshToken).where(
-        RefreshToken.user_id == current_user.id,
         RefreshToken.token_hash == token_hash,
         RefreshToken.revoked_at.is_(None)
     )
@@ -418,7 +438,7 @@ async def refresh_token(
         )
     
     # Générer un nouveau access token
-    access_token = create_access_token(subject=str(user.id))
+    access_token = await issue_access_token(user, db)
     
     return TokenResponse(
         access_token=access_token,
@@ -477,7 +497,7 @@ async def verify_email(
     verification_token.used_at = datetime.utcnow()
     
     # Générer les tokens
-    access_token = create_access_token(subject=str(user.id))
+    access_token = await issue_access_token(user, db)
     refresh_token_value = create_refresh_token(subject=str(user.id))
     
     refresh_token = RefreshToken(
@@ -489,6 +509,7 @@ async def verify_email(
     db.add(refresh_token)
     
     await db.commit()
+    await principal_cache.invalidate(user.id)
 
     stmt = select(UserProfile).where(UserProfile.user_id == user.id)
     result = await db.execute(stmt)
@@ -642,7 +663,7 @@ async def reset_password(
     
     # Mettre à jour le mot de passe
     user = await db.get(User, reset_token.user_id)
-    user.password_hash = hash_password(data.new_password)
+    user.password_hash = await password_hasher.hash(data.new_password)
     reset_token.used_at = datetime.utcnow()
     
     # Révoquer tous les refresh tokens (force reconnexion)
@@ -655,6 +676,8 @@ async def reset_password(
         token.revoke()
     
     await db.commit()
+    await principal_cache.invalidate(user.id)
+    await token_denylist.revoke_user(user.id)
     
     return MessageResponse(message="Mot de passe mis à jour. Veuillez vous reconnecter.")
 
@@ -699,9 +722,7 @@ async def get_me(
     # ==========================
     # 3. CRÉDITS
     # ==========================
-    stmt = select(UserCredits).where(UserCredits.user_id == current_user.id)
-    result = await db.execute(stmt)
-    credits_obj = result.scalar_one_or_none()
+    credits_obj = await get_cached_balance(current_user.id, db)
     # J'utilise 'credits_balance' car c'est le nom du champ dans votre modèle UserCredits précédent
     credits_balance = credits_obj.credits_balance if credits_obj else 0
 
@@ -783,7 +804,7 @@ async def get_me(
 )
 async def change_password(
     data: ChangePasswordRequest,
-    current_user: CurrentUser,
+    current_user: CurrentUserForUpdate,
     db: DBSession
 ):
     """Change le mot de passe."""
@@ -794,14 +815,18 @@ async def change_password(
             detail="Compte OAuth sans mot de passe"
         )
     
-    if not verify_password(data.current_password, current_user.password_hash):
+    if not await password_hasher.verify(data.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Mot de passe actuel incorrect"
         )
     
-    current_user.password_hash = hash_password(data.new_password)
+    current_user.password_hash = await password_hasher.hash(data.new_password)
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
+    # Access tokens émis avant le changement refusés ; les clients en
+    # obtiennent un nouveau avec leur refresh token
+    await token_denylist.revoke_user(current_user.id)
     
     return MessageResponse(message="Mot de passe mis à jour")
 
@@ -887,13 +912,21 @@ async def revoke_session(
 
 # === HELPERS ===
 
+async def issue_access_token(user: User, db: AsyncSession) -> str:
+    """Access token de l'utilisateur, avec ses claims si JWT_ACCESS_TOKEN_CLAIMS."""
+    extra_data = None
+    if settings.JWT_ACCESS_TOKEN_CLAIMS:
+        extra_data = build_user_claims(user, await get_user_plan(user.id, db))
+    return create_access_token(subject=str(user.id), extra_data=extra_data)
+
+
 async def generate_and_store_tokens(
         user: User,
         db: AsyncSession,
         request: Request
 ) -> dict:
     """Génère et stocke les tokens."""
-    access_token = create_access_token(subject=str(user.id))
+    access_token = await issue_access_token(user, db)
     refresh_token_value = create_refresh_token(str(user.id))
 
     # Device info
@@ -7,6 +7,20 @@ from app.schemas.backboard import (
     AnswerEvaluationArgs
 )
 from app.services.backboard_tools import handle_tool_call
+from app.services.backboard_service import backboard_service
+from app.services.backboard_thread_pool import thread_pool
+from app.services.llm_scheduler import llm_scheduler
+from app.services.stream_hub import stream_hub
+from app.services.write_behind import message_writer
+from app.services.credit_sweeper import reservation_sweeper
+from app.services.credit_cache import credit_cache
+from app.services.ledger_service import ledger_maintenance
+from app.services.refill_service import refill_job
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.token_denylist import token_denylist
+from app.utils.security import verified_tokens
+from app.services.chat_service import message_flights, session_locks, answer_cache
 from app.utils.dependencies import (
     DBSession,
     CurrentUser,
@@ -62,4 +76,36 @@ async def backboard_tool_call(
     return ToolCallResponse(
         success=True,
         result=result
-    )
\ No newline at end of file
+    )
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+async def backboard_stats(current_user: CurrentUser):
+    """
+    Statistiques des appels vers Backboard
+    (pool de connexions, disjoncteur, déduplication des envois).
+    """
+    return {
+        "pool": backboard_service.pool_stats(),
+        "breaker": backboard_service.breaker.stats(),
+        "thread_pool": thread_pool.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "mentoring": {
+            "single_flight": message_flights.stats(),
+            "locked_sessions": len(session_locks),
+            "answer_cache": answer_cache.stats(),
+            "streams": stream_hub.stats(),
+            "write_behind": message_writer.stats(),
+        },
+        "credits": {
+            "reservations": reservation_sweeper.stats(),
+            "balance_cache": credit_cache.stats(),
+            "ledger": ledger_maintenance.stats(),
+            "refill": refill_job.stats(),
+        },
+        "auth": {
+            "password_hasher": password_hasher.stats(),
+            "principal_cache": principal_cache.stats(),
+            "token_denylist": token_denylist.stats(),
+            "verified_tokens": verified_tokens.stats(),
+        },
+    }
@@ -1,14 +1,16 @@
 # routers/mentoring.py
 
-from datetime import datetime
-from uuid import UUID
+import hashlib
+from datetime import datetime, timezone
+from uuid import UUID, uuid4
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, func, tuple_
+from sqlalchemy.orm import joinedload
 
-from app.utils.dependencies import DBSession, CurrentUser, VerifiedUser
+from app.utils.dependencies import DBSession, CurrentUser, VerifiedUser, ClaimsUser
 from app.schemas.mentoring import (
     SessionCreateRequest,
     SessionCreateResponse,
@@ -20,6 +22,8 @@ from app.schemas.mentoring import (
     MessageResponse,
     SessionFeedbackRequest,
     MessageFeedbackRequest,
+    SearchHit,
+    SearchResponse,
 )
 from app.models import (
     MentoringSession,
@@ -27,9 +31,34 @@ from app.models import (
     Skill,
     Topic,
     UserProfile,
+    MessageRoleEnum,
 )
 from app.services.backboard_service import backboard_service
-from app.services.credit_service import consume_credits, get_credits_balance
+from app.services.backboard_thread_pool import thread_pool
+from app.services.llm_scheduler import llm_scheduler, get_user_plan
+from app.services.credit_service import (
+    get_credits_balance,
+    reserve_credits,
+    settle_credits,
+    release_credits
+)
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.services.chat_service import (
+    ask_mentor,
+    session_locks,
+    message_flights,
+    reconcile_session_messages,
+    reconcile_due,
+    encode_cursor,
+    session_counts,
+    search_conversations,
+    decode_cursor,
+    TOOL_LOOP_FALLBACK_REPLY,
+)
+from app.services.stream_hub import stream_hub, parse_event_id
+from app.services.write_behind import PendingTurn, message_writer, llm_provider
+from app.services.export_service import stream_export, decode_export_cursor, chunked, gzip_stream
 
 router = APIRouter(prefix="/mentoring", tags=["Mentoring"])
 
@@ -79,24 +108,135 @@ async def session_to_response(session: MentoringSession) -> SessionResponse:
     )
 
 
+def message_to_response(message: SessionMessage) -> MessageResponse:
+    """Convertit un SessionMessage stocké en response."""
+    return MessageResponse(
+        id=message.id,
+        role=getattr(message.role, "value", message.role),
+        content=message.content,
+        tokens_used=message.tokens_used or 0,
+        credits_cost=message.credits_cost,
+        llm_used=getattr(message.llm_used, "value", message.llm_used),
+        tool_called=message.tool_called,
+        created_at=message.created_at
+    )
+
+
+def build_turn(
+        session_id: UUID,
+        user_content: str,
+        user_tokens: int,
+        user_sent_at: datetime,
+        assistant_content: str,
+        assistant_tokens: int,
+        model: Optional[str] = None,
+        tool_called: Optional[str] = None,
+        credits_cost: int = 1
+) -> tuple[dict, dict]:
+    """
+    Lignes SessionMessage (user, assistant) d'un échange, pour l'écriture
+    différée. IDs et dates fixés ici : la réponse n'attend pas l'INSERT.
+    """
+    user_row = {
+        "id": uuid4(),
+        "session_id": session_id,
+        "role": MessageRoleEnum.USER,
+        "content": user_content,
+        "tokens_used": int(user_tokens or 0),
+        "credits_cost": 0,
+        "created_at": user_sent_at,
+    }
+    assistant_row = {
+        "id": uuid4(),
+        "session_id": session_id,
+        "role": MessageRoleEnum.ASSISTANT,
+        "content": assistant_content,
+        "tokens_used": int(assistant_tokens or 0),
+        "credits_cost": credits_cost,
+        "llm_used": llm_provider(model),
+        "tool_called": tool_called,
+        "created_at": datetime.now(timezone.utc),
+    }
+    return user_row, assistant_row
+
+
+def message_credit_cost(tool_iterations: int = 0) -> int:
+    """Coût d'un échange : 1 crédit, plus un supplément par aller-retour de tools."""
+    return 1 + tool_iterations * settings.CREDITS_PER_TOOL_ITERATION
+
+
+def row_to_response(row: dict) -> MessageResponse:
+    """Convertit une ligne de build_turn en response."""
+    return MessageResponse(
+        id=row["id"],
+        role=row["role"].value,
+        content=row["content"],
+        tokens_used=row["tokens_used"],
+        credits_cost=row["credits_cost"],
+        llm_used=row["llm_used"].value if row.get("llm_used") else None,
+        tool_called=row.get("tool_called"),
+        created_at=row["created_at"]
+    )
+
+
+async def get_session_or_404(session_id: UUID, user_id: UUID, db: DBSession) -> MentoringSession:
+    """Récupère une session de l'utilisateur ou lève une 404."""
+    stmt = select(MentoringSession).options(
+        joinedload(MentoringSession.skill),
+        joinedload(MentoringSession.topic)
+    ).where(
+        MentoringSession.id == session_id,
+        MentoringSession.user_id == user_id
+    )
+    result = await db.execute(stmt)
+    session = result.scalar_one_or_none()
+
+    if not session:
+        raise HTTPException(404, "Session non trouvée")
+
+    return session
+
+
 # === ENDPOINTS ===
 
 @router.post("/sessions", response_model=SessionCreateResponse, status_code=201)
 async def create_session(
         data: SessionCreateRequest,
         current_user: VerifiedUser,
-        db: DBSession
+        db: DBSession,
+        background_tasks: BackgroundTasks
 ):
     """
     Crée une nouvelle session de mentorat.
-    Consomme 1 crédit pour le premier message.
+    Consomme 1 crédit pour le premier message (plus les allers-retours de tools).
     """
 
-    # 1. Vérifier les crédits
-    credits_balance = await get_credits_balance(current_user.id, db)
-    if credits_balance < 1:
-        raise HTTPException(402, "Crédits insuffisants")
+    title = data.initial_message[:100] + "..." if len(data.initial_message) > 100 else data.initial_message
+
+    # 1. Réserver les crédits (coût maximum, réglé après la réponse)
+    reservation_id = await reserve_credits(
+        user_id=current_user.id,
+        amount=message_credit_cost(settings.MENTORING_MAX_TOOL_ITERATIONS),
+        description=f"Session mentorat: {title}",
+        db=db
+    )
+    try:
+        return await _create_session(data, current_user, db, background_tasks, title, reservation_id)
+    except BaseException:
+        # Crédits rendus si la session n'a pas pu être créée
+        await release_credits(reservation_id)
+        raise
+
 
+async def _create_session(
+        data: SessionCreateRequest,
+        current_user,
+        db: DBSession,
+        background_tasks: BackgroundTasks,
+        title: str,
+        reservation_id: UUID
+) -> SessionCreateResponse:
+    """Création de la session une fois les crédits réservés."""
     # 2. Récupérer skill et topic si fournis
     skill = None
     topic = None
@@ -117,212 +257,330 @@ async def create_session(
     # 4. Créer le thread Backboard
     user_context = build_user_context(current_user, skill, topic, profile)
 
-    thread_data = await backboard_service.create_thread(
-        user_id=str(current_user.id),
-        metadata={
-            "skill": skill.slug if skill else None,
-            "topic": topic.slug if topic else None,
-            "user_level": profile.years_of_experience if profile else 0
-        }
-    )
-
-    # 5. Créer la session en BD
-    session = MentoringSession(
-        user_id=current_user.id,
-        skill_id=skill.id if skill else None,
-        topic_id=topic.id if topic else None,
-        backboard_thread_id=thread_data["thread_id"],
-        title=data.initial_message[:100] + "..." if len(data.initial_message) > 100 else data.initial_message
-    )
-    db.add(session)
-    await db.flush()
-
-    # 6. Envoyer le premier message à Backboard
-    response_data = await backboard_service.send_message(
-        thread_id=thread_data["thread_id"],
-        content=data.initial_message,
-        user_context=user_context
-    )
+    thread_metadata = {
+        "skill": skill.slug if skill else None,
+        "topic": topic.slug if topic else None,
+        "user_level": profile.years_of_experience if profile else 0
+    }
 
-    print( " =========================================================== ")
-    print("  =========================================================== ")
-    print("                    RÉPONSE DE BACKBOARD ")
-    print("  =========================================================== ")
-    print("  =========================================================== ")
-    print(response_data)
-    print("  =========================================================== ")
-    print("  =========================================================== ")
-
-
-    if response_data.get("tool_called"):
-        print()
-        tool_response = await handle_tool_call(
-            ToolCallRequest(
-                tool=response_data["tool_called"],
-                arguments=response_data.get("arguments", {})
-            ),
-            current_user=current_user
+    # Thread pré-créé si disponible : métadonnées mises à jour après la réponse
+    thread_id = thread_pool.claim()
+    if thread_id:
+        background_tasks.add_task(
+            thread_pool.assign,
+            thread_id,
+            {**thread_metadata, "user_id": str(current_user.id)}
         )
-
-        await backboard_service.send_tool_result(
-            thread_id=thread_id,
-            tool_name=response_data["tool_called"],
-            result=tool_response
+    else:
+        thread_data = await backboard_service.create_thread(
+            user_id=str(current_user.id),
+            metadata=thread_metadata,
+            # Clé d'idempotence : rend la création rejouable en cas d'échec réseau
+            client_key=str(uuid4())
         )
+        thread_id = thread_data["thread_id"]
+
+    # Jusqu'au commit, un échec laisse le thread sans session : il est supprimé
+    try:
+        # 5. Créer la session en BD
+        session = MentoringSession(
+            user_id=current_user.id,
+            skill_id=skill.id if skill else None,
+            topic_id=topic.id if topic else None,
+            backboard_thread_id=thread_id,
+            title=title
+        )
+        db.add(session)
+        await db.flush()
 
-        final_response = await backboard_service.send_message(
+        # 6. Envoyer le premier message à Backboard (tools et cache inclus)
+        user_sent_at = datetime.now(timezone.utc)
+        response_data = await ask_mentor(
             thread_id=thread_id,
-            content="Continue"  # ou "continue"
+            content=data.initial_message,
+            user_context=user_context,
+            user_id=current_user.id,
+            bypass_cache=data.bypass_cache,
+            plan=await get_user_plan(current_user.id, db)
         )
 
+        print( " =========================================================== ")
+        print("  =========================================================== ")
+        print("                    RÉPONSE DE BACKBOARD ")
+        print("  =========================================================== ")
+        print("  =========================================================== ")
+        print(response_data)
+        print("  =========================================================== ")
+        print("  =========================================================== ")
+
+
+        # 7. Compteurs initiaux (écrits avec le règlement des crédits)
+        credits_cost = message_credit_cost(response_data.get("tool_iterations", 0))
+        session.message_count = 2
+        session.credits_consumed = credits_cost
+        session.last_message_at = datetime.now(timezone.utc)
+
+        # 8. Régler la réservation (même transaction que la session)
+        credits_remaining = await settle_credits(
+            reservation_id,
+            credits_cost,
+            session_id=session.id,
+            db=db
+        )
+        if credits_remaining is None:
+            await db.commit()
+    except BaseException:
+        thread_pool.discard(thread_id)
+        raise
+
+    if credits_remaining is None:
+        credits_remaining = await get_credits_balance(current_user.id, db)
+    await db.refresh(session)
+    session_counts.invalidate(current_user.id)
 
-    # 7. Consommer les crédits
-    credits_remaining = await consume_credits(
-        user_id=current_user.id,
-        amount=1,
-        description=f"Session mentorat: {session.title}",
-        session_id=session.id,
-        db=db
-    )
-
-    # 8. Enregistrer les messages (métadonnées)
-    user_msg = SessionMessage(
+    # 9. Messages : écriture différée (hors chemin de la réponse)
+    user_row, assistant_row = build_turn(
         session_id=session.id,
-        role="user",
-        tokens_used=response_data.get("input_tokens", 0),
-        credits_cost=0
+        user_content=data.initial_message,
+        user_tokens=response_data.get("input_tokens", 0),
+        user_sent_at=user_sent_at,
+        assistant_content=response_data.get("content") or TOOL_LOOP_FALLBACK_REPLY,
+        assistant_tokens=response_data.get("output_tokens", 0),
+        model=response_data.get("model", "claude"),
+        tool_called=response_data.get("tool_called"),
+        credits_cost=credits_cost
     )
-    db.add(user_msg)
-
-    assistant_msg = SessionMessage(
+    await message_writer.submit(PendingTurn(
         session_id=session.id,
-        role="assistant",
-        tokens_used=response_data.get("output_tokens", 0),
-        credits_cost=1,
-        llm_used=response_data.get("model", "claude"),
-        tool_called=response_data.get("tool_called")
-    )
-    db.add(assistant_msg)
-
-    # 9. Mettre à jour la session
-    session.message_count = 2
-    session.credits_consumed = 1
-    session.last_message_at = datetime.utcnow()
-
-    await db.commit()
-    await db.refresh(session)
+        messages=[user_row, assistant_row],
+        message_count=0,
+        credits_consumed=0,
+        last_message_at=assistant_row["created_at"]
+    ))
 
     # 10. Retourner la réponse
     return SessionCreateResponse(
         session=await session_to_response(session),
-        assistant_response=MessageResponse(
-            id=assistant_msg.id,
-            role="assistant",
-            content=response_data["content"],
-            tokens_used=assistant_msg.tokens_used,
-            credits_cost=assistant_msg.credits_cost,
-            llm_used=assistant_msg.llm_used,
-            tool_called=assistant_msg.tool_called,
-            created_at=assistant_msg.created_at
-        ),
+        assistant_response=row_to_response(assistant_row),
         credits_remaining=credits_remaining
     )
 
 
 @router.get("/sessions", response_model=SessionListResponse)
 async def list_sessions(
-        current_user: CurrentUser,
+        current_user: ClaimsUser,
         db: DBSession,
         status: Optional[str] = Query(None, pattern="^(active|completed|abandoned)$"),
         skill_slug: Optional[str] = None,
         limit: int = Query(20, ge=1, le=50),
-        offset: int = Query(0, ge=0)
+        cursor: Optional[str] = Query(None, description="Curseur next_cursor de la page précédente"),
+        include_total: bool = Query(True, description="Inclure le total (mis en cache quelques instants)"),
+        offset: int = Query(0, ge=0, deprecated=True)
 ):
-    """Liste les sessions de mentorat de l'utilisateur."""
+    """
+    Liste les sessions de mentorat de l'utilisateur (plus récentes d'abord).
 
-    stmt = select(MentoringSession).where(
-        MentoringSession.user_id == current_user.id
-    )
+    Pagination keyset sur (last_message_at, id) : passer next_cursor dans
+    `cursor` pour la page suivante. Le total est mis en cache par filtre.
+    """
+
+    filters = [MentoringSession.user_id == current_user.id]
 
     if status:
-        stmt = stmt.where(MentoringSession.status == status)
+        filters.append(MentoringSession.status == status)
 
-    if skill_slug:
-        stmt = stmt.join(Skill).where(Skill.slug == skill_slug)
+    stmt = select(MentoringSession).options(
+        joinedload(MentoringSession.skill),
+        joinedload(MentoringSession.topic)
+    ).where(*filters)
 
-    stmt = stmt.order_by(desc(MentoringSession.last_message_at))
+    if skill_slug:
+        stmt = stmt.join(Skill, MentoringSession.skill_id == Skill.id).where(Skill.slug == skill_slug)
+
+    # Total (avant la pagination)
+    total = None
+    if include_total:
+        total = session_counts.get(current_user.id, (status, skill_slug))
+        if total is None:
+            count_stmt = select(func.count()).select_from(MentoringSession).where(*filters)
+            if skill_slug:
+                count_stmt = count_stmt.join(
+                    Skill, MentoringSession.skill_id == Skill.id
+                ).where(Skill.slug == skill_slug)
+            total = (await db.execute(count_stmt)).scalar()
+            session_counts.set(current_user.id, (status, skill_slug), total)
+
+    # Page (keyset sur last_message_at, id)
+    if cursor:
+        cursor_last_message_at, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(MentoringSession.last_message_at, MentoringSession.id)
+            < tuple_(cursor_last_message_at, cursor_id)
+        )
+    elif offset:
+        stmt = stmt.offset(offset)
 
-    # Count total
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total = (await db.execute(count_stmt)).scalar()
+    stmt = stmt.order_by(
+        desc(MentoringSession.last_message_at),
+        desc(MentoringSession.id)
+    ).limit(limit + 1)
 
-    # Paginate
-    stmt = stmt.offset(offset).limit(limit + 1)
     result = await db.execute(stmt)
     sessions = result.scalars().all()
 
     has_more = len(sessions) > limit
     sessions = sessions[:limit]
 
+    next_cursor = None
+    if has_more and sessions:
+        next_cursor = encode_cursor(sessions[-1].last_message_at, sessions[-1].id)
+
     return SessionListResponse(
         sessions=[await session_to_response(s) for s in sessions],
         total=total,
-        has_more=has_more
+        has_more=has_more,
+        next_cursor=next_cursor
     )
 
 
-@router.get("/sessions/{session_id}", response_model=SessionDetailResponse)
-async def get_session(
-        session_id: UUID,
-        current_user: CurrentUser,
-        db: DBSession
+@router.get("/search", response_model=SearchResponse)
+async def search_sessions(
+        current_user: ClaimsUser,
+        db: DBSession,
+        q: str = Query(..., min_length=2, max_length=200, description="Termes recherchés (syntaxe web : \"phrase exacte\", OR, -exclusion)"),
+        lang: Optional[str] = Query(None, pattern="^(fr|en)$", description="Langue de la recherche (défaut : français et anglais)"),
+        limit: int = Query(20, ge=1, le=50),
+        offset: int = Query(0, ge=0, le=200)
 ):
-    """Récupère une session avec son historique de messages."""
+    """
+    Recherche plein texte dans les conversations de l'utilisateur
+    (contenu des messages et titres des sessions), par pertinence.
+    """
+    hits = await search_conversations(
+        user_id=current_user.id,
+        text=q,
+        db=db,
+        language=lang,
+        limit=limit + 1,
+        offset=offset
+    )
 
-    # 1. Récupérer la session
-    stmt = select(MentoringSession).where(
-        MentoringSession.id == session_id,
-        MentoringSession.user_id == current_user.id
+    return SearchResponse(
+        query=q,
+        results=[
+            SearchHit(
+                kind=hit["kind"],
+                session_id=hit["session_id"],
+                session_title=hit["session_title"],
+                message_id=hit["message_id"],
+                role=getattr(hit["role"], "value", hit["role"]),
+                snippet=hit["snippet"] or "",
+                rank=hit["rank"],
+                created_at=hit["created_at"]
+            )
+            for hit in hits[:limit]
+        ],
+        has_more=len(hits) > limit
     )
-    result = await db.execute(stmt)
-    session = result.scalar_one_or_none()
 
-    if not session:
-        raise HTTPException(404, "Session non trouvée")
 
-    # 2. Récupérer les messages depuis Backboard
-    messages_data = await backboard_service.get_thread_messages(
-        thread_id=session.backboard_thread_id
+@router.get("/export")
+async def export_sessions(
+        current_user: ClaimsUser,
+        format: str = Query("ndjson", pattern="^(ndjson|gzip)$"),
+        cursor: Optional[str] = Query(None, description="Curseur de la dernière ligne reçue (reprise)")
+):
+    """
+    Exporte toutes les sessions et messages de l'utilisateur en NDJSON
+    (ou NDJSON gzip), en streaming depuis un curseur serveur.
+
+    Chaque ligne porte un "cursor" : en cas de coupure, relancer avec le
+    curseur de la dernière ligne reçue pour reprendre juste après.
+    """
+    if cursor:
+        decode_export_cursor(cursor)
+
+    lines = stream_export(current_user.id, cursor)
+    filename = f"mentoring-export-{datetime.now(timezone.utc):%Y%m%d}.ndjson"
+
+    if format == "gzip":
+        return StreamingResponse(
+            gzip_stream(lines),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'}
+        )
+
+    return StreamingResponse(
+        chunked(lines),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
-    # 3. Récupérer les métadonnées locales
+
+@router.get("/sessions/{session_id}", response_model=SessionDetailResponse)
+async def get_session(
+        session_id: UUID,
+        current_user: ClaimsUser,
+        db: DBSession,
+        background_tasks: BackgroundTasks,
+        limit: int = Query(50, ge=1, le=200),
+        before: Optional[str] = Query(None, description="Curseur next_cursor de la page précédente"),
+        reconcile: bool = Query(False, description="Resynchroniser l'historique avec Backboard en arrière-plan")
+):
+    """
+    Récupère une session avec son historique de messages.
+
+    L'historique est servi depuis Postgres (plus récents d'abord par page,
+    renvoyés dans l'ordre chronologique). Pagination keyset : passer
+    next_cursor dans `before` pour obtenir les messages plus anciens.
+    """
+
+    # 1. Récupérer la session (après les écritures différées en attente)
+    await message_writer.settled(session_id)
+    session = await get_session_or_404(session_id, current_user.id, db)
+
+    # 2. Page de messages locaux (keyset sur created_at, id)
     stmt = select(SessionMessage).where(
         SessionMessage.session_id == session_id
-    ).order_by(SessionMessage.created_at)
+    )
+
+    if before:
+        cursor_created_at, cursor_id = decode_cursor(before)
+        stmt = stmt.where(
+            tuple_(SessionMessage.created_at, SessionMessage.id) < tuple_(cursor_created_at, cursor_id)
+        )
+
+    stmt = stmt.order_by(
+        desc(SessionMessage.created_at),
+        desc(SessionMessage.id)
+    ).limit(limit + 1)
+
     result = await db.execute(stmt)
-    local_messages = {str(m.id): m for m in result.scalars().all()}
-
-    # 4. Fusionner les données
-    messages = []
-    for msg in messages_data:
-        messages.append(MessageResponse(
-            id=msg.get("id", UUID("00000000-0000-0000-0000-000000000000")),
-            role=msg["role"],
-            content=msg["content"],
-            tokens_used=msg.get("tokens_used", 0),
-            credits_cost=msg.get("credits_cost", 0),
-            llm_used=msg.get("model"),
-            tool_called=msg.get("tool_called"),
-            created_at=msg.get("created_at", datetime.utcnow())
-        ))
+    page = result.scalars().all()
 
-    # 5. Crédits restants
+    has_more = len(page) > limit
+    page = list(reversed(page[:limit]))
+
+    next_cursor = encode_cursor(page[0].created_at, page[0].id) if has_more and page else None
+
+    # 3. Réconciliation optionnelle (ou messages sans contenu, antérieurs au
+    # stockage local : au plus une fois par MENTORING_RECONCILE_INTERVAL)
+    if reconcile or (any(m.content is None for m in page) and reconcile_due(session.id)):
+        background_tasks.add_task(
+            reconcile_session_messages,
+            session_id=session.id,
+            thread_id=session.backboard_thread_id
+        )
+
+    # 4. Crédits restants
     credits_remaining = await get_credits_balance(current_user.id, db)
 
     return SessionDetailResponse(
         session=await session_to_response(session),
-        messages=messages,
-        credits_remaining=credits_remaining
+        messages=[message_to_response(m) for m in page],
+        credits_remaining=credits_remaining,
+        has_more=has_more,
+        next_cursor=next_cursor
     )
 
 
@@ -331,122 +589,122 @@ async def send_message(
         session_id: UUID,
         data: MessageSendRequest,
         current_user: VerifiedUser,
-        db: DBSession
+        db: DBSession,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Envoie un message dans une session existante."""
-
-    # 1. Récupérer la session
-    stmt = select(MentoringSession).where(
-        MentoringSession.id == session_id,
-        MentoringSession.user_id == current_user.id
-    )
-    result = await db.execute(stmt)
-    session = result.scalar_one_or_none()
+    """
+    Envoie un message dans une session existante.
 
-    if not session:
-        raise HTTPException(404, "Session non trouvée")
+    Les doublons en cours (double-clic, retry client) sont coalescés : même
+    session + même contenu, ou même en-tête Idempotency-Key, partagent un
+    seul appel au LLM, un seul débit de crédits et la même réponse.
+    Avec Idempotency-Key, la réponse est aussi rejouée après coup
+    pendant MENTORING_IDEMPOTENCY_TTL secondes.
+    """
+    # Propriété vérifiée avant de rejoindre un envoi en cours ou rejoué
+    await get_session_or_404(session_id, current_user.id, db)
 
-    if session.status != "active":
-        raise HTTPException(400, "Session non active")
+    if idempotency_key:
+        flight_key = (current_user.id, session_id, "idempotency", idempotency_key)
+        retain_seconds = settings.MENTORING_IDEMPOTENCY_TTL
+    else:
+        flight_key = (current_user.id, session_id, "content", hashlib.sha256(data.content.encode()).hexdigest())
+        retain_seconds = None
 
-    # 2. Vérifier les crédits
-    credits_balance = await get_credits_balance(current_user.id, db)
-    if credits_balance < 1:
-        raise HTTPException(402, "Crédits insuffisants")
+    async def run() -> MessageSendResponse:
+        # Session BD propre au vol : partagé (et protégé de l'annulation),
+        # il peut survivre à la requête qui l'a lancé
+        async with AsyncSessionLocal() as flight_db:
+            response = await _send_message(session_id, data, current_user, flight_db)
+            await flight_db.commit()
+            return response
 
-    # 3. Construire le contexte
-    user_context = build_user_context(
-        current_user,
-        session.skill,
-        session.topic,
-        current_user.profile
-    )
+    return await message_flights.do(flight_key, run, retain_seconds=retain_seconds)
 
-    # 4. Envoyer à Backboard
-    response_data = await backboard_service.send_message(
-        thread_id=session.backboard_thread_id,
-        content=data.content,
-        user_context=user_context
-    )
 
-    if response_data.get("tool_called"):
-        tool_response = await handle_tool_call(
-            ToolCallRequest(
-                tool=response_data["tool_called"],
-                arguments=response_data.get("arguments", {})
-            ),
-            current_user=current_user
+async def _send_message(
+        session_id: UUID,
+        data: MessageSendRequest,
+        current_user,
+        db: DBSession
+) -> MessageSendResponse:
+    """
+    Traitement d'un envoi, sérialisé par session : un seul message à la
+    fois dans un thread Backboard, et des compteurs relus sous le verrou.
+    """
+    async with session_locks.hold(session_id):
+        # 1. Récupérer la session (après les écritures différées en attente)
+        await message_writer.settled(session_id)
+        session = await get_session_or_404(session_id, current_user.id, db)
+
+        if session.status != "active":
+            raise HTTPException(400, "Session non active")
+
+        # 2. Réserver les crédits (coût maximum, réglé après la réponse)
+        reservation_id = await reserve_credits(
+            user_id=current_user.id,
+            amount=message_credit_cost(settings.MENTORING_MAX_TOOL_ITERATIONS),
+            description="Message mentorat",
+            session_id=session.id,
+            db=db
         )
 
-        await backboard_service.send_tool_result(
-            thread_id=thread_id,
-            tool_name=response_data["tool_called"],
-            result=tool_response
+        # 3. Construire le contexte
+        user_context = build_user_context(
+            current_user,
+            session.skill,
+            session.topic,
+            current_user.profile
         )
 
-        final_response = await backboard_service.send_message(
-            thread_id=thread_id,
-            content="Continue"  # ou "continue"
+        # 4. Envoyer à Backboard (tools et cache inclus)
+        user_sent_at = datetime.now(timezone.utc)
+        try:
+            response_data = await ask_mentor(
+                thread_id=session.backboard_thread_id,
+                content=data.content,
+                user_context=user_context,
+                user_id=current_user.id,
+                bypass_cache=data.bypass_cache,
+                plan=await get_user_plan(current_user.id, db)
+            )
+        except BaseException:
+            await release_credits(reservation_id)
+            raise
+
+        # 5. Régler la réservation (coût réel selon les tools appelés)
+        credits_cost = message_credit_cost(response_data.get("tool_iterations", 0))
+        credits_remaining = await settle_credits(reservation_id, credits_cost, db=db)
+        if credits_remaining is None:
+            credits_remaining = await get_credits_balance(current_user.id, db)
+
+        # 6. Messages et compteurs : écriture différée (hors chemin de la réponse)
+        user_row, assistant_row = build_turn(
+            session_id=session.id,
+            user_content=data.content,
+            user_tokens=response_data.get("input_tokens", 0),
+            user_sent_at=user_sent_at,
+            assistant_content=response_data.get("content") or TOOL_LOOP_FALLBACK_REPLY,
+            assistant_tokens=response_data.get("output_tokens", 0),
+            model=response_data.get("model"),
+            tool_called=response_data.get("tool_called"),
+            credits_cost=credits_cost
         )
+        await message_writer.submit(PendingTurn(
+            session_id=session.id,
+            messages=[user_row, assistant_row],
+            message_count=2,
+            credits_consumed=credits_cost,
+            last_message_at=assistant_row["created_at"]
+        ))
 
-    # 5. Consommer les crédits
-    credits_remaining = await consume_credits(
-        user_id=current_user.id,
-        amount=1,
-        description=f"Message mentorat",
-        session_id=session.id,
-        db=db
-    )
-
-    # 6. Enregistrer les métadonnées
-    user_msg = SessionMessage(
-        session_id=session.id,
-        role="user",
-        tokens_used=response_data.get("input_tokens", 0),
-        credits_cost=0
-    )
-    db.add(user_msg)
-
-    assistant_msg = SessionMessage(
-        session_id=session.id,
-        role="assistant",
-        tokens_used=response_data.get("output_tokens", 0),
-        credits_cost=1,
-        llm_used=response_data.get("model"),
-        tool_called=response_data.get("tool_called")
-    )
-    db.add(assistant_msg)
-
-    # 7. Mettre à jour la session
-    session.message_count += 2
-    session.credits_consumed += 1
-    session.last_message_at = datetime.utcnow()
-
-    await db.commit()
-
-    # 8. Retourner la réponse
-    return MessageSendResponse(
-        user_message=MessageResponse(
-            id=user_msg.id,
-            role="user",
-            content=data.content,
-            tokens_used=user_msg.tokens_used,
-            credits_cost=0,
-            created_at=user_msg.created_at
-        ),
-        assistant_response=MessageResponse(
-            id=assistant_msg.id,
-            role="assistant",
-            content=response_data["content"],
-            tokens_used=assistant_msg.tokens_used,
-            credits_cost=1,
-            llm_used=assistant_msg.llm_used,
-            tool_called=assistant_msg.tool_called,
-            created_at=assistant_msg.created_at
-        ),
-        credits_remaining=credits_remaining,
-        session_credits_total=session.credits_consumed
-    )
+        # 7. Retourner la réponse
+        return MessageSendResponse(
+            user_message=row_to_response(user_row),
+            assistant_response=row_to_response(assistant_row),
+            credits_remaining=credits_remaining,
+            session_credits_total=session.credits_consumed + credits_cost
+        )
 
 
 @router.post("/sessions/{session_id}/messages/stream")
@@ -454,16 +712,45 @@ async def send_message_stream(
         session_id: UUID,
         data: MessageSendRequest,
         current_user: VerifiedUser,
-        db: DBSession
+        db: DBSession,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+        last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
     """
     Envoie un message et stream la réponse.
     Utilise Server-Sent Events (SSE).
+
+    La génération est diffusée par le stream hub : un autre onglet ou une
+    reconnexion (GET sur la même URL, ou même Idempotency-Key) se rattache
+    au stream en cours sans nouvel appel LLM. L'ID du message est renvoyé
+    dans l'en-tête X-Message-Id ; chaque événement porte un ID
+    "<message_id>:<seq>" utilisable comme Last-Event-ID.
     """
 
-    # 1-4. Mêmes vérifications que send_message...
+    # 1. Mêmes vérifications que send_message (après les écritures différées en attente)
+    await message_writer.settled(session_id)
     session = await get_session_or_404(session_id, current_user.id, db)
-    await verify_credits(current_user.id, 1, db)
+
+    message_id = idempotency_key or str(uuid4())
+
+    # Renvoi du même message : rattachement au stream existant
+    stream = stream_hub.get(session_id, message_id)
+    if stream is not None:
+        _, after = parse_event_id(last_event_id)
+        return sse_response(stream.subscribe(after), message_id)
+
+    if session.status != "active":
+        raise HTTPException(400, "Session non active")
+
+    # Crédits réservés le temps du stream, au coût maximum comme send_message
+    # (réglés à la fin, rendus sinon)
+    reservation_id = await reserve_credits(
+        user_id=current_user.id,
+        amount=message_credit_cost(settings.MENTORING_MAX_TOOL_ITERATIONS),
+        description="Message mentorat (stream)",
+        session_id=session.id,
+        db=db
+    )
 
     user_context = build_user_context(
         current_user,
@@ -472,40 +759,121 @@ async def send_message_stream(
         current_user.profile
     )
 
+    # File pleine : 429/503 avant d'ouvrir le stream
+    plan = await get_user_plan(current_user.id, db)
+    try:
+        llm_scheduler.ensure_capacity(current_user.id)
+    except HTTPException:
+        await release_credits(reservation_id, db)
+        raise
+
+    user_sent_at = datetime.now(timezone.utc)
+    thread_id = session.backboard_thread_id
+
     async def generate():
-        """Générateur pour SSE."""
-        full_response = ""
+        """
+        Génération upstream (tâche du stream hub, indépendante de la requête).
+
+        Les événements de Backboard sont relayés avec leurs octets d'origine
+        (pas de ré-encodage) ; le texte est accumulé dans une liste et joint
+        une seule fois en fin de stream.
+        """
+        chunks: list[str] = []
+        usage = None
+        settled = False
 
         try:
-            # Stream depuis Backboard
-            async for chunk in backboard_service.send_message_stream(
-                    thread_id=session.backboard_thread_id,
-                    content=data.content,
-                    user_context=user_context
-            ):
-                full_response += chunk
-                yield f"data: {chunk}\n\n"
-
-            # Signal de fin
-            yield "data: [DONE]\n\n"
-
-            # Après le stream complet, sauvegarder les métadonnées
-            await save_message_metadata(
-                session=session,
-                user_content=data.content,
-                assistant_content=full_response,
-                db=db
-            )
+            # Un seul message à la fois par session (le verrou couvre le stream)
+            async with session_locks.hold(session_id):
+                # Stream depuis Backboard (place de l'ordonnanceur tenue
+                # jusqu'à la fin du stream)
+                async with llm_scheduler.slot(current_user.id, plan):
+                    async for event in backboard_service.send_message_stream_events(
+                            thread_id=thread_id,
+                            content=data.content,
+                            user_context=user_context
+                    ):
+                        kind = event.kind
+
+                        if kind == "done":
+                            break
+                        if kind == "content":
+                            chunks.append(event.text)
+                        elif kind == "usage":
+                            usage = event.payload
+
+                        yield event.raw
+
+                # Signal de fin
+                yield b"data: [DONE]\n\n"
+
+                # Après le stream complet : régler le crédit puis sauvegarder
+                # (session BD propre : la requête d'origine peut être terminée)
+                await settle_credits(reservation_id, message_credit_cost())
+                settled = True
+                await save_message_metadata(
+                    session=session,
+                    user_content=data.content,
+                    assistant_content="".join(chunks),
+                    usage=usage,
+                    user_sent_at=user_sent_at
+                )
+        finally:
+            # Erreur upstream ou plus aucun abonné : crédit rendu
+            if not settled:
+                await release_credits(reservation_id)
+
+    # Même message démarré entre-temps (pas d'await depuis ce get) :
+    # rattachement, la réservation est rendue
+    stream = stream_hub.get(session_id, message_id)
+    if stream is not None:
+        await release_credits(reservation_id, db)
+        return sse_response(stream.subscribe(), message_id)
+
+    stream = stream_hub.open(session_id, message_id, generate)
+    return sse_response(stream.subscribe(), message_id)
+
+
+@router.get("/sessions/{session_id}/messages/stream")
+async def resume_message_stream(
+        session_id: UUID,
+        current_user: ClaimsUser,
+        db: DBSession,
+        message_id: Optional[str] = Query(None),
+        last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Se rattache au stream d'une session (autre onglet, reconnexion).
+
+    Sans message_id ni Last-Event-ID : dernier stream de la session.
+    Avec Last-Event-ID : reprise après le dernier événement reçu.
+    """
+    await get_session_or_404(session_id, current_user.id, db)
+
+    resumed_id, after = parse_event_id(last_event_id)
+    message_id = message_id or resumed_id
+
+    if message_id:
+        stream = stream_hub.get(session_id, message_id)
+        if resumed_id != message_id:
+            after = -1
+    else:
+        stream = stream_hub.current(session_id)
+
+    if stream is None:
+        raise HTTPException(404, "Aucun stream en cours pour cette session")
+
+    return sse_response(stream.subscribe(after), stream.message_id)
 
-        except Exception as e:
-            yield f"data: [ERROR] {str(e)}\n\n"
 
+def sse_response(events, message_id: str) -> StreamingResponse:
     return StreamingResponse(
-        generate(),
+        events,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Message-Id": message_id,
         }
     )
 
@@ -514,47 +882,40 @@ async def save_message_metadata(
         session: MentoringSession,
         user_content: str,
         assistant_content: str,
-        db: DBSession
+        usage: dict = None,
+        user_sent_at: datetime = None,
+        credits_cost: int = 1
 ):
-    """Sauvegarde les métadonnées après un stream."""
+    """
+    Met les messages et compteurs d'un stream en écriture différée
+    (le crédit est réglé par le producteur du stream).
+    """
 
-    # Estimer les tokens (approximation)
-    user_tokens = len(user_content.split()) * 1.3
-    assistant_tokens = len(assistant_content.split()) * 1.3
+    # Tokens réels si Backboard a envoyé un événement d'usage, sinon estimation
+    if usage and usage.get("input_tokens") is not None:
+        user_tokens = usage.get("input_tokens", 0)
+        assistant_tokens = usage.get("output_tokens", 0)
+    else:
+        user_tokens = len(user_content.split()) * 1.3
+        assistant_tokens = len(assistant_content.split()) * 1.3
 
-    # Créer les messages
-    user_msg = SessionMessage(
+    user_row, assistant_row = build_turn(
         session_id=session.id,
-        role="user",
-        tokens_used=int(user_tokens),
-        credits_cost=0
+        user_content=user_content,
+        user_tokens=user_tokens,
+        user_sent_at=user_sent_at or datetime.now(timezone.utc),
+        assistant_content=assistant_content,
+        assistant_tokens=assistant_tokens,
+        model="claude",
+        credits_cost=credits_cost
     )
-    db.add(user_msg)
-
-    assistant_msg = SessionMessage(
+    await message_writer.submit(PendingTurn(
         session_id=session.id,
-        role="assistant",
-        tokens_used=int(assistant_tokens),
-        credits_cost=1,
-        llm_used="claude"
-    )
-    db.add(assistant_msg)
-
-    # Mettre à jour la session
-    session.message_count += 2
-    session.credits_consumed += 1
-    session.last_message_at = datetime.utcnow()
-
-    # Consommer les crédits
-    await consume_credits(
-        user_id=session.user_id,
-        amount=1,
-        description="Message mentorat (stream)",
-        session_id=session.id,
-        db=db
-    )
-
-    await db.commit()
+        messages=[user_row, assistant_row],
+        message_count=2,
+        credits_consumed=credits_cost,
+        last_message_at=assistant_row["created_at"]
+    ))
 
 @router.post("/sessions/{session_id}/feedback")
 async def submit_session_feedback(
@@ -606,6 +967,7 @@ async def complete_session(
 
     session.complete()
     await db.commit()
+    session_counts.invalidate(current_user.id)
 
     return {
         "message": "Session terminée",
@@ -639,5 +1001,6 @@ async def delete_session(
     # Supprimer en BD (cascade supprime les messages)
     await db.delete(session)
     await db.commit()
+    session_counts.invalidate(current_user.id)
 
     return {"message": "Session supprimée"}
\ No newline at end of file
@@ -13,6 +13,7 @@ from fastapi.responses import RedirectResponse
 from app.utils.dependencies import (
     DBSession,
     CurrentUser,
+    CurrentUserForUpdate,
     RateLimiter,
     ClientInfo,
     get_current_user_optional,
@@ -23,6 +24,7 @@ from app.models import profile
 from app.models import UserProfile
 from app.utils.security import *
 from app.services.email_service import *
+from app.services.principal_cache import principal_cache
 from app.config.settings import settings
 
 
@@ -35,7 +37,7 @@ router = APIRouter(prefix="/profile", tags=["Profil Utilisateur"])
 @router.post("/profile/onboarding/step1", status_code=status.HTTP_200_OK)
 async def onboarding_step1(
         data: OnboardingStep1Request,
-        current_user: CurrentUser,
+        current_user: CurrentUserForUpdate,
         db: DBSession
 ):
     """Étape 1 : Expérience et Rôle actuel."""
@@ -54,6 +56,7 @@ async def onboarding_step1(
 
     # Sauvegarde
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
 
     return {"message": "Step 1 completed", "next_step": "step2"}
 
@@ -64,7 +67,7 @@ async def onboarding_step1(
 @router.post("/profile/onboarding/step2", status_code=status.HTTP_200_OK)
 async def onboarding_step2(
         data: OnboardingStep2Request,
-        current_user: CurrentUser,
+        current_user: CurrentUserForUpdate,
         db: DBSession
 ):
     """Étape 2 : Style d'apprentissage et temps quotidien."""
@@ -79,6 +82,7 @@ async def onboarding_step2(
     profile.daily_goal_minutes = data.daily_goal_minutes
 
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
 
     return {"message": "Step 2 completed", "next_step": "step3"}
 
@@ -122,7 +126,7 @@ async def onboarding_step3(
 @router.post("/profile/onboarding/step4", response_model=OnboardingResponse)  # Ton modèle de réponse original
 async def onboarding_step4(
         data: OnboardingStep4Request,
-        current_user: CurrentUser,
+        current_user: CurrentUserForUpdate,
         db: DBSession
 ):
     """Étape 4 : Sélection des compétences initiales."""
@@ -197,7 +201,7 @@ async def get_preferences(current_user: CurrentUser, db: DBSession):
 @router.patch("/profile/preferences", response_model=UserPreferencesResponse)
 async def update_preferences(
         data: UserPreferencesUpdate,
-        current_user: CurrentUser,
+        current_user: CurrentUserForUpdate,
         db: DBSession
 ):
     """Met à jour les préférences (partiellement)."""
@@ -223,6 +227,7 @@ async def update_preferences(
         profile.notification_preferences = {**current_notifs, **updated_notifs}
 
     await db.commit()
+    await principal_cache.invalidate(current_user.id)
     await db.refresh(profile)
 
     return await get_preferences(current_user, db)
\ No newline at end of file
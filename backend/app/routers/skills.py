@@ -11,7 +11,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 
-from app.utils.dependencies import DBSession, CurrentUser, OptionalUser
+from app.utils.dependencies import DBSession, CurrentUser, ClaimsUser, OptionalClaimsUser
 from app.schemas.skills import *
 from app.models import (
     SkillCategory, 
@@ -82,7 +82,7 @@ async def list_categories(db: DBSession):
 )
 async def list_skills(
     db: DBSession,
-    current_user: OptionalUser,
+    current_user: OptionalClaimsUser,
     # Filtres
     type: Optional[str] = Query(None, description="Type: language, framework, etc."),
     category_slug: Optional[str] = Query(None, description="Slug de la catégorie"),
@@ -224,7 +224,7 @@ async def list_skills(
 async def get_skill(
     slug: str,
     db: DBSession,
-    current_user: OptionalUser
+    current_user: OptionalClaimsUser
 ):
     """Obtient le détail d'une compétence."""
     
@@ -316,7 +316,7 @@ async def get_skill(
 async def get_skill_topics(
     slug: str,
     db: DBSession,
-    current_user: OptionalUser
+    current_user: OptionalClaimsUser
 ):
     """Obtient les topics d'une compétence."""
     
@@ -392,7 +392,7 @@ async def get_skill_topics(
     description="Retourne les compétences de l'utilisateur connecté."
 )
 async def get_user_skills(
-    current_user: CurrentUser,
+    current_user: ClaimsUser,
     db: DBSession
 ):
     """Obtient les compétences de l'utilisateur."""
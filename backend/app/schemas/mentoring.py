@@ -14,11 +14,13 @@ class SessionCreateRequest(BaseSchema):
     skill_slug: Optional[str] = None
     topic_slug: Optional[str] = None
     initial_message: str = Field(..., min_length=1, max_length=5000)
+    bypass_cache: bool = Field(False, description="Ignorer le cache de réponses")
 
 
 class MessageSendRequest(BaseSchema):
     """Envoi d'un message dans une session."""
     content: str = Field(..., min_length=1, max_length=10000)
+    bypass_cache: bool = Field(False, description="Ignorer le cache de réponses")
 
 
 class SessionFeedbackRequest(BaseSchema):
@@ -86,12 +88,33 @@ class MessageSendResponse(BaseSchema):
 class SessionListResponse(BaseSchema):
     """Liste des sessions."""
     sessions: list[SessionResponse]
-    total: int
+    total: Optional[int] = None
     has_more: bool
+    next_cursor: Optional[str] = None
 
 
 class SessionDetailResponse(BaseSchema):
-    """Session avec historique des messages."""
+    """Session avec historique des messages (page la plus récente en premier)."""
     session: SessionResponse
     messages: list[MessageResponse]
-    credits_remaining: int
\ No newline at end of file
+    credits_remaining: int
+    has_more: bool = False
+    next_cursor: Optional[str] = None
+
+class SearchHit(BaseSchema):
+    """Résultat de recherche : un message, ou une session trouvée par son titre."""
+    kind: Literal["message", "session"]
+    session_id: UUID
+    session_title: Optional[str] = None
+    message_id: Optional[UUID] = None
+    role: Optional[Literal["user", "assistant"]] = None
+    snippet: str = Field(..., description="Extrait HTML échappé, termes trouvés entre <mark></mark>")
+    rank: float
+    created_at: datetime
+
+
+class SearchResponse(BaseSchema):
+    """Résultats de recherche dans les conversations."""
+    query: str
+    results: list[SearchHit]
+    has_more: bool
@@ -0,0 +1,92 @@
+# services/answer_cache.py
+"""
+Cache des réponses du mentor pour les questions récurrentes.
+
+Clé : texte normalisé de la question + skill + topic + niveau de
+l'apprenant. Les entrées expirent (TTL) et les moins récemment utilisées
+sont évincées au-delà de la capacité (LRU). En mémoire, par worker.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:…]+$")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalise une question pour la comparaison :
+    minuscules, accents retirés, espaces réduits, ponctuation finale ignorée.
+    Les symboles internes sont conservés ("==" et "===" restent distincts).
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def build_cache_key(content: str, user_context: dict) -> str:
+    """Clé de cache à partir de la question et du contexte (build_user_context)."""
+    parts = (
+        user_context.get("skill_slug") or "",
+        user_context.get("topic_slug") or "",
+        str(user_context.get("level", "")),
+        normalize_question(content),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Cache LRU avec TTL et métriques hit/miss."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
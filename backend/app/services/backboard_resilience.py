@@ -0,0 +1,227 @@
+# services/backboard_resilience.py
+"""
+Couche de résilience pour les appels vers Backboard.io.
+
+- CircuitBreaker : échoue immédiatement (503) tant que l'upstream est malade
+- call_with_resilience : deadline par appel, retries bornés avec backoff
+  exponentiel "full jitter" (appels idempotents uniquement) et hedging
+  optionnel pour les lectures.
+"""
+import asyncio
+import random
+import time
+import logging
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+
+# Statuts upstream qui justifient un nouvel essai
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états : closed → open → half_open → closed.
+
+    - closed : les appels passent, les échecs consécutifs sont comptés
+    - open : les appels échouent immédiatement pendant reset_timeout secondes
+    - half_open : un seul appel "sonde" est autorisé ; succès → closed, échec → open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # Compteurs exposés dans stats()
+        self._rejected_total = 0
+        self._opened_total = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._retry_after() <= 0:
+            return self.HALF_OPEN
+        return self._state
+
+    def _retry_after(self) -> float:
+        return self._opened_at + self.reset_timeout - time.monotonic()
+
+    def before_call(self) -> None:
+        """
+        Vérifie que l'appel peut partir.
+
+        Raises:
+            HTTPException 503: Si le disjoncteur est ouvert (avec Retry-After)
+        """
+        state = self.state
+
+        if state == self.CLOSED:
+            return
+
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return
+
+        self._rejected_total += 1
+        retry_after = max(1, int(self._retry_after() + 0.999))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Le mentor IA est temporairement indisponible. Réessayez dans quelques instants.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def release(self) -> None:
+        """Libère la sonde half_open sans verdict (appel annulé côté client)."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._opened_total += 1
+                logger.warning("Circuit breaker '%s' ouvert", self.name)
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "opened_total": self._opened_total,
+            "rejected_total": self._rejected_total,
+        }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Backoff exponentiel avec "full jitter" : uniform(0, min(max, base * 2^n))."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def hedged(
+        send: Callable[[], Awaitable[httpx.Response]],
+        hedge_delay: float
+) -> httpx.Response:
+    """
+    Requête "hedgée" : si la première requête n'a pas répondu après
+    hedge_delay secondes, une seconde identique est lancée. La première
+    réponse réussie gagne, l'autre est annulée.
+
+    À réserver aux lectures (idempotentes).
+    """
+    primary = asyncio.ensure_future(send())
+    pending = {primary}
+    error: Optional[BaseException] = None
+
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if not done:
+            pending.add(asyncio.ensure_future(send()))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience(
+        send: Callable[[], Awaitable[httpx.Response]],
+        *,
+        breaker: CircuitBreaker,
+        deadline: Optional[float],
+        retries: int = 0,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        hedge_delay: Optional[float] = None,
+) -> httpx.Response:
+    """
+    Exécute un appel HTTP vers Backboard avec disjoncteur, deadline,
+    retries et hedging.
+
+    Args:
+        send: Fabrique de coroutine qui envoie la requête (rappelée à chaque essai)
+        breaker: Disjoncteur partagé du service
+        deadline: Budget total en secondes (retries inclus), None = pas de limite
+        retries: Nombre d'essais supplémentaires (0 pour les appels non idempotents)
+        base_delay / max_delay: Paramètres du backoff
+        hedge_delay: Délai avant la requête de couverture (None = désactivé)
+
+    Returns:
+        La réponse httpx (le caller appelle raise_for_status)
+
+    Raises:
+        HTTPException 503: Disjoncteur ouvert
+        HTTPException 504: Deadline dépassée
+        HTTPException 502: Backboard injoignable après tous les essais
+    """
+
+    async def attempt_loop() -> httpx.Response:
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                if hedge_delay is not None:
+                    response = await hedged(send, hedge_delay)
+                else:
+                    response = await send()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt >= retries:
+                    raise HTTPException(
+                        status_code=status.HTTP_502_BAD_GATEWAY,
+                        detail=f"Backboard injoignable: {e.__class__.__name__}",
+                    )
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    breaker.record_success()
+                    return response
+
+                breaker.record_failure()
+                if attempt >= retries or response.status_code not in RETRYABLE_STATUS:
+                    return response
+
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
+
+    if deadline is None:
+        return await attempt_loop()
+
+    try:
+        async with asyncio.timeout(deadline):
+            return await attempt_loop()
+    except TimeoutError:
+        breaker.record_failure()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Le mentor IA n'a pas répondu à temps",
+        )
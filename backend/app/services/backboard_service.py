@@ -1,18 +1,27 @@
 # services/backboard_service.py
 import json
+import time
 
 import httpx
 from typing import Optional, AsyncGenerator
 from uuid import UUID
 
 from app.config.settings import settings
+from app.services.backboard_resilience import CircuitBreaker, call_with_resilience
+from app.services.sse import SSEParser, SSEEvent
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class BackboardService:
-    """Service pour interagir avec Backboard.io API."""
+    """
+    Service pour interagir avec Backboard.io API.
+
+    Toutes les méthodes partagent un seul httpx.AsyncClient (keep-alive,
+    HTTP/2) ouvert au démarrage de l'application via start() et fermé
+    via close() dans le lifespan de main.py.
+    """
 
     def __init__(self):
         self.base_url = settings.BACKBOARD_API_URL
@@ -20,10 +29,163 @@ class BackboardService:
 
         self.assistant_id = settings.BACKBOARD_ASSISTANT_ID
 
+        self._client: Optional[httpx.AsyncClient] = None
+        self._requests_total = 0
+
+        self.breaker = CircuitBreaker(
+            name="backboard",
+            failure_threshold=settings.BACKBOARD_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.BACKBOARD_BREAKER_RESET_TIMEOUT,
+        )
+
+    # ============================================================
+    # CYCLE DE VIE DU CLIENT HTTP
+    # ============================================================
+
+    def _build_client(self) -> httpx.AsyncClient:
+        """Construit le client partagé à partir des Settings."""
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            http2=settings.BACKBOARD_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.BACKBOARD_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.BACKBOARD_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.BACKBOARD_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.BACKBOARD_TIMEOUT,
+                connect=settings.BACKBOARD_CONNECT_TIMEOUT,
+                pool=settings.BACKBOARD_POOL_TIMEOUT,
+            ),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def start(self) -> None:
+        """Ouvre le client partagé (appelé au démarrage de l'application)."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+
+    async def close(self) -> None:
+        """Ferme le client partagé et toutes ses connexions."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Client partagé. Créé à la demande si start() n'a pas été appelé
+        (scripts, shell), pour ne jamais retomber sur un client par requête.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self._requests_total += 1
+
+    def pool_stats(self) -> dict:
+        """
+        Statistiques du pool de connexions vers Backboard.
+
+        Returns:
+            {
+                "open": True,
+                "http2": True,
+                "requests_total": 1234,
+                "requests_in_flight": 3,
+                "connections": 4,
+                "active_connections": 2,
+                "idle_connections": 2,
+                "http2_connections": 1,
+                "max_connections": 100,
+                "max_keepalive_connections": 20
+            }
+        """
+        stats = {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": settings.BACKBOARD_HTTP2,
+            "requests_total": self._requests_total,
+            "requests_in_flight": 0,
+            "connections": 0,
+            "active_connections": 0,
+            "idle_connections": 0,
+            "http2_connections": 0,
+            "max_connections": settings.BACKBOARD_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.BACKBOARD_MAX_KEEPALIVE_CONNECTIONS,
+        }
+
+        # Introspection du pool httpcore (API non publique, d'où les getattr)
+        transport = getattr(self._client, "_transport", None) if self._client else None
+        pool = getattr(transport, "_pool", None)
+        connections = getattr(pool, "connections", None) or []
+
+        stats["requests_in_flight"] = len(getattr(pool, "_requests", None) or [])
+        stats["connections"] = len(connections)
+        for connection in connections:
+            if connection.is_idle():
+                stats["idle_connections"] += 1
+            else:
+                stats["active_connections"] += 1
+            if "HTTP/2" in repr(connection):
+                stats["http2_connections"] += 1
+
+        return stats
+
+    # ============================================================
+    # RÉSILIENCE
+    # ============================================================
+
+    async def _request(
+            self,
+            method: str,
+            url: str,
+            *,
+            idempotent: bool = False,
+            hedge: bool = False,
+            deadline: Optional[float] = None,
+            **kwargs
+    ) -> httpx.Response:
+        """
+        Envoie une requête via le client partagé, derrière le disjoncteur.
+
+        Args:
+            idempotent: Autorise les retries (lectures, créations avec clé client)
+            hedge: Autorise une requête de couverture (lectures uniquement)
+            deadline: Budget total de l'appel, par défaut BACKBOARD_DEADLINE
+        """
+        return await call_with_resilience(
+            lambda: self.client.request(method, url, **kwargs),
+            breaker=self.breaker,
+            deadline=deadline if deadline is not None else settings.BACKBOARD_DEADLINE,
+            retries=settings.BACKBOARD_RETRY_ATTEMPTS if idempotent else 0,
+            base_delay=settings.BACKBOARD_RETRY_BASE_DELAY,
+            max_delay=settings.BACKBOARD_RETRY_MAX_DELAY,
+            hedge_delay=settings.BACKBOARD_HEDGE_DELAY if hedge else None,
+        )
+
+    @staticmethod
+    def _message_deadline(deadline: Optional[float]) -> float:
+        """
+        Budget d'un appel qui fait générer le LLM : BACKBOARD_MESSAGE_DEADLINE,
+        au moins BACKBOARD_TIMEOUT (une réponse lente mais dans le timeout de
+        lecture ne doit pas échouer sur la deadline).
+        """
+        if deadline is not None:
+            return deadline
+        return max(settings.BACKBOARD_MESSAGE_DEADLINE, settings.BACKBOARD_TIMEOUT)
+
+    # ============================================================
+    # THREADS & MESSAGES
+    # ============================================================
+
     async def create_thread(
             self,
             user_id: str,
-            metadata: dict = None
+            metadata: dict = None,
+            client_key: Optional[str] = None,
+            deadline: Optional[float] = None
     ) -> dict:
         """
         Crée un nouveau thread de conversation.
@@ -31,39 +193,47 @@ class BackboardService:
         Args:
             user_id: ID de l'utilisateur (pour contexte)
             metadata: Métadonnées additionnelles (skill, topic, etc.)
+            client_key: Clé d'idempotence (header Idempotency-Key). Si fournie,
+                la création est rejouable et donc retentée en cas d'échec.
+            deadline: Budget de l'appel en secondes (défaut: BACKBOARD_DEADLINE)
 
         Returns:
             {"thread_id": "...", "created_at": "..."}
         """
         logger.warning("=== BACKBOARD REQUEST HEADERS ===")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/assistants/{self.assistant_id}/threads",
-                headers=self.headers,
-                json={
-                    "metadata": {
-                        "user_id": user_id,
-                        **(metadata or {})
-                    }
+        response = await self._request(
+            "POST",
+            f"/assistants/{self.assistant_id}/threads",
+            idempotent=client_key is not None,
+            deadline=deadline,
+            headers={"Idempotency-Key": client_key} if client_key else None,
+            json={
+                "metadata": {
+                    "user_id": user_id,
+                    **(metadata or {})
                 }
-            )
-            response.raise_for_status()
-            return response.json()
+            }
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def send_message(
             self,
             thread_id: str,
             content: str,
-            user_context: dict = None
+            user_context: dict = None,
+            deadline: Optional[float] = None
     ) -> dict:
         """
         Envoie un message et reçoit la réponse de l'IA.
+        Non idempotent : jamais retenté automatiquement.
 
         Args:
             thread_id: ID du thread Backboard
             content: Message de l'utilisateur
             user_context: Contexte additionnel (niveau, skill actuel, etc.)
+            deadline: Budget de l'appel en secondes (défaut: BACKBOARD_MESSAGE_DEADLINE)
 
         Returns:
             {
@@ -82,14 +252,14 @@ class BackboardService:
         if user_context:
             payload["context"] = user_context
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/threads/{thread_id}/messages",
-                headers=self.headers,
-                data=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "POST",
+            f"/threads/{thread_id}/messages",
+            deadline=self._message_deadline(deadline),
+            data=payload
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def send_message_stream(
             self,
@@ -103,6 +273,26 @@ class BackboardService:
         Yields:
             Chunks de texte au fur et à mesure
         """
+        async for event in self.send_message_stream_events(thread_id, content, user_context):
+            if event.kind == "done":
+                break
+            if event.kind == "content":
+                yield event.text
+
+    async def send_message_stream_events(
+            self,
+            thread_id: str,
+            content: str,
+            user_context: dict = None
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """
+        Envoie un message et stream les événements SSE bruts de Backboard
+        (contenu, appels de tools, usage, fin de flux).
+
+        Yields:
+            SSEEvent au fur et à mesure (event.raw contient les octets
+            d'origine, relayables tels quels au client)
+        """
         payload = {
             "content": content,
             "stream": "True",
@@ -112,48 +302,76 @@ class BackboardService:
         if user_context:
             payload["context"] = user_context
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
+        # Le disjoncteur protège l'ouverture du stream. BACKBOARD_STREAM_TIMEOUT
+        # ne borne que l'attente entre deux lectures : un stream qui envoie
+        # sans cesse est coupé après BACKBOARD_STREAM_MAX_DURATION.
+        deadline = (
+            time.monotonic() + settings.BACKBOARD_STREAM_MAX_DURATION
+            if settings.BACKBOARD_STREAM_MAX_DURATION > 0 else None
+        )
+        self.breaker.before_call()
+        try:
+            async with self.client.stream(
                     "POST",
-                    f"{self.base_url}/threads/{thread_id}/messages",
-                    headers=self.headers,
-                    data=payload
+                    f"/threads/{thread_id}/messages",
+                    data=payload,
+                    timeout=httpx.Timeout(
+                        settings.BACKBOARD_STREAM_TIMEOUT,
+                        connect=settings.BACKBOARD_CONNECT_TIMEOUT,
+                        pool=settings.BACKBOARD_POOL_TIMEOUT,
+                    ),
             ) as response:
+                if response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
                 response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        chunk = line[6:]  # Enlever "data: "
-                        if chunk != "[DONE]":
-                            yield chunk
+
+                parser = SSEParser()
+                async for chunk in response.aiter_bytes():
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(
+                            f"Stream Backboard interrompu après {settings.BACKBOARD_STREAM_MAX_DURATION:g} s"
+                        )
+                    for event in parser.feed(chunk):
+                        yield event
+                for event in parser.flush():
+                    yield event
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        finally:
+            # Libère la sonde half_open si le client a abandonné avant la réponse
+            self.breaker.release()
 
     async def get_thread_messages(
             self,
             thread_id: str,
-            limit: int = 50
+            limit: int = 50,
+            deadline: Optional[float] = None
     ) -> list[dict]:
         """
         Récupère l'historique des messages d'un thread.
+        Lecture idempotente : retentée et éventuellement hedgée.
 
         Returns:
             Liste de messages [{"role": "user", "content": "..."}, ...]
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/threads/{thread_id}/messages",
-                headers=self.headers,
-                params={"limit": limit}
-            )
-            response.raise_for_status()
-            return response.json()["messages"]
+        response = await self._request(
+            "GET",
+            f"/threads/{thread_id}/messages",
+            idempotent=True,
+            hedge=True,
+            deadline=deadline,
+            params={"limit": limit}
+        )
+        response.raise_for_status()
+        return response.json()["messages"]
 
     async def delete_thread(self, thread_id: str) -> bool:
         """Supprime un thread."""
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{self.base_url}/threads/{thread_id}",
-                headers=self.headers
-            )
-            return response.status_code == 204
+        response = await self._request("DELETE", f"/threads/{thread_id}", idempotent=True)
+        return response.status_code == 204
 
     async def update_thread_metadata(
             self,
@@ -161,14 +379,14 @@ class BackboardService:
             metadata: dict
     ) -> dict:
         """Met à jour les métadonnées d'un thread."""
-        async with httpx.AsyncClient() as client:
-            response = await client.patch(
-                f"{self.base_url}/threads/{thread_id}",
-                headers=self.headers,
-                json={"metadata": metadata}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "PATCH",
+            f"/threads/{thread_id}",
+            idempotent=True,
+            json={"metadata": metadata}
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def send_tool_result(
             self,
@@ -199,16 +417,61 @@ class BackboardService:
             "content": result_content
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/threads/{thread_id}/messages",
-                headers=self.headers,
-                data=payload
-            )
+        response = await self._request(
+            "POST",
+            f"/threads/{thread_id}/messages",
+            deadline=self._message_deadline(None),
+            data=payload
+        )
+
+        response.raise_for_status()
+        return response.json()
+
+
+    async def submit_tool_outputs(
+            self,
+            thread_id: str,
+            tool_outputs: list[dict],
+            run_id: Optional[str] = None
+    ) -> dict:
+        """
+        Envoie en un seul appel les résultats de tous les tools demandés
+        par le LLM, et retourne la réponse suivante (qui peut elle-même
+        demander d'autres tools).
+
+        Args:
+            thread_id: ID du thread Backboard
+            tool_outputs: [{"tool_call_id": "...", "tool_name": "...", "output": {...}}, ...]
+            run_id: ID du run en attente d'action (si fourni par Backboard)
+
+        Returns:
+            Réponse Backboard après injection des résultats
+        """
+        outputs = [
+            {
+                "tool_call_id": output["tool_call_id"],
+                "tool_name": output["tool_name"],
+                "output": output["output"] if isinstance(output["output"], str)
+                else json.dumps(output["output"], ensure_ascii=False),
+            }
+            for output in tool_outputs
+        ]
+
+        if run_id:
+            url = f"/threads/{thread_id}/runs/{run_id}/submit-tool-outputs"
+        else:
+            url = f"/threads/{thread_id}/tool-outputs"
+
+        response = await self._request(
+            "POST",
+            url,
+            deadline=self._message_deadline(None),
+            json={"tool_outputs": outputs}
+        )
 
-            response.raise_for_status()
-            return response.json()
+        response.raise_for_status()
+        return response.json()
 
 
 # Singleton
-backboard_service = BackboardService()
\ No newline at end of file
+backboard_service = BackboardService()
@@ -0,0 +1,194 @@
+# services/backboard_thread_pool.py
+"""
+Réserve de threads Backboard pré-créés.
+
+Une nouvelle session de mentorat réclame un thread déjà créé au lieu
+d'attendre create_thread ; ses métadonnées sont ensuite mises à jour
+hors du chemin critique. Une tâche de fond maintient la réserve à la
+taille cible et recycle les threads restés inutilisés trop longtemps.
+En mémoire, par worker.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+from uuid import uuid4
+
+from app.config.settings import settings
+from app.services.backboard_service import backboard_service
+
+logger = logging.getLogger(__name__)
+
+
+class BackboardThreadPool:
+    """Réserve de threads Backboard non assignés."""
+
+    def __init__(self, size: int, max_age: float, refill_interval: float):
+        self.size = size
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+
+        # (thread_id, créé à — time.monotonic())
+        self._threads: deque[tuple[str, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._deletions: set[asyncio.Task] = set()
+
+        self.claimed_total = 0
+        self.missed_total = 0
+        self.created_total = 0
+        self.recycled_total = 0
+        self.discarded_total = 0
+
+    # ============================================================
+    # CYCLE DE VIE
+    # ============================================================
+
+    async def start(self) -> None:
+        """Lance la tâche de remplissage (appelé dans le lifespan)."""
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête le remplissage et supprime les threads non utilisés."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        threads, self._threads = list(self._threads), deque()
+        await asyncio.gather(
+            *(self._delete(thread_id) for thread_id, _ in threads),
+            return_exceptions=True
+        )
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    def claim(self) -> Optional[str]:
+        """
+        Réclame un thread pré-créé.
+
+        Returns:
+            L'ID du thread, ou None si la réserve est vide
+            (le caller retombe alors sur create_thread)
+        """
+        now = time.monotonic()
+
+        while self._threads:
+            thread_id, created_at = self._threads.popleft()
+            if now - created_at < self.max_age:
+                self.claimed_total += 1
+                self._wakeup.set()
+                return thread_id
+            # Trop vieux : recyclé en arrière-plan
+            self._recycle(thread_id)
+
+        self.missed_total += 1
+        self._wakeup.set()
+        return None
+
+    async def assign(self, thread_id: str, metadata: dict) -> None:
+        """
+        Rattache un thread réclamé à sa session (hors chemin critique).
+        Un échec est journalisé : le thread reste utilisable sans métadonnées.
+        """
+        try:
+            await backboard_service.update_thread_metadata(thread_id, {**metadata, "pooled": False})
+        except Exception:
+            logger.warning("Mise à jour des métadonnées du thread %s en échec", thread_id, exc_info=True)
+
+    def discard(self, thread_id: str) -> None:
+        """
+        Supprime en arrière-plan un thread réclamé (ou créé) pour une session
+        dont la création a échoué : il ne serait jamais rattaché à rien.
+        """
+        self.discarded_total += 1
+        self._schedule_delete(thread_id)
+
+    def stats(self) -> dict:
+        return {
+            "available": len(self._threads),
+            "target_size": self.size,
+            "claimed_total": self.claimed_total,
+            "missed_total": self.missed_total,
+            "created_total": self.created_total,
+            "recycled_total": self.recycled_total,
+            "discarded_total": self.discarded_total,
+        }
+
+    # ============================================================
+    # REMPLISSAGE
+    # ============================================================
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._recycle_expired()
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Remplissage de la réserve de threads en échec", exc_info=True)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self) -> None:
+        missing = self.size - len(self._threads)
+        if missing <= 0:
+            return
+
+        results = await asyncio.gather(
+            *(self._create() for _ in range(missing)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, str):
+                self._threads.append((result, time.monotonic()))
+                self.created_total += 1
+
+    def _recycle_expired(self) -> None:
+        now = time.monotonic()
+        while self._threads and now - self._threads[0][1] >= self.max_age:
+            thread_id, _ = self._threads.popleft()
+            self._recycle(thread_id)
+
+    def _recycle(self, thread_id: str) -> None:
+        self.recycled_total += 1
+        self._schedule_delete(thread_id)
+
+    def _schedule_delete(self, thread_id: str) -> None:
+        task = asyncio.create_task(self._delete(thread_id))
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    async def _create(self) -> str:
+        thread_data = await backboard_service.create_thread(
+            user_id="pool",
+            metadata={"pooled": True},
+            client_key=str(uuid4())
+        )
+        return thread_data["thread_id"]
+
+    async def _delete(self, thread_id: str) -> None:
+        try:
+            await backboard_service.delete_thread(thread_id)
+        except Exception:
+            logger.info("Suppression du thread %s impossible", thread_id, exc_info=True)
+
+
+# Singleton
+thread_pool = BackboardThreadPool(
+    size=settings.BACKBOARD_THREAD_POOL_SIZE,
+    max_age=settings.BACKBOARD_THREAD_POOL_MAX_AGE,
+    refill_interval=settings.BACKBOARD_THREAD_POOL_REFILL_INTERVAL,
+)
@@ -0,0 +1,573 @@
+# services/chat_service.py
+"""
+Logique métier du mentorat (hors HTTP) : boucle d'exécution des tools
+demandés par le LLM via Backboard, pagination keyset, recherche plein
+texte et réconciliation de l'historique local avec Backboard.
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Hashable, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select, cast, func, literal_column, null, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models import MentoringSession, SessionMessage
+from app.services.backboard_service import backboard_service
+from app.services.backboard_tools import handle_tool_call
+from app.services.inflight import KeyedLocks, SingleFlight
+from app.services.answer_cache import AnswerCache, build_cache_key
+from app.services.llm_scheduler import llm_scheduler
+from app.services.write_behind import message_writer
+
+logger = logging.getLogger(__name__)
+
+
+# Coordination des envois (en mémoire, par worker) :
+# une session = un thread Backboard = un seul message à la fois
+session_locks = KeyedLocks()
+message_flights = SingleFlight()
+
+# Cache des réponses aux questions récurrentes (opt-in via settings)
+answer_cache = AnswerCache(
+    max_entries=settings.MENTORING_ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.MENTORING_ANSWER_CACHE_TTL,
+)
+
+
+class SessionCountCache:
+    """
+    Totaux de sessions par utilisateur et par filtre, mis en cache le temps
+    de parcourir les pages (évite un count(*) par page). Invalidés quand
+    les sessions de l'utilisateur changent ; en mémoire, par worker.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_users: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._counts: dict[UUID, dict[Hashable, tuple[float, int]]] = {}
+
+    def get(self, user_id: UUID, filters: Hashable) -> Optional[int]:
+        entry = self._counts.get(user_id, {}).get(filters)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id: UUID, filters: Hashable, count: int) -> None:
+        if user_id not in self._counts and len(self._counts) >= self.max_users:
+            self._counts.clear()
+        self._counts.setdefault(user_id, {})[filters] = (time.monotonic() + self.ttl_seconds, count)
+
+    def invalidate(self, user_id: UUID) -> None:
+        self._counts.pop(user_id, None)
+
+
+session_counts = SessionCountCache(ttl_seconds=settings.MENTORING_SESSION_COUNT_TTL)
+
+# Réponse de repli quand la boucle de tools s'arrête sans texte du LLM
+TOOL_LOOP_FALLBACK_REPLY = (
+    "Je n'ai pas pu finaliser ma réponse à partir des outils consultés. "
+    "Peux-tu reformuler ou préciser ta question ?"
+)
+
+
+# ============================================================
+# CURSEURS DE PAGINATION (KEYSET)
+# ============================================================
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encode une position (date, id) en curseur opaque."""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """
+    Décode un curseur produit par encode_cursor.
+
+    Raises:
+        HTTPException 400: Si le curseur est invalide
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except ValueError:
+        raise HTTPException(400, "Curseur de pagination invalide")
+
+
+def extract_tool_calls(response_data: dict) -> list[dict]:
+    """
+    Normalise les appels de tools d'une réponse Backboard.
+
+    Backboard peut renvoyer soit une liste "tool_calls"
+    ([{"id": "...", "function": {"name": "...", "arguments": "{...}"}}]),
+    soit un appel unique "tool_called" + "arguments".
+
+    Returns:
+        [{"id": "...", "name": "...", "arguments": {...}}, ...]
+    """
+    calls = []
+
+    for call in response_data.get("tool_calls") or []:
+        function = call.get("function", call)
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments else {}
+        calls.append({
+            "id": call.get("id"),
+            "name": function.get("name"),
+            "arguments": arguments,
+        })
+
+    if not calls and response_data.get("tool_called"):
+        arguments = response_data.get("arguments") or {}
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments else {}
+        calls.append({
+            "id": response_data.get("tool_call_id"),
+            "name": response_data["tool_called"],
+            "arguments": arguments,
+        })
+
+    return calls
+
+
+async def _execute_tool_call(call: dict, user_id: UUID) -> dict:
+    """
+    Exécute un tool dans sa propre session BD.
+
+    Une AsyncSession ne supporte pas les opérations concurrentes :
+    chaque tool lancé par asyncio.gather a donc sa session.
+    Les erreurs sont renvoyées au LLM plutôt que levées.
+    """
+    async with AsyncSessionLocal() as tool_db:
+        try:
+            result = await handle_tool_call(
+                tool_name=call["name"],
+                tool_args=call["arguments"],
+                user_id=user_id,
+                db=tool_db
+            )
+            await tool_db.commit()
+            return result
+        except KeyError as e:
+            await tool_db.rollback()
+            return {"error": f"Missing argument: {e}"}
+        except Exception as e:
+            await tool_db.rollback()
+            logger.exception("Tool %s en échec", call["name"])
+            return {"error": str(e)}
+
+
+async def run_tool_loop(
+        thread_id: str,
+        response_data: dict,
+        user_id: UUID,
+        max_iterations: int = None
+) -> dict:
+    """
+    Boucle agentique : tant que le LLM demande des tools, on les exécute
+    tous en parallèle et on renvoie leurs résultats en un seul lot.
+
+    Args:
+        thread_id: ID du thread Backboard
+        response_data: Première réponse de send_message
+        user_id: Utilisateur courant (contexte des tools)
+        max_iterations: Nombre maximum d'allers-retours (défaut: settings)
+
+    Returns:
+        Dernière réponse Backboard, enrichie de :
+            - "content": toujours renseigné (TOOL_LOOP_FALLBACK_REPLY si la
+              boucle s'arrête sur une demande de tools sans texte)
+            - "tools_called": noms des tools exécutés (dans l'ordre)
+            - "tool_called": les mêmes, joints par des virgules (ou None)
+            - "tool_iterations": nombre d'allers-retours effectués
+            - "input_tokens" / "output_tokens": cumulés sur toute la boucle
+    """
+    if max_iterations is None:
+        max_iterations = settings.MENTORING_MAX_TOOL_ITERATIONS
+
+    tools_called = []
+    input_tokens = response_data.get("input_tokens", 0) or 0
+    output_tokens = response_data.get("output_tokens", 0) or 0
+    iterations = 0
+
+    calls = extract_tool_calls(response_data)
+
+    while calls:
+        if iterations >= max_iterations:
+            logger.warning(
+                "Boucle de tools interrompue après %s itérations (thread %s)",
+                iterations, thread_id
+            )
+            break
+
+        results = await asyncio.gather(
+            *(_execute_tool_call(call, user_id) for call in calls)
+        )
+
+        tool_outputs = [
+            {
+                "tool_call_id": call["id"],
+                "tool_name": call["name"],
+                "output": result,
+            }
+            for call, result in zip(calls, results)
+        ]
+        tools_called.extend(call["name"] for call in calls)
+
+        response_data = await backboard_service.submit_tool_outputs(
+            thread_id=thread_id,
+            tool_outputs=tool_outputs,
+            run_id=response_data.get("run_id")
+        )
+        iterations += 1
+
+        input_tokens += response_data.get("input_tokens", 0) or 0
+        output_tokens += response_data.get("output_tokens", 0) or 0
+
+        calls = extract_tool_calls(response_data)
+
+    if not response_data.get("content"):
+        # Arrêt sur max_iterations : la dernière réponse est encore une demande de tools
+        response_data["content"] = TOOL_LOOP_FALLBACK_REPLY
+        response_data["truncated"] = True
+
+    response_data["tools_called"] = tools_called
+    response_data["tool_called"] = ",".join(tools_called) or None
+    response_data["tool_iterations"] = iterations
+    response_data["input_tokens"] = input_tokens
+    response_data["output_tokens"] = output_tokens
+
+    return response_data
+
+
+async def ask_mentor(
+        thread_id: str,
+        content: str,
+        user_context: dict,
+        user_id: UUID,
+        bypass_cache: bool = False,
+        plan: str = None
+) -> dict:
+    """
+    Pose une question au mentor : cache, puis Backboard et boucle de tools.
+
+    Seules les réponses sans appel de tool sont mises en cache (les tools
+    produisent des réponses propres à l'apprenant). Une réponse servie
+    depuis le cache n'est pas envoyée dans le thread Backboard.
+
+    Les appels Backboard passent par l'ordonnanceur (place équitable,
+    pondérée par le plan de l'utilisateur) ; ils peuvent donc lever
+    429/503 si la file est pleine.
+
+    Returns:
+        Réponse Backboard (voir run_tool_loop), avec "cached": True si
+        elle provient du cache
+    """
+    cache_key = None
+    if (
+            settings.MENTORING_ANSWER_CACHE_ENABLED
+            and not bypass_cache
+            and len(content) <= settings.MENTORING_ANSWER_CACHE_MAX_QUESTION_LENGTH
+    ):
+        cache_key = build_cache_key(content, user_context or {})
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return {
+                **cached,
+                "cached": True,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "tools_called": [],
+                "tool_called": None,
+                "tool_iterations": 0,
+            }
+
+    async with llm_scheduler.slot(user_id, plan):
+        response_data = await backboard_service.send_message(
+            thread_id=thread_id,
+            content=content,
+            user_context=user_context
+        )
+
+        # Exécuter les tools demandés par le LLM (en parallèle, par lots)
+        response_data = await run_tool_loop(
+            thread_id=thread_id,
+            response_data=response_data,
+            user_id=user_id
+        )
+
+    if (
+            cache_key is not None
+            and not response_data["tools_called"]
+            and not response_data.get("truncated")
+    ):
+        answer_cache.set(cache_key, {
+            "content": response_data["content"],
+            "model": response_data.get("model"),
+        })
+
+    return response_data
+
+
+# ============================================================
+# RECHERCHE PLEIN TEXTE
+# ============================================================
+
+SEARCH_CONFIGS = {"fr": "french", "en": "english"}
+
+# Extraits : termes trouvés entre <mark></mark>, 2 fragments maximum
+HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, "
+    "MaxFragments=2, FragmentDelimiter=\" … \""
+)
+
+
+def build_search_query(text: str, language: Optional[str] = None):
+    """
+    tsquery d'une recherche utilisateur (syntaxe "websearch" : guillemets,
+    OR, -exclusion). Sans langue : français OU anglais, comme l'index.
+    """
+    if language:
+        return func.websearch_to_tsquery(SEARCH_CONFIGS[language], text)
+    return func.websearch_to_tsquery("french", text).op("||")(
+        func.websearch_to_tsquery("english", text)
+    )
+
+
+def _html_escape(column):
+    """Échappe le texte côté SQL avant ts_headline (seules les <mark> sont du HTML)."""
+    return func.replace(func.replace(func.replace(column, "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+
+
+async def search_conversations(
+        user_id: UUID,
+        text: str,
+        db: AsyncSession,
+        language: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+) -> list[dict]:
+    """
+    Recherche dans les messages et les titres de sessions d'un utilisateur.
+
+    Les candidats sont classés (ts_rank_cd) via les index GIN ; les extraits
+    (ts_headline, coûteux) ne sont calculés que pour la page retournée.
+
+    Returns:
+        [{"kind", "session_id", "session_title", "message_id", "role",
+          "snippet", "rank", "created_at"}, ...] par pertinence décroissante
+    """
+    tsquery = build_search_query(text, language)
+    headline_config = SEARCH_CONFIGS.get(language, "french")
+    window = offset + limit
+
+    message_rank = func.ts_rank_cd(SessionMessage.search_vector, tsquery, 32)
+    messages = select(
+        literal_column("'message'").label("kind"),
+        SessionMessage.session_id.label("session_id"),
+        SessionMessage.id.label("message_id"),
+        SessionMessage.role.label("role"),
+        SessionMessage.content.label("text"),
+        message_rank.label("rank"),
+        SessionMessage.created_at.label("created_at"),
+    ).join(
+        MentoringSession, MentoringSession.id == SessionMessage.session_id
+    ).where(
+        MentoringSession.user_id == user_id,
+        SessionMessage.search_vector.bool_op("@@")(tsquery)
+    ).order_by(
+        message_rank.desc(), SessionMessage.created_at.desc()
+    ).limit(window)
+
+    session_rank = func.ts_rank_cd(MentoringSession.search_vector, tsquery, 32)
+    sessions = select(
+        literal_column("'session'").label("kind"),
+        MentoringSession.id.label("session_id"),
+        cast(null(), SessionMessage.id.type).label("message_id"),
+        cast(null(), SessionMessage.role.type).label("role"),
+        MentoringSession.title.label("text"),
+        session_rank.label("rank"),
+        MentoringSession.last_message_at.label("created_at"),
+    ).where(
+        MentoringSession.user_id == user_id,
+        MentoringSession.search_vector.bool_op("@@")(tsquery)
+    ).order_by(
+        session_rank.desc(), MentoringSession.last_message_at.desc()
+    ).limit(window)
+
+    candidates = union_all(messages.subquery().select(), sessions.subquery().select()).subquery()
+    page = select(candidates).order_by(
+        candidates.c.rank.desc(), candidates.c.created_at.desc()
+    ).limit(limit).offset(offset).subquery()
+
+    stmt = select(
+        page.c.kind,
+        page.c.session_id,
+        page.c.message_id,
+        page.c.role,
+        page.c.rank,
+        page.c.created_at,
+        MentoringSession.title.label("session_title"),
+        func.ts_headline(
+            headline_config, _html_escape(page.c.text), tsquery, HEADLINE_OPTIONS
+        ).label("snippet"),
+    ).join(
+        MentoringSession, MentoringSession.id == page.c.session_id
+    ).order_by(page.c.rank.desc(), page.c.created_at.desc())
+
+    result = await db.execute(stmt)
+    return [dict(row._mapping) for row in result]
+
+
+# ============================================================
+# RÉCONCILIATION AVEC BACKBOARD
+# ============================================================
+
+# Dernière réconciliation automatique par session (en mémoire, par worker)
+_reconciled_at: dict[UUID, float] = {}
+
+
+def reconcile_due(session_id: UUID) -> bool:
+    """
+    Vrai si la session n'a pas été réconciliée automatiquement depuis
+    MENTORING_RECONCILE_INTERVAL secondes ; la marque alors comme faite.
+    """
+    now = time.monotonic()
+    last = _reconciled_at.get(session_id)
+    if last is not None and now - last < settings.MENTORING_RECONCILE_INTERVAL:
+        return False
+    if len(_reconciled_at) >= 10000:
+        _reconciled_at.clear()
+    _reconciled_at[session_id] = now
+    return True
+
+
+def _remote_created_at(remote: dict) -> Optional[datetime]:
+    value = remote.get("created_at")
+    if not value:
+        return None
+    try:
+        created_at = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def _match_local(
+        remote: dict,
+        remote_id: Optional[str],
+        created_at: datetime,
+        candidates: list[SessionMessage]
+) -> Optional[SessionMessage]:
+    """Message local correspondant : même id Backboard, sinon même rôle à la date la plus proche."""
+    if remote_id is not None:
+        for local in candidates:
+            if (local.metadata_json or {}).get("backboard_message_id") == remote_id:
+                return local
+
+    tolerance = settings.MENTORING_RECONCILE_MATCH_TOLERANCE
+    best, best_gap = None, None
+    for local in candidates:
+        if getattr(local.role, "value", local.role) != remote["role"]:
+            continue
+        if (local.metadata_json or {}).get("backboard_message_id") not in (None, remote_id):
+            continue
+        gap = abs((local.created_at - created_at).total_seconds())
+        if gap <= tolerance and (best_gap is None or gap < best_gap):
+            best, best_gap = local, gap
+    return best
+
+
+async def reconcile_session_messages(session_id: UUID, thread_id: str) -> int:
+    """
+    Complète l'historique local d'une session à partir de Backboard.
+
+    Exécutée en tâche de fond (hors chemin de lecture) : remplit le contenu
+    des messages stockés avant le stockage local et ajoute les messages
+    présents uniquement côté Backboard, à leur date d'origine.
+
+    Chaque message Backboard est rapproché d'un message local par son id
+    (noté dans metadata au premier passage), sinon par rôle et date
+    (MENTORING_RECONCILE_MATCH_TOLERANCE). Un message déjà présent n'est
+    jamais réinséré ; les messages Backboard sans date sont ignorés.
+    Les réconciliations d'une même session sont sérialisées par un verrou
+    transactionnel Postgres (plusieurs workers).
+
+    Returns:
+        Nombre de messages modifiés ou ajoutés
+    """
+    if not thread_id:
+        return 0
+
+    try:
+        remote_messages = await backboard_service.get_thread_messages(
+            thread_id=thread_id,
+            limit=settings.MENTORING_RECONCILE_LIMIT
+        )
+    except Exception:
+        logger.warning("Réconciliation impossible pour la session %s", session_id, exc_info=True)
+        return 0
+
+    remote_messages = [m for m in remote_messages if m.get("role") in ("user", "assistant")]
+
+    # Échanges en attente d'écriture : sinon vus comme absents et réinsérés
+    await message_writer.settled(session_id)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"reconcile:{session_id}"))))
+
+        stmt = select(SessionMessage).where(
+            SessionMessage.session_id == session_id
+        ).order_by(SessionMessage.created_at, SessionMessage.id)
+        result = await db.execute(stmt)
+        candidates = list(result.scalars().all())
+
+        changed = 0
+        for remote in remote_messages:
+            created_at = _remote_created_at(remote)
+            if created_at is None:
+                continue
+            remote_id = remote.get("id") or remote.get("message_id")
+            remote_id = str(remote_id) if remote_id is not None else None
+
+            local = _match_local(remote, remote_id, created_at, candidates)
+            if local is not None:
+                # Un message local ne correspond qu'à un seul message Backboard
+                candidates.remove(local)
+                metadata = local.metadata_json or {}
+                updated = False
+                if remote_id is not None and metadata.get("backboard_message_id") is None:
+                    local.metadata_json = {**metadata, "backboard_message_id": remote_id}
+                    updated = True
+                if local.content is None and remote.get("content") is not None:
+                    local.content = remote["content"]
+                    updated = True
+                changed += updated
+                continue
+
+            db.add(SessionMessage(
+                session_id=session_id,
+                role=remote["role"],
+                content=remote.get("content"),
+                tokens_used=remote.get("tokens_used", 0),
+                credits_cost=0,
+                tool_called=remote.get("tool_called"),
+                metadata_json={"source": "backboard_reconcile", "backboard_message_id": remote_id},
+                created_at=created_at,
+            ))
+            changed += 1
+
+        # Commit (ou rollback) : libère aussi le verrou transactionnel
+        await db.commit()
+
+    return changed
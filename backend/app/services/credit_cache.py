@@ -0,0 +1,283 @@
+# services/credit_cache.py
+"""
+Cache du solde de crédits par utilisateur.
+
+Les vérifications de solde en lecture seule (get_credits_balance,
+CreditsChecker, /me) lisent ce cache au lieu de UserCredits.
+
+Invalidation à l'écriture, remplissage à la lecture : chaque écriture
+de credit_service (débit, réservation, règlement, expiration, recharge)
+invalide le solde après son commit, et seul get_cached_balance le
+remplit, après un miss. Un remplissage est abandonné si une invalidation
+a eu lieu depuis le début de sa lecture en base (compteur de génération,
+comparé dans un script Lua côté Redis) : un solde lu avant un débit
+concurrent n'est jamais remis en cache après lui. Écrire le nouveau
+solde directement (write-through) ne le garantirait pas : deux écritures
+concurrentes peuvent mettre à jour le cache dans l'ordre inverse de
+leurs commits.
+
+Ce qui est garanti :
+- dans un worker, aucun solde antérieur à la dernière écriture de ce
+  worker n'est servi après l'invalidation qui la suit
+- avec Redis, il en va de même pour les écritures de tous les workers,
+  au délai CREDITS_BALANCE_CACHE_LOCAL_TTL près (LRU local de chaque
+  worker)
+- sans Redis, une écriture faite par un autre worker n'est vue qu'à
+  l'expiration de l'entrée (CREDITS_BALANCE_CACHE_TTL)
+- une écriture faite hors de l'application (SQL direct) n'est vue qu'à
+  l'expiration de l'entrée
+
+Le débit lui-même est toujours conditionné par la base (voir
+credit_service) : un solde en cache périmé ne peut que laisser tenter un
+débit refusé (402), pas passer le solde sous zéro.
+
+Deux niveaux :
+- LRU en mémoire, par worker
+- Redis optionnel (CREDITS_BALANCE_CACHE_REDIS_URL), partagé entre les
+  workers ; le LRU local ne sert alors que de tampon de courte durée
+  (CREDITS_BALANCE_CACHE_LOCAL_TTL) pour borner l'écart entre workers
+
+Redis indisponible ou paquet `redis` absent : le cache reste local.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from app.config.settings import settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # dépendance optionnelle
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Écrit le solde seulement si la génération n'a pas bougé depuis la lecture
+# KEYS[1] = solde, KEYS[2] = génération ; ARGV = génération lue, valeur, TTL
+FILL_IF_UNCHANGED = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class FillToken(NamedTuple):
+    """Générations (locale, Redis) relevées avant la lecture en base."""
+    local: int
+    redis: Optional[str]
+
+
+class CreditBalance(NamedTuple):
+    """Solde d'un utilisateur (mêmes champs que UserCredits)."""
+    credits_balance: int
+    bonus_credits: int
+
+    @property
+    def total_available(self) -> int:
+        return self.credits_balance + self.bonus_credits
+
+    def can_afford(self, amount: int) -> bool:
+        return self.total_available >= amount
+
+
+class CreditBalanceCache:
+    """LRU local avec TTL, adossé à Redis si configuré, et métriques hit/miss."""
+
+    def __init__(
+            self,
+            max_entries: int,
+            ttl_seconds: float,
+            redis_url: Optional[str] = None,
+            local_ttl_seconds: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[UUID, tuple[float, CreditBalance]] = OrderedDict()
+
+        # Génération locale : dernière invalidation par utilisateur (bornée ;
+        # les plus anciennes oubliées remontent _generation_floor)
+        self._generation = 0
+        self._invalidated: OrderedDict[UUID, int] = OrderedDict()
+        self._generation_floor = 0
+
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("CREDITS_BALANCE_CACHE_REDIS_URL défini mais le paquet redis est absent : cache local")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        # Avec Redis, le niveau local doit expirer vite (écritures des autres workers)
+        self.local_ttl_seconds = (
+            min(ttl_seconds, local_ttl_seconds or ttl_seconds) if self._redis is not None else ttl_seconds
+        )
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.stale_fills = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    async def get(self, user_id: UUID) -> Optional[CreditBalance]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.local_hits += 1
+                return entry[1]
+            del self._entries[user_id]
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self._key(user_id))
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Lecture du solde en cache Redis en échec", exc_info=True)
+                raw = None
+            if raw:
+                balance, _, bonus = raw.partition(":")
+                value = CreditBalance(int(balance), int(bonus))
+                self._store_local(user_id, value)
+                self.redis_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def fill_token(self, user_id: UUID) -> FillToken:
+        """À relever avant de lire le solde en base (voir fill)."""
+        redis_generation = None
+        if self._redis is not None:
+            try:
+                redis_generation = await self._redis.get(self._generation_key(user_id)) or "0"
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Lecture de la génération du solde en cache Redis en échec", exc_info=True)
+        return FillToken(self._generation, redis_generation)
+
+    async def fill(
+            self,
+            user_id: UUID,
+            token: FillToken,
+            credits_balance: int,
+            bonus_credits: int
+    ) -> CreditBalance:
+        """
+        Met en cache un solde lu en base après fill_token, sauf si une
+        invalidation a eu lieu entre-temps (le solde lu est peut-être
+        antérieur à cette écriture).
+        """
+        value = CreditBalance(credits_balance, bonus_credits)
+        if self._invalidated.get(user_id, self._generation_floor) > token.local:
+            self.stale_fills += 1
+            return value
+
+        if self._redis is not None:
+            if token.redis is None:
+                # Génération Redis inconnue : pas de remplissage sûr
+                return value
+            try:
+                stored = await self._redis.eval(
+                    FILL_IF_UNCHANGED, 2,
+                    self._key(user_id), self._generation_key(user_id),
+                    token.redis, f"{credits_balance}:{bonus_credits}", max(1, int(self.ttl_seconds))
+                )
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Écriture du solde en cache Redis en échec", exc_info=True)
+                return value
+            if not stored:
+                self.stale_fills += 1
+                return value
+            # Invalidation locale pendant l'aller-retour Redis
+            if self._invalidated.get(user_id, self._generation_floor) > token.local:
+                self.stale_fills += 1
+                return value
+
+        self.writes += 1
+        self._store_local(user_id, value)
+        return value
+
+    async def invalidate(self, user_id: UUID) -> None:
+        """Oublie le solde (à appeler après le commit de toute écriture sur UserCredits)."""
+        self.invalidations += 1
+        self._entries.pop(user_id, None)
+
+        self._generation += 1
+        self._invalidated[user_id] = self._generation
+        self._invalidated.move_to_end(user_id)
+        while len(self._invalidated) > max(self.max_entries, 1):
+            _, generation = self._invalidated.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, generation)
+
+        if self._redis is not None:
+            try:
+                async with self._redis.pipeline(transaction=True) as pipe:
+                    pipe.delete(self._key(user_id))
+                    pipe.incr(self._generation_key(user_id))
+                    pipe.expire(self._generation_key(user_id), max(1, int(self.ttl_seconds)) * 2)
+                    await pipe.execute()
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Invalidation du solde en cache Redis en échec", exc_info=True)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "backend": "redis" if self._redis is not None else "local",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "stale_fills": self.stale_fills,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+        }
+
+    # ============================================================
+    # INTERNE
+    # ============================================================
+
+    @staticmethod
+    def _key(user_id: UUID) -> str:
+        return f"credits:balance:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: UUID) -> str:
+        return f"credits:balance:gen:{user_id}"
+
+    def _store_local(self, user_id: UUID, value: CreditBalance) -> None:
+        self._entries[user_id] = (time.monotonic() + self.local_ttl_seconds, value)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Singleton
+credit_cache = CreditBalanceCache(
+    max_entries=settings.CREDITS_BALANCE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CREDITS_BALANCE_CACHE_TTL,
+    redis_url=settings.CREDITS_BALANCE_CACHE_REDIS_URL,
+    local_ttl_seconds=settings.CREDITS_BALANCE_CACHE_LOCAL_TTL,
+)
@@ -1,16 +1,24 @@
-from uuid import UUID
-from sqlalchemy import select
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from uuid import UUID, uuid4
+from sqlalchemy import select, update, insert, literal, func, true
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
-from app.models import UserCredits
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models import UserCredits, CreditTransaction, CreditReservation
+from app.models.enums import CreditTransactionTypeEnum, CreditReservationStatusEnum
+from app.services.credit_cache import credit_cache, CreditBalance
+
+logger = logging.getLogger(__name__)
 
 
 async def check_credits(user_id: UUID, required: int, db: AsyncSession) -> bool:
     """Vérifie si l'utilisateur a assez de crédits."""
-    stmt = select(UserCredits).where(UserCredits.user_id == user_id)
-    result = await db.execute(stmt)
-    credits = result.scalar_one_or_none()
+    credits = await get_cached_balance(user_id, db)
 
     if not credits:
         return False
@@ -18,6 +26,76 @@ async def check_credits(user_id: UUID, required: int, db: AsyncSession) -> bool:
     return credits.total_available >= required
 
 
+def build_consume_statement(
+        user_id: UUID,
+        amount: int,
+        description: str = None,
+        session_id: UUID = None
+):
+    """
+    Débit atomique + écriture au ledger, en une seule requête :
+
+        WITH debited AS (
+            UPDATE user_credits SET ...           -- bonus d'abord, puis balance
+            WHERE user_id = :user_id AND credits_balance + bonus_credits >= :amount
+            RETURNING user_id, credits_balance, bonus_credits, ... AS balance_after
+        ),
+        ledger AS (INSERT INTO credit_transactions (...) SELECT ... FROM debited)
+        SELECT balance_after, credits_balance, bonus_credits FROM debited
+
+    Dans le SET, chaque expression voit les valeurs d'avant l'UPDATE.
+    La condition du WHERE est réévaluée sous le verrou de ligne : deux débits
+    concurrents ne peuvent pas passer le solde sous zéro. Aucune ligne
+    retournée = crédits insuffisants (ou pas de compte de crédits).
+    """
+    credits = UserCredits.__table__
+    ledger = CreditTransaction.__table__
+
+    debited = update(credits).where(
+        credits.c.user_id == user_id,
+        credits.c.credits_balance + credits.c.bonus_credits >= amount
+    ).values(
+        bonus_credits=func.greatest(credits.c.bonus_credits - amount, 0),
+        credits_balance=credits.c.credits_balance - func.greatest(amount - credits.c.bonus_credits, 0),
+        credits_used_this_month=credits.c.credits_used_this_month + amount,
+        total_credits_used=credits.c.total_credits_used + amount,
+    ).returning(
+        credits.c.user_id,
+        credits.c.credits_balance,
+        credits.c.bonus_credits,
+        (credits.c.credits_balance + credits.c.bonus_credits).label("balance_after")
+    ).cte("debited")
+
+    # Même ligne que CreditTransaction.create_usage
+    usage = CreditTransaction.create_usage(
+        user_id=user_id,
+        amount=amount,
+        balance_after=0,
+        session_id=session_id,
+        description=description
+    )
+
+    usage_row = insert(ledger).from_select(
+        ["id", "user_id", "amount", "type", "description", "session_id", "balance_after", "created_at"],
+        select(
+            literal(uuid4(), ledger.c.id.type),
+            debited.c.user_id,
+            literal(usage.amount, ledger.c.amount.type),
+            literal(usage.type, ledger.c.type.type),
+            literal(usage.description, ledger.c.description.type),
+            literal(usage.session_id, ledger.c.session_id.type),
+            debited.c.balance_after,
+            func.now(),
+        )
+    ).cte("ledger")
+
+    return select(
+        debited.c.balance_after,
+        debited.c.credits_balance,
+        debited.c.bonus_credits,
+    ).add_cte(debited, usage_row)
+
+
 async def consume_credits(
         user_id: UUID,
         amount: int,
@@ -27,45 +105,397 @@ async def consume_credits(
 ) -> int:
     """
     Consomme des crédits et retourne le solde restant.
-    Raise HTTPException si pas assez de crédits.
+
+    Un seul aller-retour (voir build_consume_statement) : débit conditionnel
+    et transaction au ledger dans la même requête, puis commit. Le solde
+    en cache est invalidé (voir credit_cache).
+    Raise HTTPException 402 si pas assez de crédits.
     """
-    stmt = select(UserCredits).where(UserCredits.user_id == user_id)
-    result = await db.execute(stmt)
-    credits = result.scalar_one_or_none()
-
-    if not credits or credits.total_available < amount:
-        raise HTTPException(
-            status_code=402,
-            detail={
-                "message": "Crédits insuffisants",
-                "required": amount,
-                "available": credits.total_available if credits else 0
-            }
-        )
+    result = await db.execute(build_consume_statement(user_id, amount, description, session_id))
+    row = result.one_or_none()
 
-    # Utiliser d'abord les bonus, puis les crédits normaux
-    if credits.bonus_credits >= amount:
-        credits.bonus_credits -= amount
-    elif credits.bonus_credits > 0:
-        remaining = amount - credits.bonus_credits
-        credits.bonus_credits = 0
-        credits.credits_balance -= remaining
-    else:
-        credits.credits_balance -= amount
+    if row is None:
+        raise await insufficient_credits(user_id, amount, db)
 
-    credits.total_credits_used += amount
+    await db.commit()
+    await credit_cache.invalidate(user_id)
 
-    # TODO: Créer une transaction dans credit_transactions
+    return row.balance_after
 
-    await db.commit()
 
-    return credits.total_available
+async def insufficient_credits(user_id: UUID, required: int, db: AsyncSession) -> HTTPException:
+    """
+    Erreur 402 après un débit refusé par la base. Le solde en cache est
+    relu depuis la base : s'il a permis de tenter le débit, il était périmé.
+    """
+    await credit_cache.invalidate(user_id)
+    return HTTPException(
+        status_code=402,
+        detail={
+            "message": "Crédits insuffisants",
+            "required": required,
+            "available": await get_credits_balance(user_id, db)
+        }
+    )
 
 
 async def get_credits_balance(user_id: UUID, db: AsyncSession) -> int:
     """Retourne le solde total de crédits."""
-    stmt = select(UserCredits).where(UserCredits.user_id == user_id)
+    credits = await get_cached_balance(user_id, db)
+
+    return credits.total_available if credits else 0
+
+
+async def get_cached_balance(user_id: UUID, db: AsyncSession) -> Optional[CreditBalance]:
+    """
+    Solde de l'utilisateur, depuis le cache ; lu en base (puis mis en
+    cache) seulement s'il n'y est pas. Le remplissage est abandonné si
+    une écriture a invalidé le solde pendant la lecture.
+
+    Returns:
+        None si l'utilisateur n'a pas de compte de crédits
+    """
+    cached = await credit_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    token = await credit_cache.fill_token(user_id)
+    stmt = select(UserCredits.credits_balance, UserCredits.bonus_credits).where(
+        UserCredits.user_id == user_id
+    )
     result = await db.execute(stmt)
-    credits = result.scalar_one_or_none()
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    return await credit_cache.fill(user_id, token, row.credits_balance, row.bonus_credits)
+
+
+# ============================================================
+# RÉSERVATIONS (HOLD / SETTLE / RELEASE)
+# ============================================================
+#
+# Pour un échange long (stream, boucle de tools), les crédits sont
+# réservés avant l'appel LLM puis réglés à la fin. Chaque étape est une
+# requête courte et commitée : aucune transaction ne reste ouverte pendant
+# le stream. Une réservation jamais réglée (crash, worker tué) expire et
+# est rendue par le sweeper (voir credit_sweeper).
+
+
+@asynccontextmanager
+async def _credits_session(db: Optional[AsyncSession]) -> AsyncIterator[AsyncSession]:
+    """Session fournie, ou session courte dédiée (hors requête, ex: fin de stream)."""
+    if db is not None:
+        yield db
+        return
+    async with AsyncSessionLocal() as own_db:
+        yield own_db
+
+
+def build_reserve_statement(
+        user_id: UUID,
+        amount: int,
+        expires_at: datetime,
+        description: str = None,
+        session_id: UUID = None
+):
+    """
+    Réservation atomique, en une seule requête :
+
+        WITH locked AS (SELECT ... FROM user_credits WHERE ... FOR UPDATE),
+             held AS (UPDATE user_credits ... FROM locked RETURNING ...)
+             reserved AS (INSERT INTO credit_reservations (...) SELECT ... FROM held RETURNING id)
+        SELECT reserved.id, held.credits_balance, held.bonus_credits ...
+
+    Même répartition que build_consume_statement (bonus d'abord) ; locked
+    lit le bonus d'avant l'UPDATE pour mémoriser la part bonus du hold.
+    Aucune ligne retournée = crédits insuffisants.
+    """
+    credits = UserCredits.__table__
+    reservations = CreditReservation.__table__
+
+    locked = select(
+        credits.c.user_id,
+        credits.c.bonus_credits,
+    ).where(
+        credits.c.user_id == user_id,
+        credits.c.credits_balance + credits.c.bonus_credits >= amount
+    ).with_for_update().cte("locked")
+
+    held = update(credits).where(
+        credits.c.user_id == locked.c.user_id
+    ).values(
+        bonus_credits=func.greatest(credits.c.bonus_credits - amount, 0),
+        credits_balance=credits.c.credits_balance - func.greatest(amount - credits.c.bonus_credits, 0),
+    ).returning(
+        credits.c.user_id,
+        credits.c.credits_balance,
+        credits.c.bonus_credits,
+        func.least(locked.c.bonus_credits, amount).label("bonus_amount")
+    ).cte("held")
+
+    reserved = insert(reservations).from_select(
+        ["id", "user_id", "session_id", "amount", "bonus_amount", "status", "description", "created_at", "expires_at"],
+        select(
+            literal(uuid4(), reservations.c.id.type),
+            held.c.user_id,
+            literal(session_id, reservations.c.session_id.type),
+            literal(amount, reservations.c.amount.type),
+            held.c.bonus_amount,
+            literal(CreditReservationStatusEnum.HELD, reservations.c.status.type),
+            literal(description, reservations.c.description.type),
+            func.now(),
+            literal(expires_at, reservations.c.expires_at.type),
+        )
+    ).returning(reservations.c.id).cte("reserved")
+
+    return select(
+        reserved.c.id,
+        held.c.credits_balance,
+        held.c.bonus_credits,
+    ).select_from(reserved).join(held, true()).add_cte(locked, held)
+
+
+def _refund_values(credits, amount, bonus_amount, used):
+    """
+    SET de user_credits pour rendre amount - used crédits d'une réservation :
+    d'abord sur credits_balance (dans la limite de ce qui y avait été pris),
+    le reste sur bonus_credits.
+    """
+    refund = amount - used
+    to_balance = func.least(refund, amount - bonus_amount)
+    return {
+        "credits_balance": credits.c.credits_balance + to_balance,
+        "bonus_credits": credits.c.bonus_credits + refund - to_balance,
+        "credits_used_this_month": credits.c.credits_used_this_month + used,
+        "total_credits_used": credits.c.total_credits_used + used,
+    }
+
+
+def build_close_statement(
+        reservation_id: UUID,
+        used: int,
+        status: CreditReservationStatusEnum,
+        session_id: UUID = None
+):
+    """
+    Clôture d'une réservation encore HELD, en une seule requête :
+
+        WITH closed AS (UPDATE credit_reservations ... WHERE status = 'HELD' RETURNING ...),
+             refunded AS (UPDATE user_credits ... FROM closed RETURNING balance_after),
+             ledger AS (INSERT INTO credit_transactions ... WHERE used > 0)
+        SELECT balance_after, credits_balance, bonus_credits FROM refunded
+
+    used est plafonné au montant réservé ; le reste est rendu. Aucune ligne
+    retournée = réservation inconnue ou déjà close (réglée, expirée).
+    """
+    credits = UserCredits.__table__
+    reservations = CreditReservation.__table__
+    ledger = CreditTransaction.__table__
+
+    values = {
+        "status": status,
+        "settled_amount": func.least(used, reservations.c.amount),
+        "closed_at": func.now(),
+    }
+    if session_id is not None:
+        values["session_id"] = session_id
+
+    closed = update(reservations).where(
+        reservations.c.id == reservation_id,
+        reservations.c.status == CreditReservationStatusEnum.HELD
+    ).values(values).returning(
+        reservations.c.user_id,
+        reservations.c.amount,
+        reservations.c.bonus_amount,
+        reservations.c.settled_amount,
+        reservations.c.session_id,
+        reservations.c.description,
+    ).cte("closed")
+
+    refunded = update(credits).where(
+        credits.c.user_id == closed.c.user_id
+    ).values(
+        _refund_values(credits, closed.c.amount, closed.c.bonus_amount, closed.c.settled_amount)
+    ).returning(
+        credits.c.user_id,
+        credits.c.credits_balance,
+        credits.c.bonus_credits,
+        (credits.c.credits_balance + credits.c.bonus_credits).label("balance_after")
+    ).cte("refunded")
+
+    # Ligne d'usage au ledger pour le montant réellement consommé
+    usage = insert(ledger).from_select(
+        ["id", "user_id", "amount", "type", "description", "session_id", "balance_after", "created_at"],
+        select(
+            literal(uuid4(), ledger.c.id.type),
+            refunded.c.user_id,
+            -closed.c.settled_amount,
+            literal(CreditTransactionTypeEnum.USAGE, ledger.c.type.type),
+            func.coalesce(closed.c.description, "Utilisation de crédits"),
+            closed.c.session_id,
+            refunded.c.balance_after,
+            func.now(),
+        ).where(closed.c.settled_amount > 0)
+    ).cte("usage")
+
+    return select(
+        refunded.c.user_id,
+        refunded.c.balance_after,
+        refunded.c.credits_balance,
+        refunded.c.bonus_credits,
+    ).add_cte(closed, refunded, usage)
+
+
+async def reserve_credits(
+        user_id: UUID,
+        amount: int,
+        description: str = None,
+        session_id: UUID = None,
+        expires_in: float = None,
+        db: AsyncSession = None
+) -> UUID:
+    """
+    Réserve des crédits (retirés du solde disponible jusqu'au règlement).
+
+    Returns:
+        L'ID de la réservation, à passer à settle_credits / release_credits
+    Raises:
+        HTTPException 402: Si pas assez de crédits
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=expires_in if expires_in is not None else settings.CREDITS_RESERVATION_TTL
+    )
+
+    async with _credits_session(db) as db:
+        result = await db.execute(
+            build_reserve_statement(user_id, amount, expires_at, description, session_id)
+        )
+        row = result.one_or_none()
+
+        if row is None:
+            raise await insufficient_credits(user_id, amount, db)
+
+        await db.commit()
+
+    await credit_cache.invalidate(user_id)
+    return row.id
+
+
+async def settle_credits(
+        reservation_id: UUID,
+        amount: int,
+        session_id: UUID = None,
+        db: AsyncSession = None
+) -> Optional[int]:
+    """
+    Règle une réservation : débite amount (au plus le montant réservé),
+    rend le reste et écrit la ligne d'usage au ledger.
+
+    Si la réservation a expiré entre-temps (crédits déjà rendus par le
+    sweeper), le montant est débité normalement ; un solde devenu
+    insuffisant est journalisé sans erreur (la réponse est déjà servie).
+
+    Returns:
+        Le solde restant, ou None si rien n'a pu être réglé
+    """
+    async with _credits_session(db) as db:
+        result = await db.execute(build_close_statement(
+            reservation_id, amount, CreditReservationStatusEnum.SETTLED, session_id
+        ))
+        row = result.one_or_none()
+        if row is not None:
+            await db.commit()
+            await credit_cache.invalidate(row.user_id)
+            return row.balance_after
+
+        reservation = await db.get(CreditReservation, reservation_id)
+        if reservation is None or reservation.status != CreditReservationStatusEnum.EXPIRED or amount <= 0:
+            logger.warning("Réservation de crédits %s introuvable ou déjà close", reservation_id)
+            return None
+
+        try:
+            return await consume_credits(
+                user_id=reservation.user_id,
+                amount=min(amount, reservation.amount),
+                description=reservation.description,
+                session_id=session_id or reservation.session_id,
+                db=db
+            )
+        except HTTPException:
+            logger.warning(
+                "Réservation %s expirée et crédits insuffisants : %s crédit(s) non facturé(s)",
+                reservation_id, amount
+            )
+            return None
+
+
+async def release_credits(reservation_id: UUID, db: AsyncSession = None) -> Optional[int]:
+    """
+    Annule une réservation (erreur, déconnexion) : tout est rendu.
+
+    Returns:
+        Le solde restant, ou None si la réservation était déjà close
+    """
+    async with _credits_session(db) as db:
+        result = await db.execute(build_close_statement(
+            reservation_id, 0, CreditReservationStatusEnum.RELEASED
+        ))
+        row = result.one_or_none()
+        await db.commit()
+
+    if row is None:
+        return None
+    await credit_cache.invalidate(row.user_id)
+    return row.balance_after
+
+
+def build_expire_statement(limit: int):
+    """
+    Expiration d'un lot de réservations échues, en une seule requête :
+    verrouillage sans attente (SKIP LOCKED, plusieurs workers peuvent
+    balayer en même temps), remboursement agrégé par utilisateur.
+    Une ligne par utilisateur remboursé : nouveau solde et nombre de
+    réservations expirées.
+    """
+    credits = UserCredits.__table__
+    reservations = CreditReservation.__table__
+
+    due = select(reservations.c.id).where(
+        reservations.c.status == CreditReservationStatusEnum.HELD,
+        reservations.c.expires_at < func.now()
+    ).order_by(
+        reservations.c.expires_at
+    ).limit(limit).with_for_update(skip_locked=True).scalar_subquery()
+
+    expired = update(reservations).where(
+        reservations.c.id.in_(due)
+    ).values(
+        status=CreditReservationStatusEnum.EXPIRED,
+        settled_amount=0,
+        closed_at=func.now(),
+    ).returning(
+        reservations.c.user_id,
+        reservations.c.amount,
+        reservations.c.bonus_amount,
+    ).cte("expired")
+
+    totals = select(
+        expired.c.user_id,
+        func.sum(expired.c.amount).label("amount"),
+        func.sum(expired.c.bonus_amount).label("bonus_amount"),
+        func.count().label("reservations"),
+    ).group_by(expired.c.user_id).cte("totals")
+
+    refunded = update(credits).where(
+        credits.c.user_id == totals.c.user_id
+    ).values(
+        _refund_values(credits, totals.c.amount, totals.c.bonus_amount, 0)
+    ).returning(
+        credits.c.user_id,
+        credits.c.credits_balance,
+        credits.c.bonus_credits,
+        totals.c.reservations,
+    ).cte("refunded")
 
-    return credits.total_available if credits else 0
\ No newline at end of file
+    return select(refunded).add_cte(expired, totals)
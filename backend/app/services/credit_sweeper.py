@@ -0,0 +1,113 @@
+# services/credit_sweeper.py
+"""
+Sweeper des réservations de crédits expirées.
+
+Une réservation jamais réglée ni annulée (worker tué pendant un stream,
+erreur non rattrapée) passe EXPIRED à son échéance et ses crédits sont
+rendus. Balayage périodique par lots (SKIP LOCKED : plusieurs workers
+peuvent tourner en même temps sans se bloquer).
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.services.credit_cache import credit_cache
+from app.services.credit_service import build_expire_statement
+
+logger = logging.getLogger(__name__)
+
+
+class CreditReservationSweeper:
+    """Tâche de fond qui rend les crédits des réservations expirées."""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs_total = 0
+        self.expired_total = 0
+        self.errors_total = 0
+        self.last_run_at: Optional[float] = None
+
+    # ============================================================
+    # CYCLE DE VIE
+    # ============================================================
+
+    async def start(self) -> None:
+        """Lance le balayage périodique (appelé dans le lifespan)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ============================================================
+    # BALAYAGE
+    # ============================================================
+
+    async def sweep(self) -> int:
+        """
+        Expire toutes les réservations échues, lot par lot.
+
+        Returns:
+            Le nombre de réservations expirées
+        """
+        expired = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(build_expire_statement(self.batch_size))
+                refunded = result.all()
+                await db.commit()
+
+            for row in refunded:
+                await credit_cache.invalidate(row.user_id)
+            count = sum(row.reservations for row in refunded)
+
+            expired += count
+            if count < self.batch_size:
+                break
+
+        self.runs_total += 1
+        self.expired_total += expired
+        self.last_run_at = time.time()
+        if expired:
+            logger.info("%s réservation(s) de crédits expirée(s) et rendue(s)", expired)
+        return expired
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors_total += 1
+                logger.warning("Balayage des réservations de crédits en échec", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs_total": self.runs_total,
+            "expired_total": self.expired_total,
+            "errors_total": self.errors_total,
+            "last_run_at": self.last_run_at,
+        }
+
+
+# Singleton
+reservation_sweeper = CreditReservationSweeper(
+    interval=settings.CREDITS_SWEEP_INTERVAL,
+    batch_size=settings.CREDITS_SWEEP_BATCH_SIZE,
+)
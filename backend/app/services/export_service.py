@@ -0,0 +1,206 @@
+# services/export_service.py
+"""
+Export de l'historique de mentorat d'un utilisateur (RGPD, analytics).
+
+Sessions et messages sont lus depuis un curseur serveur (stream) en une
+seule requête ordonnée, et écrits en NDJSON au fil de l'eau (optionnellement
+gzip) : la mémoire reste constante quelle que soit la taille de l'historique.
+
+Une ligne par enregistrement :
+    {"type": "session", "cursor": "...", ...}
+    {"type": "message", "cursor": "...", "session_id": "...", ...}
+    {"type": "end", "sessions": n, "messages": n}
+
+Chaque ligne porte un curseur : relancer l'export avec le curseur de la
+dernière ligne reçue reprend juste après elle (sans répéter l'en-tête de
+session si la coupure a eu lieu au milieu de ses messages).
+"""
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, or_, select, tuple_
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models import MentoringSession, SessionMessage, Skill, Topic
+from app.services.chat_service import decode_cursor, encode_cursor
+
+SESSION_COLUMNS = (
+    MentoringSession.id,
+    MentoringSession.title,
+    MentoringSession.status,
+    MentoringSession.message_count,
+    MentoringSession.credits_consumed,
+    MentoringSession.total_tokens_used,
+    MentoringSession.satisfaction_rating,
+    MentoringSession.feedback_text,
+    MentoringSession.started_at,
+    MentoringSession.last_message_at,
+    MentoringSession.ended_at,
+)
+
+MESSAGE_COLUMNS = (
+    SessionMessage.id,
+    SessionMessage.role,
+    SessionMessage.content,
+    SessionMessage.tokens_used,
+    SessionMessage.credits_cost,
+    SessionMessage.llm_used,
+    SessionMessage.tool_called,
+    SessionMessage.feedback_helpful,
+    SessionMessage.feedback_text,
+    SessionMessage.created_at,
+)
+
+
+# ============================================================
+# CURSEUR DE REPRISE
+# ============================================================
+
+def encode_export_cursor(
+        session_position: tuple[datetime, UUID],
+        message_position: Optional[tuple[datetime, UUID]] = None
+) -> str:
+    """Curseur "<session>[.<message>]" (positions keyset encodées par encode_cursor)."""
+    cursor = encode_cursor(*session_position)
+    if message_position is not None:
+        cursor += "." + encode_cursor(*message_position)
+    return cursor
+
+
+def decode_export_cursor(
+        cursor: str
+) -> tuple[tuple[datetime, UUID], Optional[tuple[datetime, UUID]]]:
+    """
+    Raises:
+        HTTPException 400: Si le curseur est invalide
+    """
+    session_part, _, message_part = cursor.partition(".")
+    return decode_cursor(session_part), decode_cursor(message_part) if message_part else None
+
+
+# ============================================================
+# EXPORT
+# ============================================================
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def _line(record: dict) -> bytes:
+    return json.dumps(record, default=_json_default, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def build_export_query(user_id: UUID, cursor: Optional[str] = None):
+    """Sessions de l'utilisateur et leurs messages, dans l'ordre keyset de l'export."""
+    stmt = select(
+        *SESSION_COLUMNS,
+        Skill.slug.label("skill_slug"),
+        Topic.slug.label("topic_slug"),
+        *(column.label(f"message_{column.key}") for column in MESSAGE_COLUMNS),
+    ).select_from(MentoringSession).outerjoin(
+        Skill, Skill.id == MentoringSession.skill_id
+    ).outerjoin(
+        Topic, Topic.id == MentoringSession.topic_id
+    ).outerjoin(
+        SessionMessage, SessionMessage.session_id == MentoringSession.id
+    ).where(
+        MentoringSession.user_id == user_id
+    )
+
+    if cursor:
+        session_position, message_position = decode_export_cursor(cursor)
+        session_key = tuple_(MentoringSession.started_at, MentoringSession.id)
+        message_key = tuple_(SessionMessage.created_at, SessionMessage.id)
+
+        # Sessions suivantes, ou suite de la session en cours
+        same_session = session_key == tuple_(*session_position)
+        if message_position is not None:
+            same_session = and_(same_session, message_key > tuple_(*message_position))
+        stmt = stmt.where(or_(session_key > tuple_(*session_position), same_session))
+
+    return stmt.order_by(
+        MentoringSession.started_at,
+        MentoringSession.id,
+        SessionMessage.created_at,
+        SessionMessage.id,
+    )
+
+
+async def stream_export(user_id: UUID, cursor: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Lignes NDJSON de l'export, lues par lots depuis un curseur serveur.
+
+    Utilise sa propre session BD : le stream peut survivre à la requête.
+    Le curseur doit avoir été validé avant (decode_export_cursor) pour
+    qu'une erreur soit un 400 et non une réponse tronquée.
+    """
+    resumed_session = decode_export_cursor(cursor)[0] if cursor else None
+    stmt = build_export_query(user_id, cursor).execution_options(
+        yield_per=settings.MENTORING_EXPORT_BATCH_SIZE
+    )
+
+    sessions = 0
+    messages = 0
+    current_session = None
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for row in result:
+            position = (row.started_at, row.id)
+
+            if row.id != current_session:
+                current_session = row.id
+                # Reprise au milieu d'une session : en-tête déjà reçu
+                if position != resumed_session:
+                    sessions += 1
+                    yield _line({
+                        "type": "session",
+                        "cursor": encode_export_cursor(position),
+                        "skill_slug": row.skill_slug,
+                        "topic_slug": row.topic_slug,
+                        **{column.key: row._mapping[column.key] for column in SESSION_COLUMNS},
+                    })
+
+            if row.message_id is not None:
+                messages += 1
+                yield _line({
+                    "type": "message",
+                    "cursor": encode_export_cursor(position, (row.message_created_at, row.message_id)),
+                    "session_id": row.id,
+                    **{column.key: row._mapping[f"message_{column.key}"] for column in MESSAGE_COLUMNS},
+                })
+
+    yield _line({"type": "end", "sessions": sessions, "messages": messages})
+
+
+async def chunked(lines: AsyncIterator[bytes], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Regroupe les lignes en blocs (moins d'envois ASGI, mémoire bornée)."""
+    buffer = bytearray()
+    async for line in lines:
+        buffer.extend(line)
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def gzip_stream(lines: AsyncIterator[bytes], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Compresse un flux d'octets en gzip par blocs (mémoire constante)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunked(lines, chunk_size):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
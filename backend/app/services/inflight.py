@@ -0,0 +1,112 @@
+# services/inflight.py
+"""
+Primitives de coordination en mémoire (par worker) :
+
+- KeyedLocks : un verrou asyncio par clé (ex: une session de mentorat),
+  pour sérialiser les écritures dans un même thread Backboard
+- SingleFlight : coalesce les appels identiques en cours ; les doublons
+  attendent le résultat du premier au lieu de refaire le travail
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+
+class KeyedLocks:
+    """
+    Verrous asyncio indexés par clé, libérés dès qu'ils ne sont plus utilisés.
+
+    Usage:
+        locks = KeyedLocks()
+        async with locks.hold(session_id):
+            ...
+    """
+
+    def __init__(self):
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    def is_locked(self, key: Hashable) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class SingleFlight:
+    """
+    Déduplication des appels concurrents ("single-flight").
+
+    Le premier appel pour une clé exécute la fonction ; les appels suivants
+    avec la même clé, tant qu'il est en cours, reçoivent le même résultat
+    (ou la même exception). Avec retain_seconds, le résultat est aussi
+    rejoué pendant ce délai après la fin (clés d'idempotence).
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self._results: dict[Hashable, tuple[float, asyncio.Future]] = {}
+        self.coalesced_total = 0
+        self.replayed_total = 0
+
+    async def do(
+            self,
+            key: Hashable,
+            fn: Callable[[], Awaitable[Any]],
+            retain_seconds: Optional[float] = None
+    ) -> Any:
+        self._evict_expired()
+
+        retained = self._results.get(key)
+        if retained is not None:
+            self.replayed_total += 1
+            return retained[1].result()
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced_total += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+
+        def _done(done: asyncio.Future) -> None:
+            self._calls.pop(key, None)
+            if retain_seconds and not done.cancelled() and done.exception() is None:
+                self._results[key] = (time.monotonic() + retain_seconds, done)
+
+        future.add_done_callback(_done)
+
+        # Le premier appelant peut être annulé sans annuler les autres
+        return await asyncio.shield(future)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "retained": len(self._results),
+            "coalesced_total": self.coalesced_total,
+            "replayed_total": self.replayed_total,
+        }
@@ -0,0 +1,469 @@
+# services/ledger_service.py
+"""
+Maintenance du ledger de crédits (credit_transactions).
+
+- Partitions mensuelles sur created_at (RANGE), créées quelques mois à
+  l'avance ; une partition DEFAULT évite un INSERT en échec si la
+  maintenance a pris du retard
+- Snapshots de solde par utilisateur (CreditBalanceSnapshot) : le solde
+  selon le ledger se reconstruit depuis le dernier snapshot et la fin du
+  ledger, l'audit reste proportionnel à l'activité récente
+- Archivage : les partitions plus anciennes que la rétention sont
+  détachées (ou supprimées) après un snapshot qui les couvre
+
+Une seule instance exécute la maintenance à la fois (verrou consultatif).
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import func, literal, or_, select, text, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal, engine
+from app.config.settings import settings
+from app.models import CreditBalanceSnapshot, CreditReservation, CreditTransaction, UserCredits
+from app.models.enums import CreditReservationStatusEnum
+
+logger = logging.getLogger(__name__)
+
+LEDGER_TABLE = "credit_transactions"
+PARTITION_PREFIX = f"{LEDGER_TABLE}_p"
+DEFAULT_PARTITION = f"{LEDGER_TABLE}_default"
+
+# Clé du verrou consultatif de la maintenance (arbitraire, stable)
+MAINTENANCE_LOCK_KEY = 0x4C454447  # "LEDG"
+
+
+# ============================================================
+# PARTITIONS
+# ============================================================
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Mois couvert par une partition nommée par partition_name (None sinon)."""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m").date()
+    except ValueError:
+        return None
+
+
+async def list_partitions(db: AsyncSession) -> list[date]:
+    """Mois des partitions mensuelles attachées, triés."""
+    result = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": LEDGER_TABLE})
+    months = (partition_month(name) for name in result.scalars())
+    return sorted(month for month in months if month is not None)
+
+
+async def _create_partition(db: AsyncSession, month: date) -> int:
+    """
+    Crée la partition d'un mois. Les lignes déjà tombées dans la partition
+    DEFAULT pour ce mois (maintenance en retard) y sont déplacées : sinon
+    CREATE ... PARTITION OF échouerait sur la contrainte de DEFAULT.
+
+    Returns:
+        Le nombre de lignes déplacées depuis DEFAULT
+    """
+    name = partition_name(month)
+    bounds = {
+        "start": datetime.combine(month, datetime.min.time(), timezone.utc),
+        "end": datetime.combine(add_months(month, 1), datetime.min.time(), timezone.utc),
+    }
+    range_sql = (
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') "
+        f"TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+    )
+    in_range = "created_at >= :start AND created_at < :end"
+
+    stranded = await db.scalar(text(
+        f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE {in_range})'
+    ), bounds)
+    if not stranded:
+        await db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{LEDGER_TABLE}" {range_sql}'
+        ))
+        return 0
+
+    # Une seule transaction : table autonome, déplacement, puis rattachement
+    # (ATTACH vérifie que DEFAULT n'a plus de ligne dans l'intervalle)
+    await db.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "{LEDGER_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    moved = await db.execute(text(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE {in_range} RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    ), bounds)
+    await db.execute(text(f'ALTER TABLE "{LEDGER_TABLE}" ATTACH PARTITION "{name}" {range_sql}'))
+    return moved.rowcount
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = None) -> list[date]:
+    """
+    Crée les partitions du mois courant et des months_ahead mois suivants.
+
+    Un mois en échec est journalisé sans interrompre les suivants (ni le
+    reste de la maintenance).
+
+    Returns:
+        Les mois créés
+    """
+    if months_ahead is None:
+        months_ahead = settings.CREDITS_LEDGER_PARTITIONS_AHEAD
+
+    existing = set(await list_partitions(db))
+    current = month_start(datetime.now(timezone.utc).date())
+    created = []
+
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        try:
+            moved = await _create_partition(db, month)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.exception("Création de la partition %s en échec", partition_name(month))
+            continue
+        if moved:
+            logger.warning(
+                "%s ligne(s) déplacée(s) de %s vers %s",
+                moved, DEFAULT_PARTITION, partition_name(month)
+            )
+        created.append(month)
+
+    if created:
+        logger.info("Partitions du ledger créées : %s", ", ".join(map(partition_name, created)))
+    return created
+
+
+# ============================================================
+# SNAPSHOTS
+# ============================================================
+
+def _ledger_tail(user_id_column, snapshot_at_column, until: datetime):
+    """
+    Transactions d'un utilisateur après son dernier snapshot (LATERAL) :
+    nombre, somme, et solde d'ouverture (avant la première transaction)
+    pour un utilisateur encore sans snapshot.
+    """
+    ledger = CreditTransaction.__table__
+    opening = func.array_agg(aggregate_order_by(
+        ledger.c.balance_after - ledger.c.amount,
+        ledger.c.created_at,
+        ledger.c.id
+    ))[1]
+
+    return select(
+        func.count().label("transactions"),
+        func.coalesce(func.sum(ledger.c.amount), 0).label("delta"),
+        opening.label("opening"),
+    ).where(
+        ledger.c.user_id == user_id_column,
+        or_(snapshot_at_column.is_(None), ledger.c.created_at > snapshot_at_column),
+        ledger.c.created_at <= until
+    ).lateral("tail")
+
+
+def _last_snapshot(user_id_column, until: datetime):
+    snapshots = CreditBalanceSnapshot.__table__
+    return select(
+        snapshots.c.balance,
+        snapshots.c.snapshot_at,
+    ).where(
+        snapshots.c.user_id == user_id_column,
+        snapshots.c.snapshot_at <= until
+    ).order_by(
+        snapshots.c.snapshot_at.desc()
+    ).limit(1).lateral("last_snapshot")
+
+
+def build_snapshot_statement(user_ids: list[UUID], cutoff: datetime, min_transactions: int):
+    """
+    Nouveau snapshot (solde au cutoff) pour chaque utilisateur du lot ayant
+    au moins min_transactions transactions depuis son dernier snapshot.
+    Rejouable : un snapshot existant au même instant est conservé.
+    """
+    credits = UserCredits.__table__
+    snapshots = CreditBalanceSnapshot.__table__
+
+    last = _last_snapshot(credits.c.user_id, cutoff)
+    tail = _ledger_tail(credits.c.user_id, last.c.snapshot_at, cutoff)
+
+    rows = select(
+        func.gen_random_uuid(),
+        credits.c.user_id,
+        func.coalesce(last.c.balance, tail.c.opening) + tail.c.delta,
+        tail.c.transactions,
+        literal(cutoff, snapshots.c.snapshot_at.type),
+        func.now(),
+    ).select_from(
+        credits.outerjoin(last, true()).join(tail, true())
+    ).where(
+        credits.c.user_id.in_(user_ids),
+        tail.c.transactions >= max(min_transactions, 1)
+    )
+
+    return pg_insert(snapshots).from_select(
+        ["id", "user_id", "balance", "transactions_count", "snapshot_at", "created_at"],
+        rows
+    ).on_conflict_do_nothing(index_elements=["user_id", "snapshot_at"])
+
+
+async def take_snapshots(
+        cutoff: datetime = None,
+        min_transactions: int = None,
+        batch_size: int = None
+) -> int:
+    """
+    Snapshots de tous les utilisateurs actifs dans le ledger, par lots
+    d'utilisateurs (pagination keyset sur user_credits, une transaction
+    courte par lot).
+
+    Le cutoff par défaut est légèrement dans le passé : une transaction
+    datée avant lui mais pas encore commitée serait sinon oubliée.
+
+    Returns:
+        Le nombre de snapshots écrits
+    """
+    if cutoff is None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.CREDITS_SNAPSHOT_LAG)
+    if min_transactions is None:
+        min_transactions = settings.CREDITS_SNAPSHOT_MIN_TRANSACTIONS
+    batch_size = batch_size or settings.CREDITS_SNAPSHOT_BATCH_SIZE
+
+    written = 0
+    after: Optional[UUID] = None
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            stmt = select(UserCredits.user_id).order_by(UserCredits.user_id).limit(batch_size)
+            if after is not None:
+                stmt = stmt.where(UserCredits.user_id > after)
+            user_ids = list((await db.execute(stmt)).scalars())
+            if not user_ids:
+                break
+
+            result = await db.execute(build_snapshot_statement(user_ids, cutoff, min_transactions))
+            written += result.rowcount or 0
+            await db.commit()
+
+        after = user_ids[-1]
+        if len(user_ids) < batch_size:
+            break
+
+    return written
+
+
+# ============================================================
+# AUDIT
+# ============================================================
+
+def build_ledger_balance_query(user_id: UUID, at: datetime):
+    """Solde selon le ledger à la date at : dernier snapshot + fin du ledger."""
+    user = select(literal(user_id, CreditTransaction.user_id.type).label("user_id")).subquery("u")
+    last = _last_snapshot(user.c.user_id, at)
+    tail = _ledger_tail(user.c.user_id, last.c.snapshot_at, at)
+
+    return select(
+        func.coalesce(last.c.balance, tail.c.opening, 0) + tail.c.delta,
+        last.c.snapshot_at,
+        tail.c.transactions,
+    ).select_from(
+        user.outerjoin(last, true()).join(tail, true())
+    )
+
+
+async def get_ledger_balance(user_id: UUID, db: AsyncSession, at: datetime = None) -> int:
+    """Solde reconstruit depuis le ledger (à une date, par défaut maintenant)."""
+    result = await db.execute(build_ledger_balance_query(user_id, at or datetime.now(timezone.utc)))
+    return result.one()[0]
+
+
+async def audit_balance(user_id: UUID, db: AsyncSession) -> dict:
+    """
+    Compare le solde du ledger au solde courant de UserCredits.
+
+    Les crédits réservés (HELD) sont déjà retirés du solde courant mais pas
+    encore au ledger : drift = courant + réservé - ledger, attendu à 0.
+    """
+    now = datetime.now(timezone.utc)
+    ledger_balance, snapshot_at, tail_transactions = (
+        await db.execute(build_ledger_balance_query(user_id, now))
+    ).one()
+
+    live = (await db.execute(
+        select(UserCredits.credits_balance + UserCredits.bonus_credits).where(UserCredits.user_id == user_id)
+    )).scalar_one_or_none() or 0
+
+    held = (await db.execute(
+        select(func.coalesce(func.sum(CreditReservation.amount), 0)).where(
+            CreditReservation.user_id == user_id,
+            CreditReservation.status == CreditReservationStatusEnum.HELD
+        )
+    )).scalar_one()
+
+    return {
+        "ledger_balance": ledger_balance,
+        "live_balance": live,
+        "held": held,
+        "drift": live + held - ledger_balance,
+        "snapshot_at": snapshot_at,
+        "tail_transactions": tail_transactions,
+    }
+
+
+# ============================================================
+# ARCHIVAGE
+# ============================================================
+
+async def archive_partitions(retention_months: int = None, drop: bool = None) -> list[str]:
+    """
+    Détache (ou supprime) les partitions entièrement plus anciennes que la
+    rétention, après un snapshot à leur borne haute pour chaque utilisateur
+    qui y a des transactions.
+
+    Returns:
+        Les partitions archivées
+    """
+    if retention_months is None:
+        retention_months = settings.CREDITS_LEDGER_RETENTION_MONTHS
+    if drop is None:
+        drop = settings.CREDITS_LEDGER_ARCHIVE_DROP
+
+    oldest_kept = add_months(month_start(datetime.now(timezone.utc).date()), -retention_months)
+    async with AsyncSessionLocal() as db:
+        months = [m for m in await list_partitions(db) if add_months(m, 1) <= oldest_kept]
+
+    archived = []
+    for month in months:
+        end = add_months(month, 1)
+        # Snapshot couvrant toute la partition (même pour une seule transaction)
+        await take_snapshots(
+            cutoff=datetime(end.year, end.month, end.day, tzinfo=timezone.utc),
+            min_transactions=1
+        )
+
+        name = partition_name(month)
+        async with AsyncSessionLocal() as db:
+            await db.execute(text(f'ALTER TABLE "{LEDGER_TABLE}" DETACH PARTITION "{name}"'))
+            if drop:
+                await db.execute(text(f'DROP TABLE "{name}"'))
+            await db.commit()
+        archived.append(name)
+        logger.info("Partition %s du ledger %s", name, "supprimée" if drop else "détachée")
+
+    return archived
+
+
+# ============================================================
+# TÂCHE DE FOND
+# ============================================================
+
+class LedgerMaintenance:
+    """Partitions, snapshots et archivage du ledger, périodiquement."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs_total = 0
+        self.skipped_total = 0
+        self.errors_total = 0
+        self.snapshots_total = 0
+        self.partitions_created_total = 0
+        self.partitions_archived_total = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> bool:
+        """
+        Une passe complète, si aucune autre instance n'est en cours.
+
+        Returns:
+            False si le verrou est tenu ailleurs
+        """
+        async with engine.connect() as lock_conn:
+            locked = await lock_conn.scalar(select(func.pg_try_advisory_lock(MAINTENANCE_LOCK_KEY)))
+            await lock_conn.commit()
+            if not locked:
+                self.skipped_total += 1
+                return False
+
+            started = time.monotonic()
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.partitions_created_total += len(await ensure_partitions(db))
+                self.snapshots_total += await take_snapshots()
+                self.partitions_archived_total += len(await archive_partitions())
+            finally:
+                await lock_conn.scalar(select(func.pg_advisory_unlock(MAINTENANCE_LOCK_KEY)))
+                await lock_conn.commit()
+
+        self.runs_total += 1
+        self.last_run_at = time.time()
+        self.last_duration = time.monotonic() - started
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors_total += 1
+                logger.warning("Maintenance du ledger en échec", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs_total": self.runs_total,
+            "skipped_total": self.skipped_total,
+            "errors_total": self.errors_total,
+            "snapshots_total": self.snapshots_total,
+            "partitions_created_total": self.partitions_created_total,
+            "partitions_archived_total": self.partitions_archived_total,
+            "last_run_at": self.last_run_at,
+            "last_duration_s": round(self.last_duration, 3) if self.last_duration is not None else None,
+        }
+
+
+# Singleton
+ledger_maintenance = LedgerMaintenance(interval=settings.CREDITS_LEDGER_MAINTENANCE_INTERVAL)
@@ -0,0 +1,279 @@
+# services/llm_scheduler.py
+"""
+Ordonnanceur d'admission des requêtes LLM sortantes (vers Backboard).
+
+- Plafond global de requêtes simultanées
+- Équité entre utilisateurs : deficit round robin (DRR), chaque
+  utilisateur a sa file et reçoit un quantum par tour
+- Quantum pondéré par le plan d'abonnement (SubscriptionPlan)
+- File bornée : 503 (file globale pleine) ou 429 (file de l'utilisateur
+  pleine) avec Retry-After
+- Métriques de temps d'attente
+
+En mémoire, par worker.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.models import SubscriptionPlan, UserSubscription
+from app.models.enums import PlanTypeEnum, SubscriptionStatusEnum
+
+
+class FairScheduler:
+    """
+    Admission équitable et pondérée sous un plafond de concurrence.
+
+    Usage:
+        async with scheduler.slot(user_id, plan="pro"):
+            await backboard_service.send_message(...)
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int,
+            max_queue: int,
+            max_queue_per_user: int,
+            queue_timeout: float,
+            weights: dict[str, float],
+            quantum: float = 1.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.weights = weights
+        self.quantum = quantum
+
+        self._queues: dict[Hashable, deque[asyncio.Future]] = {}
+        self._deficits: dict[Hashable, float] = {}
+        self._user_weights: dict[Hashable, float] = {}
+        self._active: deque[Hashable] = deque()  # ordre du round robin
+        self._in_flight = 0
+        self._queued = 0
+
+        # Métriques
+        self._waits: deque[float] = deque(maxlen=1000)
+        self._service_time = 1.0  # moyenne glissante (secondes)
+        self.admitted_total = 0
+        self.rejected_total = {"queue_full": 0, "user_queue_full": 0, "timeout": 0}
+        self.admitted_by_plan: dict[str, int] = {}
+
+    # ============================================================
+    # ADMISSION
+    # ============================================================
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable, plan: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(key, plan)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def ensure_capacity(self, key: Hashable) -> None:
+        """
+        Rejette immédiatement si la file est pleine (sans réserver de place).
+        Utile avant d'ouvrir une réponse streamée, pour renvoyer un vrai 429/503.
+        """
+        if self._in_flight < self.max_concurrency and not self._queued:
+            return
+        if self._queued >= self.max_queue:
+            self._reject("queue_full", status.HTTP_503_SERVICE_UNAVAILABLE)
+        if len(self._queues.get(key, ())) >= self.max_queue_per_user:
+            self._reject("user_queue_full", status.HTTP_429_TOO_MANY_REQUESTS)
+
+    async def acquire(self, key: Hashable, plan: Optional[str] = None) -> None:
+        """
+        Attend une place d'exécution.
+
+        Raises:
+            HTTPException 503: File globale pleine ou attente trop longue
+            HTTPException 429: Trop de requêtes en attente pour cet utilisateur
+        """
+        plan = plan or PlanTypeEnum.FREE.value
+
+        # Chemin rapide : de la place et personne n'attend
+        if self._in_flight < self.max_concurrency and not self._queued:
+            self._in_flight += 1
+            self._admitted(plan, 0.0)
+            return
+
+        self.ensure_capacity(key)
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._deficits[key] = 0.0
+            self._active.append(key)
+        self._user_weights[key] = self.weights.get(plan, 1.0)
+        queue.append(future)
+        self._queued += 1
+
+        enqueued_at = time.monotonic()
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await future
+        except (asyncio.CancelledError, TimeoutError) as e:
+            if future.done() and not future.cancelled():
+                # Place accordée au moment de l'annulation : la rendre
+                self.release()
+            else:
+                self._remove_waiter(key, future)
+            if isinstance(e, TimeoutError):
+                self._reject("timeout", status.HTTP_503_SERVICE_UNAVAILABLE)
+            raise
+
+        self._admitted(plan, time.monotonic() - enqueued_at)
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """Libère une place et admet les suivants."""
+        self._in_flight -= 1
+        if service_time is not None:
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time
+        self._dispatch()
+
+    # ============================================================
+    # DEFICIT ROUND ROBIN
+    # ============================================================
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency and self._active:
+            key = self._active[0]
+            queue = self._queues[key]
+
+            if self._deficits[key] < 1:
+                # Nouveau tour pour cet utilisateur : quantum pondéré
+                self._deficits[key] += self.quantum * self._user_weights.get(key, 1.0)
+                if self._deficits[key] < 1:
+                    self._active.rotate(-1)
+                    continue
+
+            future = queue.popleft()
+            self._queued -= 1
+            self._deficits[key] -= 1
+            self._in_flight += 1
+            future.set_result(None)
+
+            if not queue:
+                self._forget(key)
+            elif self._deficits[key] < 1:
+                self._active.rotate(-1)
+
+    def _remove_waiter(self, key: Hashable, future: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            self._forget(key)
+
+    def _forget(self, key: Hashable) -> None:
+        # Une file vide perd son crédit (DRR)
+        del self._queues[key]
+        del self._deficits[key]
+        self._user_weights.pop(key, None)
+        self._active.remove(key)
+
+    # ============================================================
+    # MÉTRIQUES
+    # ============================================================
+
+    def retry_after(self) -> int:
+        """Estimation (secondes) du temps d'écoulement de la file."""
+        return max(1, math.ceil(self._service_time * (self._queued + 1) / self.max_concurrency))
+
+    def _reject(self, reason: str, status_code: int) -> None:
+        self.rejected_total[reason] += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail="Trop de requêtes en attente, réessayez plus tard",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    def _admitted(self, plan: str, wait: float) -> None:
+        self.admitted_total += 1
+        self.admitted_by_plan[plan] = self.admitted_by_plan.get(plan, 0) + 1
+        self._waits.append(wait)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile_ms(pct: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(pct / 100 * len(waits)))] * 1000, 1)
+
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "waiting_users": len(self._active),
+            "admitted_total": self.admitted_total,
+            "admitted_by_plan": dict(self.admitted_by_plan),
+            "rejected_total": dict(self.rejected_total),
+            "queue_wait_ms": {
+                "p50": percentile_ms(50),
+                "p95": percentile_ms(95),
+                "p99": percentile_ms(99),
+                "max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            },
+            "service_time_ms": round(self._service_time * 1000, 1),
+        }
+
+
+# ============================================================
+# PLAN DE L'UTILISATEUR
+# ============================================================
+
+# Plans récemment résolus (évite une requête par message) :
+# user_id -> (expire à, slug)
+_PLAN_CACHE_TTL = 60
+_PLAN_CACHE_MAX_ENTRIES = 10000
+_plan_cache: dict[UUID, tuple[float, str]] = {}
+
+
+async def get_user_plan(user_id: UUID, db: AsyncSession) -> str:
+    """Slug du plan actif de l'utilisateur ("free" sans abonnement actif)."""
+    now = time.monotonic()
+    cached = _plan_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    stmt = select(SubscriptionPlan.slug).join(
+        UserSubscription, UserSubscription.plan_id == SubscriptionPlan.id
+    ).where(
+        UserSubscription.user_id == user_id,
+        UserSubscription.status.in_([SubscriptionStatusEnum.ACTIVE, SubscriptionStatusEnum.TRIALING])
+    ).limit(1)
+    result = await db.execute(stmt)
+    slug = result.scalar_one_or_none()
+
+    plan = slug.value if slug is not None else PlanTypeEnum.FREE.value
+    if len(_plan_cache) >= _PLAN_CACHE_MAX_ENTRIES:
+        _plan_cache.clear()
+    _plan_cache[user_id] = (now + _PLAN_CACHE_TTL, plan)
+    return plan
+
+
+# Singleton
+llm_scheduler = FairScheduler(
+    max_concurrency=settings.BACKBOARD_SCHEDULER_MAX_CONCURRENCY,
+    max_queue=settings.BACKBOARD_SCHEDULER_MAX_QUEUE,
+    max_queue_per_user=settings.BACKBOARD_SCHEDULER_MAX_QUEUE_PER_USER,
+    queue_timeout=settings.BACKBOARD_SCHEDULER_QUEUE_TIMEOUT,
+    weights=settings.BACKBOARD_SCHEDULER_PLAN_WEIGHTS,
+)
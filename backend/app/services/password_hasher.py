@@ -0,0 +1,178 @@
+# services/password_hasher.py
+"""
+Hachage et vérification des mots de passe hors de la boucle d'événements.
+
+bcrypt coûte plusieurs dizaines de millisecondes de CPU par appel : appelé
+directement dans un handler async, il bloque toutes les autres requêtes
+du worker. Les appels passent ici par un exécuteur borné :
+- pool de threads (bcrypt relâche le GIL) ou de processus
+  (PASSWORD_HASH_EXECUTOR), PASSWORD_HASH_WORKERS hachages simultanés
+- file bornée (PASSWORD_HASH_MAX_QUEUE) : au-delà, 503 avec Retry-After
+  plutôt qu'une attente sans fin
+- métriques d'attente dans la file et de durée de hachage
+
+En mémoire, par worker.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.config.settings import settings
+from app.utils.security import hash_password, verify_and_update_password, verify_password
+
+T = TypeVar("T")
+
+
+def _timed(fn: Callable[..., T], *args) -> tuple[float, float, T]:
+    """Exécuté dans le worker : début, fin (horloge monotone) et résultat."""
+    started = time.monotonic()
+    result = fn(*args)
+    return started, time.monotonic(), result
+
+
+class PasswordHasher:
+    """
+    Exécuteur borné pour les fonctions de hachage (bloquantes).
+
+    Usage:
+        password_hash = await password_hasher.hash(password)
+        if not await password_hasher.verify(password, user.password_hash): ...
+    """
+
+    def __init__(self, workers: int, max_queue: int, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Exécuteur de hachage inconnu: {kind}")
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._pending = 0  # en cours + en attente
+
+        # Métriques
+        self._waits: deque[float] = deque(maxlen=1000)
+        self._runs: deque[float] = deque(maxlen=1000)
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.rehashed_total = 0
+        self.max_pending = 0
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Vérification avec rehash si le coût configuré a changé (voir verify_and_update_password)."""
+        valid, new_hash = await self.run(verify_and_update_password, plain_password, hashed_password)
+        if new_hash is not None:
+            self.rehashed_total += 1
+        return valid, new_hash
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """
+        Exécute fn(*args) dans l'exécuteur.
+
+        Raises:
+            HTTPException 503: File d'attente pleine
+        """
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected_total += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service momentanément surchargé, réessayez plus tard",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+        submitted = time.monotonic()
+        future = asyncio.wrap_future(self._get_executor().submit(_timed, fn, *args))
+        self._pending += 1
+        self.max_pending = max(self.max_pending, self._pending)
+        # Décompté à la fin réelle du travail : une requête annulée dont le
+        # hachage a déjà démarré occupe toujours un worker
+        future.add_done_callback(self._done)
+
+        started, ended, result = await future
+        self._waits.append(max(0.0, started - submitted))
+        self._runs.append(ended - started)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ============================================================
+    # INTERNE
+    # ============================================================
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    def _done(self, future: asyncio.Future) -> None:
+        self._pending -= 1
+        if not future.cancelled() and future.exception() is None:
+            self.completed_total += 1
+
+    # ============================================================
+    # MÉTRIQUES
+    # ============================================================
+
+    def retry_after(self) -> int:
+        """Estimation (secondes) du temps d'écoulement de la file."""
+        run_time = sum(self._runs) / len(self._runs) if self._runs else 0.25
+        return max(1, math.ceil(run_time * (self._pending + 1) / self.workers))
+
+    def stats(self) -> dict:
+        def percentiles_ms(samples: deque[float]) -> dict:
+            values = sorted(samples)
+
+            def percentile(pct: float) -> float:
+                if not values:
+                    return 0.0
+                return round(values[min(len(values) - 1, int(pct / 100 * len(values)))] * 1000, 1)
+
+            return {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(values[-1] * 1000, 1) if values else 0.0,
+            }
+
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(0, self._pending - self.workers),
+            "max_queue": self.max_queue,
+            "max_pending": self.max_pending,
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+            "rehashed_total": self.rehashed_total,
+            "queue_wait_ms": percentiles_ms(self._waits),
+            "hash_time_ms": percentiles_ms(self._runs),
+        }
+
+
+# Singleton
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+)
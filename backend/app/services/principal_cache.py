@@ -0,0 +1,260 @@
+# services/principal_cache.py
+"""
+Cache de l'utilisateur authentifié (User + UserProfile) par user_id.
+
+get_current_user le lit au lieu de recharger l'utilisateur et son profil
+à chaque requête authentifiée. Le cache ne contient que les colonnes,
+sérialisées en JSON : chaque requête reçoit ses propres instances,
+transitoires et détachées de toute session. Les modifier n'a aucun
+effet en base ni sur les autres requêtes.
+
+Les routes qui écrivent sur l'utilisateur ou son profil utilisent
+CurrentUserForUpdate (instance chargée dans leur session) et invalident
+l'entrée après le commit. Sans invalidation, un changement reste
+invisible au plus AUTH_PRINCIPAL_CACHE_TTL secondes.
+
+password_hash n'est jamais mis en cache.
+
+Deux niveaux, comme le cache des soldes de crédits :
+- LRU en mémoire, par worker
+- Redis optionnel (AUTH_PRINCIPAL_CACHE_REDIS_URL), partagé entre les
+  workers ; le LRU local expire alors après AUTH_PRINCIPAL_CACHE_LOCAL_TTL
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import inspect
+
+from app.config.settings import settings
+from app.models import User, UserProfile
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # dépendance optionnelle
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Colonnes jamais mises en cache
+EXCLUDED_COLUMNS = frozenset({"password_hash"})
+
+
+# ============================================================
+# SÉRIALISATION
+# ============================================================
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def _columns(model) -> list:
+    return [attr for attr in inspect(model).column_attrs if attr.key not in EXCLUDED_COLUMNS]
+
+
+def _dump_row(instance) -> dict:
+    return {attr.key: getattr(instance, attr.key) for attr in _columns(type(instance))}
+
+
+def _load_row(model, data: dict):
+    """Instance transitoire de model à partir des colonnes sérialisées."""
+    values = {}
+    for attr in _columns(model):
+        value = data.get(attr.key)
+        if value is not None:
+            python_type = attr.columns[0].type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            elif issubclass(python_type, (UUID, Decimal, Enum)):
+                value = python_type(value)
+        values[attr.key] = value
+    return model(**values)
+
+
+def dump_principal(user: User) -> str:
+    """Sérialise un utilisateur chargé avec son profil (selectinload)."""
+    return json.dumps(
+        {
+            "user": _dump_row(user),
+            "profile": _dump_row(user.profile) if user.profile is not None else None,
+        },
+        default=_json_default,
+        separators=(",", ":"),
+    )
+
+
+def load_principal(raw: str) -> User:
+    """Nouvelle instance User (et UserProfile) détachée, propre à l'appelant."""
+    data = json.loads(raw)
+    user = _load_row(User, data["user"])
+    if data["profile"] is not None:
+        user.profile = _load_row(UserProfile, data["profile"])
+    return user
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class PrincipalCache:
+    """LRU local avec TTL, adossé à Redis si configuré, et métriques hit/miss."""
+
+    def __init__(
+            self,
+            max_entries: int,
+            ttl_seconds: float,
+            redis_url: Optional[str] = None,
+            local_ttl_seconds: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[UUID, tuple[float, str]] = OrderedDict()
+
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("AUTH_PRINCIPAL_CACHE_REDIS_URL défini mais le paquet redis est absent : cache local")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        # Avec Redis, le niveau local doit expirer vite (écritures des autres workers)
+        self.local_ttl_seconds = (
+            min(ttl_seconds, local_ttl_seconds or ttl_seconds) if self._redis is not None else ttl_seconds
+        )
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    async def get(self, user_id: UUID) -> Optional[User]:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.local_hits += 1
+                return load_principal(entry[1])
+            del self._entries[user_id]
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self._key(user_id))
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Lecture de l'utilisateur en cache Redis en échec", exc_info=True)
+                raw = None
+            if raw:
+                self._store_local(user_id, raw)
+                self.redis_hits += 1
+                return load_principal(raw)
+
+        self.misses += 1
+        return None
+
+    async def set(self, user: User) -> User:
+        """
+        Met en cache un utilisateur chargé avec son profil.
+
+        Returns:
+            Une instance détachée équivalente (à retourner à la route)
+        """
+        raw = dump_principal(user)
+        if not self.enabled:
+            return load_principal(raw)
+
+        self.writes += 1
+        self._store_local(user.id, raw)
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(self._key(user.id), raw, ex=max(1, int(self.ttl_seconds)))
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Écriture de l'utilisateur en cache Redis en échec", exc_info=True)
+        return load_principal(raw)
+
+    async def invalidate(self, user_id: UUID) -> None:
+        """Oublie l'utilisateur (à appeler après le commit d'une écriture sur User/UserProfile)."""
+        self.invalidations += 1
+        self._entries.pop(user_id, None)
+
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self._key(user_id))
+            except Exception:
+                self.redis_errors += 1
+                logger.warning("Invalidation de l'utilisateur en cache Redis en échec", exc_info=True)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "backend": "redis" if self._redis is not None else "local",
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+        }
+
+    # ============================================================
+    # INTERNE
+    # ============================================================
+
+    @staticmethod
+    def _key(user_id: UUID) -> str:
+        return f"auth:principal:{user_id}"
+
+    def _store_local(self, user_id: UUID, raw: str) -> None:
+        self._entries[user_id] = (time.monotonic() + self.local_ttl_seconds, raw)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Singleton
+principal_cache = PrincipalCache(
+    max_entries=settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_PRINCIPAL_CACHE_TTL,
+    redis_url=settings.AUTH_PRINCIPAL_CACHE_REDIS_URL,
+    local_ttl_seconds=settings.AUTH_PRINCIPAL_CACHE_LOCAL_TTL,
+)
@@ -9,6 +9,7 @@ from app.utils.dependencies import DBSession
 from app.models.skills import SkillPrerequisite
 from app.models.progress import UserSkillLevel
 from app.models.enums import PrerequisiteImportanceEnum
+from app.services.principal_cache import principal_cache
 
 async def check_prerequisites(
         user_id: UUID,
@@ -172,6 +173,7 @@ async def award_xp(
     level_up = user_skill.add_xp(xp_amount)
 
     await db.commit()
+    await principal_cache.invalidate(user.id)
 
     return {
         "xp_earned": xp_amount,
@@ -0,0 +1,309 @@
+# services/refill_service.py
+"""
+Recharge mensuelle des crédits des abonnés.
+
+Le job parcourt les abonnements actifs par lots (pagination keyset sur
+user_id) et, pour chaque lot, en une seule requête :
+- verrouille les UserCredits encore à recharger pour la période
+- les recharge (UPDATE ... FROM (VALUES ...), même effet que
+  UserCredits.refill)
+- écrit les lignes SUBSCRIPTION_REFILL au ledger (INSERT ... SELECT)
+
+Une recharge est due quand last_refill_date est antérieure au début de la
+période en cours de l'abonnement : relancer le job ne recharge personne
+deux fois. Le curseur de l'exécution (CreditRefillRun) avance dans la
+même transaction que chaque lot : reprise exacte après un crash.
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Date, Integer, cast, column, func, insert, literal, or_, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal, engine
+from app.config.settings import settings
+from app.models import (
+    CreditRefillRun,
+    CreditReservation,
+    CreditTransaction,
+    SubscriptionPlan,
+    UserCredits,
+    UserSubscription,
+)
+from app.models.enums import CreditReservationStatusEnum, SubscriptionStatusEnum
+from app.services.credit_cache import credit_cache
+
+logger = logging.getLogger(__name__)
+
+# Clé du verrou consultatif du job (arbitraire, stable)
+REFILL_LOCK_KEY = 0x52464C4C  # "RFLL"
+
+REFILLABLE_STATUSES = (SubscriptionStatusEnum.ACTIVE, SubscriptionStatusEnum.TRIALING)
+
+
+def period_start_date():
+    """Début de la période en cours de l'abonnement (date UTC)."""
+    return cast(func.timezone("UTC", UserSubscription.current_period_start), Date)
+
+
+def build_due_query(after: Optional[UUID], limit: int):
+    """
+    Prochain lot d'abonnés à recharger : un abonnement par utilisateur
+    (le plan le plus généreux s'il en a plusieurs), dans l'ordre des user_id.
+    """
+    period_start = period_start_date()
+
+    stmt = select(
+        UserSubscription.user_id,
+        SubscriptionPlan.credits_per_month,
+        period_start.label("period_start"),
+    ).join(
+        SubscriptionPlan, SubscriptionPlan.id == UserSubscription.plan_id
+    ).join(
+        UserCredits, UserCredits.user_id == UserSubscription.user_id
+    ).where(
+        UserSubscription.status.in_(REFILLABLE_STATUSES),
+        or_(UserCredits.last_refill_date.is_(None), UserCredits.last_refill_date < period_start)
+    ).distinct(
+        UserSubscription.user_id
+    ).order_by(
+        UserSubscription.user_id,
+        SubscriptionPlan.credits_per_month.desc()
+    ).limit(limit)
+
+    if after is not None:
+        stmt = stmt.where(UserSubscription.user_id > after)
+    return stmt
+
+
+def build_refill_statement(batch: list[tuple[UUID, int, date]]):
+    """
+    Recharge d'un lot (user_id, crédits du plan, début de période) :
+
+        WITH v (user_id, amount, period_start) AS (VALUES ...),
+             locked AS (SELECT ... FROM user_credits JOIN v ... FOR UPDATE),
+             refilled AS (UPDATE user_credits ... FROM locked RETURNING ...),
+             ledger AS (INSERT INTO credit_transactions SELECT ... FROM refilled)
+        SELECT user_id, credits_balance, bonus_credits, granted FROM refilled
+
+    Comme UserCredits.refill, le solde (hors bonus) est remplacé par le
+    montant du plan, diminué de la part hors bonus des réservations encore
+    HELD : ces crédits sont rendus au solde au règlement ou à la libération,
+    qui ramène donc le solde au montant du plan (et pas au-delà). La ligne
+    au ledger porte la variation réelle, pour que la somme du ledger reste
+    égale au solde. La condition de période est revérifiée sous le verrou.
+    """
+    credits = UserCredits.__table__
+    ledger = CreditTransaction.__table__
+    reservations = CreditReservation.__table__
+
+    due = values(
+        column("user_id", PG_UUID(as_uuid=True)),
+        column("amount", Integer),
+        column("period_start", Date),
+        name="v"
+    ).data(batch)
+
+    held = select(
+        func.coalesce(func.sum(reservations.c.amount - reservations.c.bonus_amount), 0)
+    ).where(
+        reservations.c.user_id == credits.c.user_id,
+        reservations.c.status == CreditReservationStatusEnum.HELD
+    ).scalar_subquery()
+
+    locked = select(
+        credits.c.user_id,
+        credits.c.credits_balance.label("previous_balance"),
+        due.c.amount,
+        held.label("held"),
+        due.c.period_start,
+    ).join_from(
+        credits, due, credits.c.user_id == due.c.user_id
+    ).where(
+        or_(credits.c.last_refill_date.is_(None), credits.c.last_refill_date < due.c.period_start)
+    ).with_for_update(of=credits).cte("locked")
+
+    refilled = update(credits).where(
+        credits.c.user_id == locked.c.user_id
+    ).values(
+        credits_balance=locked.c.amount - locked.c.held,
+        credits_used_this_month=0,
+        # Jamais avant le début de période (fuseau de la session BD)
+        last_refill_date=func.greatest(func.current_date(), locked.c.period_start),
+        last_refill_amount=locked.c.amount,
+    ).returning(
+        credits.c.user_id,
+        credits.c.credits_balance,
+        credits.c.bonus_credits,
+        (locked.c.amount - locked.c.held - locked.c.previous_balance).label("granted"),
+    ).cte("refilled")
+
+    # Même ligne que CreditTransaction.create_refill (montant : variation)
+    refill = CreditTransaction.create_refill(user_id=None, amount=0, balance_after=0)
+    ledger_rows = insert(ledger).from_select(
+        ["id", "user_id", "amount", "type", "description", "balance_after", "created_at"],
+        select(
+            func.gen_random_uuid(),
+            refilled.c.user_id,
+            refilled.c.granted,
+            literal(refill.type, ledger.c.type.type),
+            literal(refill.description, ledger.c.description.type),
+            refilled.c.credits_balance + refilled.c.bonus_credits,
+            func.now(),
+        )
+    ).cte("ledger")
+
+    return select(
+        refilled.c.user_id,
+        refilled.c.credits_balance,
+        refilled.c.bonus_credits,
+        refilled.c.granted,
+    ).add_cte(locked, refilled, ledger_rows)
+
+
+async def _get_run(run_date: date, db: AsyncSession) -> CreditRefillRun:
+    run = (await db.execute(
+        select(CreditRefillRun).where(CreditRefillRun.run_date == run_date)
+    )).scalar_one_or_none()
+    if run is None:
+        run = CreditRefillRun(run_date=run_date, users_refilled=0, credits_granted=0, batches=0)
+        db.add(run)
+        await db.commit()
+    return run
+
+
+async def run_refill(run_date: date = None, batch_size: int = None) -> dict:
+    """
+    Exécute (ou reprend) la recharge du jour.
+
+    Returns:
+        Bilan de l'exécution : utilisateurs rechargés, crédits, débit
+    """
+    run_date = run_date or datetime.now(timezone.utc).date()
+    batch_size = batch_size or settings.CREDITS_REFILL_BATCH_SIZE
+
+    async with AsyncSessionLocal() as db:
+        run = await _get_run(run_date, db)
+        if run.is_finished:
+            return refill_report(run)
+
+        started = time.monotonic()
+        refilled_now = 0
+
+        while True:
+            due = (await db.execute(build_due_query(run.cursor, batch_size))).all()
+            if not due:
+                break
+
+            batch = [(row.user_id, row.credits_per_month, row.period_start) for row in due]
+            rows = (await db.execute(build_refill_statement(batch))).all()
+
+            run.cursor = batch[-1][0]
+            run.batches += 1
+            run.users_refilled += len(rows)
+            run.credits_granted += sum(row.granted for row in rows)
+            # Lot et curseur dans la même transaction
+            await db.commit()
+
+            for row in rows:
+                await credit_cache.invalidate(row.user_id)
+            refilled_now += len(rows)
+
+            if len(due) < batch_size:
+                break
+
+        run.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Recharge du %s : %s utilisateur(s) en %.1fs (%.0f/s)",
+        run_date, refilled_now, elapsed, refilled_now / elapsed if elapsed else 0
+    )
+    return refill_report(run)
+
+
+def refill_report(run: CreditRefillRun) -> dict:
+    end = run.finished_at or datetime.now(timezone.utc)
+    elapsed = (end - run.started_at).total_seconds()
+    return {
+        "run_date": run.run_date.isoformat(),
+        "finished": run.is_finished,
+        "users_refilled": run.users_refilled,
+        "credits_granted": run.credits_granted,
+        "batches": run.batches,
+        "elapsed_s": round(elapsed, 1),
+        "users_per_second": round(run.users_refilled / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+class CreditRefillJob:
+    """Lance run_refill périodiquement (une exécution effective par jour)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs_total = 0
+        self.skipped_total = 0
+        self.errors_total = 0
+        self.last_report: Optional[dict] = None
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Optional[dict]:
+        """Une exécution, si aucune autre instance n'est en cours (None sinon)."""
+        async with engine.connect() as lock_conn:
+            locked = await lock_conn.scalar(select(func.pg_try_advisory_lock(REFILL_LOCK_KEY)))
+            await lock_conn.commit()
+            if not locked:
+                self.skipped_total += 1
+                return None
+            try:
+                self.last_report = await run_refill()
+            finally:
+                await lock_conn.scalar(select(func.pg_advisory_unlock(REFILL_LOCK_KEY)))
+                await lock_conn.commit()
+
+        self.runs_total += 1
+        return self.last_report
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors_total += 1
+                logger.warning("Recharge mensuelle des crédits en échec", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs_total": self.runs_total,
+            "skipped_total": self.skipped_total,
+            "errors_total": self.errors_total,
+            "last_run": self.last_report,
+        }
+
+
+# Singleton
+refill_job = CreditRefillJob(interval=settings.CREDITS_REFILL_INTERVAL)
@@ -0,0 +1,236 @@
+# services/sse.py
+"""
+Parsing incrémental de Server-Sent Events (SSE).
+
+Le parser travaille directement sur les octets reçus de l'upstream :
+chaque événement conserve ses octets d'origine (raw) pour pouvoir être
+relayé au client sans ré-encodage.
+"""
+import json
+from typing import Optional
+
+
+class SSEEvent:
+    """
+    Un événement SSE complet.
+
+    Attributs:
+        event: Type de l'événement (champ "event:", "message" par défaut)
+        data: Données (lignes "data:" jointes par "\\n")
+        id: Dernier ID reçu (champ "id:")
+        retry: Délai de reconnexion suggéré en ms (champ "retry:")
+        raw: Octets d'origine de l'événement, ligne vide finale incluse
+    """
+
+    __slots__ = ("event", "data", "id", "retry", "raw", "_payload")
+
+    def __init__(
+            self,
+            event: str = "message",
+            data: str = "",
+            id: Optional[str] = None,
+            retry: Optional[int] = None,
+            raw: bytes = b""
+    ):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+        self.raw = raw
+        self._payload = None
+
+    @property
+    def payload(self) -> Optional[dict]:
+        """Données décodées si elles sont un objet JSON, sinon None."""
+        if self._payload is None:
+            try:
+                decoded = json.loads(self.data)
+            except ValueError:
+                decoded = None
+            self._payload = decoded if isinstance(decoded, dict) else {}
+        return self._payload or None
+
+    @property
+    def kind(self) -> str:
+        """
+        Catégorie de l'événement : "done", "content", "tool_call", "usage",
+        "error" ou "other". Déduite du champ "event:" ou, à défaut, de la
+        clé "type" des données JSON.
+        """
+        if self.data == "[DONE]":
+            return "done"
+
+        kind = self.event
+        if kind == "message" and self.payload:
+            kind = self.payload.get("type", kind)
+
+        if kind in ("message", "content", "content_streaming", "delta"):
+            return "content"
+        if kind in ("tool_call", "tool_calls", "tool_submit_required", "requires_action"):
+            return "tool_call"
+        if kind in ("usage", "run_ended", "message_complete"):
+            return "usage"
+        if kind == "error":
+            return "error"
+        return "other"
+
+    @property
+    def text(self) -> str:
+        """Texte produit par le LLM pour un événement de contenu."""
+        payload = self.payload
+        if payload is not None:
+            return payload.get("content") or payload.get("delta") or ""
+        return self.data
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, id={self.id!r}, data={self.data[:50]!r})"
+
+
+class SSEParser:
+    """
+    Parser SSE incrémental (format text/event-stream).
+
+    Usage:
+        parser = SSEParser()
+        async for chunk in response.aiter_bytes():
+            for event in parser.feed(chunk):
+                ...
+        for event in parser.flush():
+            ...
+
+    Gère les fins de ligne \\n et \\r\\n, les commentaires (":"), les
+    données multi-lignes et les champs event / id / retry. Le coût par
+    chunk est proportionnel à sa taille (pas de re-scan du buffer).
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._raw_lines: list[bytes] = []
+        self._data_lines: list[str] = []
+        self._event = "message"
+        self._retry: Optional[int] = None
+        self.last_event_id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> list[SSEEvent]:
+        """Ajoute des octets et retourne les événements complétés."""
+        events = []
+        buffer = self._buffer
+        scan_from = len(buffer)
+        buffer.extend(chunk)
+
+        start = 0
+        newline = buffer.find(b"\n", scan_from)
+        while newline != -1:
+            line = bytes(buffer[start:newline + 1])
+            start = newline + 1
+
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+
+            newline = buffer.find(b"\n", start)
+
+        if start:
+            del buffer[:start]
+
+        return events
+
+    def flush(self) -> list[SSEEvent]:
+        """Termine le flux : émet le dernier événement s'il n'a pas de ligne vide finale."""
+        events = []
+        if self._buffer:
+            event = self._process_line(bytes(self._buffer) + b"\n")
+            self._buffer.clear()
+            if event is not None:
+                events.append(event)
+
+        event = self._process_line(b"\n")
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: bytes) -> Optional[SSEEvent]:
+        content = line.rstrip(b"\r\n")
+
+        # Ligne vide : fin de l'événement
+        if not content:
+            if not self._raw_lines:
+                return None
+            return self._dispatch(line)
+
+        self._raw_lines.append(line)
+
+        # Commentaire (keep-alive)
+        if content.startswith(b":"):
+            return None
+
+        field, _, value = content.partition(b":")
+        if value.startswith(b" "):
+            value = value[1:]
+        text = value.decode("utf-8", errors="replace")
+
+        if field == b"data":
+            self._data_lines.append(text)
+        elif field == b"event":
+            self._event = text or "message"
+        elif field == b"id":
+            if "\0" not in text:
+                self.last_event_id = text
+        elif field == b"retry":
+            if text.isdigit():
+                self._retry = int(text)
+
+        return None
+
+    def _dispatch(self, terminator: bytes) -> Optional[SSEEvent]:
+        raw = b"".join(self._raw_lines) + terminator
+        has_data = bool(self._data_lines)
+
+        event = SSEEvent(
+            event=self._event,
+            data="\n".join(self._data_lines),
+            id=self.last_event_id,
+            retry=self._retry,
+            raw=raw,
+        )
+
+        self._raw_lines = []
+        self._data_lines = []
+        self._event = "message"
+        self._retry = None
+
+        # Un bloc sans "data:" (commentaires seuls, id seul) n'est pas un événement
+        return event if has_data else None
+
+
+def encode_event(
+        data: str,
+        event: Optional[str] = None,
+        id: Optional[str] = None
+) -> bytes:
+    """Encode un événement SSE (données multi-lignes gérées)."""
+    parts = []
+    if event:
+        parts.append(f"event: {event}\n")
+    if id is not None:
+        parts.append(f"id: {id}\n")
+    for line in data.split("\n"):
+        parts.append(f"data: {line}\n")
+    parts.append("\n")
+    return "".join(parts).encode("utf-8")
+
+
+def with_event_id(raw: bytes, id: str) -> bytes:
+    """
+    Ré-étiquette un événement brut avec notre propre ID (Last-Event-ID),
+    en retirant les éventuels champs "id:" d'origine.
+    """
+    prefix = f"id: {id}\n".encode("utf-8")
+    if not raw.startswith(b"id") and b"\nid" not in raw:
+        return prefix + raw
+
+    lines = raw.splitlines(keepends=True)
+    return prefix + b"".join(
+        line for line in lines
+        if not (line.startswith(b"id:") or line.rstrip(b"\r\n") == b"id")
+    )
@@ -0,0 +1,188 @@
+# services/stream_hub.py
+"""
+Diffusion des streams de mentorat (SSE) à plusieurs abonnés.
+
+Une génération upstream par (session, message) : les événements produits
+sont numérotés et conservés, chaque abonné (onglet, reconnexion) les lit
+depuis sa position — reprise via Last-Event-ID ("<message_id>:<seq>").
+La génération n'est annulée que lorsque tous les abonnés sont partis
+(après un délai de grâce), et le tampon reste disponible un moment après
+la fin pour les reconnexions tardives. En mémoire, par worker.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional
+from uuid import UUID
+
+from app.config.settings import settings
+from app.services.sse import encode_event, with_event_id
+
+logger = logging.getLogger(__name__)
+
+
+def format_event_id(message_id: str, seq: int) -> str:
+    return f"{message_id}:{seq}"
+
+
+def parse_event_id(event_id: Optional[str]) -> tuple[Optional[str], int]:
+    """
+    Décode un Last-Event-ID produit par format_event_id.
+
+    Returns:
+        (message_id, dernier seq reçu) — (None, -1) si absent ou invalide
+    """
+    if not event_id:
+        return None, -1
+    message_id, _, seq = event_id.rpartition(":")
+    if not message_id or not seq.isdigit():
+        return None, -1
+    return message_id, int(seq)
+
+
+class BroadcastStream:
+    """Une génération upstream et ses événements déjà produits."""
+
+    def __init__(self, hub: "StreamHub", session_id: UUID, message_id: str):
+        self.hub = hub
+        self.session_id = session_id
+        self.message_id = message_id
+
+        self.events: list[bytes] = []
+        self.done = False
+        self.subscribers = 0
+
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+
+    def start(self, produce: Callable[[], AsyncIterator[bytes]]) -> None:
+        self._task = asyncio.create_task(self._run(produce))
+
+    async def subscribe(self, after: int = -1) -> AsyncIterator[bytes]:
+        """
+        Événements à partir de la position after + 1 (déjà produits,
+        puis au fil de l'eau) jusqu'à la fin de la génération.
+        """
+        self.subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+
+        try:
+            position = after + 1
+            while True:
+                changed = self._changed
+                while position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                # Plus personne : annuler l'upstream après le délai de grâce
+                self._cancel_handle = asyncio.get_running_loop().call_later(
+                    self.hub.grace_seconds, self.cancel
+                )
+
+    def cancel(self) -> None:
+        self._cancel_handle = None
+        if self._task is not None and not self.subscribers and not self.done:
+            self.hub.cancelled_total += 1
+            self._task.cancel()
+
+    def _publish(self, raw: bytes) -> None:
+        self.events.append(with_event_id(raw, format_event_id(self.message_id, len(self.events))))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _run(self, produce: Callable[[], AsyncIterator[bytes]]) -> None:
+        try:
+            async for raw in produce():
+                self._publish(raw)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("Stream %s en échec", self.message_id, exc_info=True)
+            self._publish(encode_event(f"[ERROR] {str(e)}"))
+        finally:
+            self.done = True
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+            self.hub._finished(self)
+
+
+class StreamHub:
+    """Registre des streams en cours ou récemment terminés."""
+
+    def __init__(self, grace_seconds: float, retention_seconds: float):
+        self.grace_seconds = grace_seconds
+        self.retention_seconds = retention_seconds
+
+        self._streams: dict[tuple[UUID, str], BroadcastStream] = {}
+        self._current: dict[UUID, BroadcastStream] = {}
+
+        self.started_total = 0
+        self.joined_total = 0
+        self.cancelled_total = 0
+
+    def get(self, session_id: UUID, message_id: str) -> Optional[BroadcastStream]:
+        return self._streams.get((session_id, message_id))
+
+    def current(self, session_id: UUID) -> Optional[BroadcastStream]:
+        """Dernier stream démarré pour la session (en cours ou retenu)."""
+        return self._current.get(session_id)
+
+    def open(
+            self,
+            session_id: UUID,
+            message_id: str,
+            produce: Callable[[], AsyncIterator[bytes]]
+    ) -> BroadcastStream:
+        """
+        Retourne le stream (session, message) existant, ou le démarre :
+        un même message n'est généré qu'une fois.
+        """
+        stream = self._streams.get((session_id, message_id))
+        if stream is not None:
+            self.joined_total += 1
+            return stream
+
+        stream = BroadcastStream(self, session_id, message_id)
+        self._streams[(session_id, message_id)] = stream
+        self._current[session_id] = stream
+        self.started_total += 1
+        stream.start(produce)
+        return stream
+
+    def _finished(self, stream: BroadcastStream) -> None:
+        # Tampon conservé pour les reconnexions tardives
+        asyncio.get_running_loop().call_later(
+            self.retention_seconds, self._forget, stream
+        )
+
+    def _forget(self, stream: BroadcastStream) -> None:
+        key = (stream.session_id, stream.message_id)
+        if self._streams.get(key) is stream:
+            del self._streams[key]
+        if self._current.get(stream.session_id) is stream:
+            del self._current[stream.session_id]
+
+    def stats(self) -> dict:
+        streams = list(self._streams.values())
+        return {
+            "streams": len(streams),
+            "in_progress": sum(1 for s in streams if not s.done),
+            "subscribers": sum(s.subscribers for s in streams),
+            "started_total": self.started_total,
+            "joined_total": self.joined_total,
+            "cancelled_total": self.cancelled_total,
+        }
+
+
+# Singleton
+stream_hub = StreamHub(
+    grace_seconds=settings.MENTORING_STREAM_GRACE,
+    retention_seconds=settings.MENTORING_STREAM_RETENTION,
+)
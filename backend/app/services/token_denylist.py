@@ -0,0 +1,176 @@
+# services/token_denylist.py
+"""
+Révocation des access tokens avant leur expiration.
+
+Les access tokens sont vérifiés sans base de données (signature,
+expiration, claims). Pour en révoquer un, on le note ici :
+- par token (jti) : déconnexion
+- par utilisateur : tous ses tokens émis avant la révocation (changement
+  ou réinitialisation du mot de passe, désactivation)
+
+Une entrée n'a besoin de vivre que le temps de vie d'un access token
+(JWT_ACCESS_TOKEN_EXPIRE_MINUTES) : la liste reste petite et se purge
+à chaque écriture.
+
+Deux niveaux, comme les caches des soldes et des utilisateurs :
+- en mémoire, par worker : seul, une révocation faite sur un worker ne
+  vaut que pour lui, les autres acceptent le token jusqu'à son expiration
+- Redis optionnel (AUTH_TOKEN_DENYLIST_REDIS_URL), partagé entre les
+  workers : chaque vérification non refusée localement le consulte
+  (un MGET). Redis indisponible : seule la liste locale s'applique.
+"""
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from app.config.settings import settings
+from app.utils.security import TokenPayload
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # dépendance optionnelle
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenDenylist:
+    """Tokens (jti) et utilisateurs révoqués, jusqu'à expiration des tokens concernés."""
+
+    def __init__(self, token_lifetime: float, redis_url: Optional[str] = None):
+        self.token_lifetime = token_lifetime
+        self._tokens: dict[str, float] = {}  # jti -> exp (epoch)
+        self._users: dict[str, tuple[int, float]] = {}  # sub -> (iat minimal accepté, oublié après)
+
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("AUTH_TOKEN_DENYLIST_REDIS_URL défini mais le paquet redis est absent : liste locale")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+
+        self.checks_total = 0
+        self.denied_total = 0
+        self.revoked_tokens_total = 0
+        self.revoked_users_total = 0
+        self.redis_errors = 0
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    async def revoke_token(self, jti: str, expires_at: datetime) -> None:
+        """Révoque un access token jusqu'à son expiration."""
+        exp = expires_at.timestamp()
+        self._tokens[jti] = exp
+        self.revoked_tokens_total += 1
+        self._purge()
+
+        ttl = math.ceil(exp - time.time())
+        if ttl > 0:
+            await self._redis_set(self._token_key(jti), "1", ttl)
+
+    async def revoke_user(self, user_id: UUID) -> None:
+        """
+        Révoque tous les access tokens de l'utilisateur émis avant maintenant.
+
+        iat est à la seconde : la coupure est la seconde en cours, exclue.
+        Un token émis dans la seconde de la révocation (la connexion qui
+        suit une réinitialisation) reste valide.
+        """
+        not_before = int(time.time())
+        self._users[str(user_id)] = (not_before, time.time() + self.token_lifetime)
+        self.revoked_users_total += 1
+        self._purge()
+
+        await self._redis_set(self._user_key(str(user_id)), str(not_before), math.ceil(self.token_lifetime))
+
+    async def is_revoked(self, payload: TokenPayload) -> bool:
+        self.checks_total += 1
+        revoked = self._revoked_locally(payload) or await self._revoked_in_redis(payload)
+        if revoked:
+            self.denied_total += 1
+        return revoked
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self._redis is not None else "local",
+            "tokens": len(self._tokens),
+            "users": len(self._users),
+            "checks_total": self.checks_total,
+            "denied_total": self.denied_total,
+            "revoked_tokens_total": self.revoked_tokens_total,
+            "revoked_users_total": self.revoked_users_total,
+            "redis_errors": self.redis_errors,
+        }
+
+    # ============================================================
+    # INTERNE
+    # ============================================================
+
+    @staticmethod
+    def _token_key(jti: str) -> str:
+        return f"auth:denylist:jti:{jti}"
+
+    @staticmethod
+    def _user_key(sub: str) -> str:
+        return f"auth:denylist:user:{sub}"
+
+    @staticmethod
+    def _issued_before(payload: TokenPayload, not_before: int) -> bool:
+        return payload.iat.timestamp() < not_before
+
+    def _revoked_locally(self, payload: TokenPayload) -> bool:
+        if payload.jti is not None and payload.jti in self._tokens:
+            return True
+        entry = self._users.get(payload.sub)
+        return entry is not None and self._issued_before(payload, entry[0])
+
+    async def _revoked_in_redis(self, payload: TokenPayload) -> bool:
+        if self._redis is None:
+            return False
+
+        keys = [self._user_key(payload.sub)]
+        if payload.jti is not None:
+            keys.append(self._token_key(payload.jti))
+        try:
+            values = await self._redis.mget(keys)
+        except Exception:
+            self.redis_errors += 1
+            logger.warning("Lecture de la denylist Redis en échec", exc_info=True)
+            return False
+
+        user_not_before = values[0]
+        if user_not_before is not None and self._issued_before(payload, int(user_not_before)):
+            return True
+        return len(values) > 1 and values[1] is not None
+
+    async def _redis_set(self, key: str, value: str, ttl: int) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, value, ex=max(1, ttl))
+        except Exception:
+            self.redis_errors += 1
+            logger.warning("Écriture de la denylist Redis en échec", exc_info=True)
+
+    def _purge(self) -> None:
+        now = time.time()
+        for jti in [jti for jti, exp in self._tokens.items() if exp <= now]:
+            del self._tokens[jti]
+        for sub in [sub for sub, (_, forget_at) in self._users.items() if forget_at <= now]:
+            del self._users[sub]
+
+
+# Singleton
+token_denylist = TokenDenylist(
+    token_lifetime=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    redis_url=settings.AUTH_TOKEN_DENYLIST_REDIS_URL,
+)
@@ -0,0 +1,284 @@
+# services/write_behind.py
+"""
+Écriture différée (write-behind) des messages de mentorat.
+
+Une fois la réponse du mentor obtenue et les crédits débités, les lignes
+SessionMessage et les incréments de compteurs de la session sont mis en
+file au lieu d'être écrits sur le chemin de la réponse. Une tâche de fond
+vide la file par lots : un INSERT multi-lignes et un UPDATE par session
+(incréments agrégés), dans une seule transaction.
+
+Garanties :
+- File bornée : submit attend quand elle est pleine (backpressure)
+- Vidage complet à l'arrêt (lifespan)
+- Lot en échec : réessayé ligne par ligne pour isoler une écriture
+  invalide, puis abandonné (journalisé) après plusieurs tentatives
+- Lecture de ses propres écritures : settled(session_id) attend que les
+  écritures en attente d'une session soient en base
+
+Un arrêt brutal du processus perd la file (en mémoire, par worker).
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import bindparam, func, insert, update
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models import MentoringSession, SessionMessage
+from app.models.enums import LLMProviderEnum
+
+logger = logging.getLogger(__name__)
+
+
+def llm_provider(model: Optional[str]) -> Optional[LLMProviderEnum]:
+    """Fournisseur LLM (colonne llm_used) à partir d'un nom de modèle Backboard."""
+    if not model:
+        return None
+    model = model.lower()
+    try:
+        return LLMProviderEnum(model)
+    except ValueError:
+        pass
+    if "claude" in model:
+        return LLMProviderEnum.CLAUDE
+    if "codestral" in model:
+        return LLMProviderEnum.CODESTRAL
+    if "mistral" in model:
+        return LLMProviderEnum.MISTRAL
+    if "gpt-4" in model or "gpt4" in model:
+        return LLMProviderEnum.GPT4
+    if "gpt-3.5" in model or "gpt35" in model:
+        return LLMProviderEnum.GPT35
+    return None
+
+
+class PendingTurn:
+    """Écritures d'un échange : lignes de messages + incréments de la session."""
+
+    __slots__ = ("session_id", "messages", "message_count", "credits_consumed", "last_message_at", "attempts")
+
+    def __init__(
+            self,
+            session_id: UUID,
+            messages: list[dict],
+            message_count: int,
+            credits_consumed: int,
+            last_message_at: datetime
+    ):
+        self.session_id = session_id
+        self.messages = messages
+        self.message_count = message_count
+        self.credits_consumed = credits_consumed
+        self.last_message_at = last_message_at
+        self.attempts = 0
+
+
+class MessageWriteBehind:
+    """File d'écritures différées vidée par lots."""
+
+    def __init__(
+            self,
+            max_queue: int,
+            batch_size: int,
+            flush_interval: float,
+            max_attempts: int = 5
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self._queue: asyncio.Queue[Optional[PendingTurn]] = asyncio.Queue(maxsize=max_queue)
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._pending: dict[UUID, int] = {}
+        self._settled = asyncio.Condition()
+
+        self.written_total = 0
+        self.batches_total = 0
+        self.dropped_total = 0
+        self.backpressure_total = 0
+
+    # ============================================================
+    # CYCLE DE VIE
+    # ============================================================
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Vide la file puis arrête la tâche de fond (appelé dans le lifespan)."""
+        if self._task is not None:
+            # Marqueur de fin : la tâche vide ce qui le précède puis s'arrête
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+        while not self._queue.empty():
+            await self._flush(self._take_batch())
+
+    # ============================================================
+    # API
+    # ============================================================
+
+    async def submit(self, turn: PendingTurn) -> None:
+        """Met un échange en file ; attend si la file est pleine."""
+        if self._queue.full():
+            self.backpressure_total += 1
+        self._pending[turn.session_id] = self._pending.get(turn.session_id, 0) + 1
+        try:
+            await self._queue.put(turn)
+        except BaseException:
+            await self._done([turn])
+            raise
+
+        if self._task is None:
+            # Pas de tâche de fond (hors lifespan) : écriture immédiate
+            await self._flush(self._take_batch())
+
+    async def settled(self, session_id: UUID, timeout: Optional[float] = None) -> bool:
+        """
+        Attend que les écritures en attente de la session soient en base.
+
+        Returns:
+            False si le délai a expiré avant
+        """
+        if not self._pending.get(session_id):
+            return True
+        try:
+            async with asyncio.timeout(timeout or self.flush_interval * 20):
+                async with self._settled:
+                    await self._settled.wait_for(lambda: not self._pending.get(session_id))
+            return True
+        except TimeoutError:
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "pending_sessions": len(self._pending),
+            "written_total": self.written_total,
+            "batches_total": self.batches_total,
+            "dropped_total": self.dropped_total,
+            "backpressure_total": self.backpressure_total,
+        }
+
+    # ============================================================
+    # VIDAGE
+    # ============================================================
+
+    async def _run(self) -> None:
+        self._stopping = False
+        while not self._stopping:
+            # Attendre un premier élément, puis laisser le lot se remplir
+            turn = await self._queue.get()
+            if turn is None:
+                break
+            batch = [turn]
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.flush_interval)
+            batch.extend(self._take_batch(self.batch_size - 1))
+            await self._flush(batch)
+
+    def _take_batch(self, size: Optional[int] = None) -> list[PendingTurn]:
+        batch = []
+        size = size if size is not None else self.batch_size
+        while len(batch) < size and not self._queue.empty():
+            turn = self._queue.get_nowait()
+            if turn is None:
+                self._stopping = True
+                break
+            batch.append(turn)
+        return batch
+
+    async def _flush(self, batch: list[PendingTurn]) -> None:
+        if not batch:
+            return
+
+        try:
+            await self._write(batch)
+        except Exception:
+            if len(batch) == 1:
+                await self._retry_or_drop(batch[0])
+                return
+            # Isoler une écriture invalide : ligne par ligne
+            logger.warning("Écriture différée en échec (lot de %s), reprise unitaire", len(batch), exc_info=True)
+            for turn in batch:
+                await self._flush([turn])
+            return
+
+        self.written_total += len(batch)
+        self.batches_total += 1
+        await self._done(batch)
+
+    async def _retry_or_drop(self, turn: PendingTurn) -> None:
+        turn.attempts += 1
+        if turn.attempts < self.max_attempts:
+            await asyncio.sleep(min(2 ** turn.attempts * 0.1, 5))
+            await self._flush([turn])
+            return
+
+        self.dropped_total += 1
+        logger.error(
+            "Écriture différée abandonnée pour la session %s : %s",
+            turn.session_id, turn.messages, exc_info=True
+        )
+        await self._done([turn])
+
+    async def _write(self, batch: list[PendingTurn]) -> None:
+        # Incréments agrégés par session
+        deltas: dict[UUID, dict] = {}
+        for turn in batch:
+            delta = deltas.setdefault(turn.session_id, {
+                "b_id": turn.session_id,
+                "b_messages": 0,
+                "b_credits": 0,
+                "b_last": turn.last_message_at,
+            })
+            delta["b_messages"] += turn.message_count
+            delta["b_credits"] += turn.credits_consumed
+            delta["b_last"] = max(delta["b_last"], turn.last_message_at)
+
+        table = MentoringSession.__table__
+        session_update = update(table).where(
+            table.c.id == bindparam("b_id")
+        ).values(
+            message_count=table.c.message_count + bindparam("b_messages"),
+            credits_consumed=table.c.credits_consumed + bindparam("b_credits"),
+            last_message_at=func.greatest(table.c.last_message_at, bindparam("b_last")),
+        )
+
+        # Compteurs inchangés (ex: création de session) : pas d'UPDATE
+        deltas = [d for d in deltas.values() if d["b_messages"] or d["b_credits"]]
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(SessionMessage),
+                [message for turn in batch for message in turn.messages]
+            )
+            if deltas:
+                await db.execute(session_update, deltas)
+            await db.commit()
+
+    async def _done(self, batch: list[PendingTurn]) -> None:
+        for turn in batch:
+            remaining = self._pending.get(turn.session_id, 0) - 1
+            if remaining > 0:
+                self._pending[turn.session_id] = remaining
+            else:
+                self._pending.pop(turn.session_id, None)
+        async with self._settled:
+            self._settled.notify_all()
+
+
+# Singleton
+message_writer = MessageWriteBehind(
+    max_queue=settings.MENTORING_WRITE_BEHIND_MAX_QUEUE,
+    batch_size=settings.MENTORING_WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.MENTORING_WRITE_BEHIND_FLUSH_INTERVAL,
+)
@@ -4,8 +4,10 @@ from app.utils.security import (
     # Hashing
     hash_password,
     verify_password,
+    verify_and_update_password,
     # Tokens
     create_access_token,
+    build_user_claims,
     create_refresh_token,
     create_tokens,
     decode_access_token,
@@ -16,6 +18,7 @@ from app.utils.security import (
     # Models
     TokenPayload,
     TokenResponse,
+    UserClaims,
 )
 
 from app.utils.dependencies import (
@@ -24,8 +27,11 @@ from app.utils.dependencies import (
     oauth2_scheme_optional,
     # Dépendances utilisateur
     get_current_user,
+    get_current_user_for_update,
     get_current_active_user,
     get_current_user_optional,
+    get_claims_user,
+    get_claims_user_optional,
     # Rôles
     RoleChecker,
     require_admin,
@@ -38,8 +44,11 @@ from app.utils.dependencies import (
     validate_uuid,
     # Types annotés (raccourcis)
     CurrentUser,
+    CurrentUserForUpdate,
     CurrentActiveUser,
     OptionalUser,
+    ClaimsUser,
+    OptionalClaimsUser,
     DBSession,
     Pagination,
 )
@@ -48,8 +57,10 @@ __all__ = [
     # Security - Hashing
     "hash_password",
     "verify_password",
+    "verify_and_update_password",
     # Security - Tokens
     "create_access_token",
+    "build_user_claims",
     "create_refresh_token",
     "create_tokens",
     "decode_access_token",
@@ -58,13 +69,17 @@ __all__ = [
     "get_token_remaining_time",
     "TokenPayload",
     "TokenResponse",
+    "UserClaims",
     # Dependencies - OAuth2
     "oauth2_scheme",
     "oauth2_scheme_optional",
     # Dependencies - User
     "get_current_user",
+    "get_current_user_for_update",
     "get_current_active_user",
     "get_current_user_optional",
+    "get_claims_user",
+    "get_claims_user_optional",
     # Dependencies - Roles
     "RoleChecker",
     "require_admin",
@@ -77,8 +92,11 @@ __all__ = [
     "validate_uuid",
     # Type aliases
     "CurrentUser",
+    "CurrentUserForUpdate",
     "CurrentActiveUser",
     "OptionalUser",
+    "ClaimsUser",
+    "OptionalClaimsUser",
     "DBSession",
     "Pagination",
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 
 from typing import Annotated, Optional
+from uuid import UUID
 from fastapi import Depends, HTTPException, status, Header, Request
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,9 +8,14 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
 from app.config.database import get_db
-from app.utils.security import decode_access_token, TokenPayload
+from app.utils.security import decode_access_token, TokenPayload, UserClaims
 from app.models.auth import *
 from app.models.billing import *
+from app.services.credit_cache import CreditBalance
+from app.services.credit_service import get_cached_balance
+from app.services.principal_cache import principal_cache
+from app.services.token_denylist import token_denylist
+from app.services.llm_scheduler import get_user_plan
 
 # ============================================================
 # SCHÉMA OAUTH2 - Extraction du token
@@ -38,6 +44,52 @@ oauth2_scheme_optional = OAuth2PasswordBearer(
 # DÉPENDANCE : RÉCUPÉRER L'UTILISATEUR COURANT
 # ============================================================
 
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Impossible de valider les credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def _decode_token(token: str) -> tuple[UUID, TokenPayload]:
+    """
+    Décode le JWT (signature, expiration, denylist).
+
+    Returns:
+        (id de l'utilisateur, payload)
+
+    Raises:
+        HTTPException 401: Si le token est invalide ou révoqué
+    """
+    payload: Optional[TokenPayload] = decode_access_token(token)
+
+    if payload is None or payload.sub is None or await token_denylist.is_revoked(payload):
+        raise _credentials_exception()
+
+    try:
+        return UUID(payload.sub), payload
+    except ValueError:
+        raise _credentials_exception()
+
+
+async def _load_user(user_id: UUID, db: AsyncSession) -> Optional[User]:
+    result = await db.execute(select(User).where(User.id == user_id).options(selectinload(User.profile)))
+    return result.scalar_one_or_none()
+
+
+async def _get_cached_user(user_id: UUID, db: AsyncSession) -> Optional[User]:
+    """Utilisateur depuis principal_cache, sinon depuis la base (et mis en cache)."""
+    user = await principal_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = await _load_user(user_id, db)
+    if user is None:
+        return None
+    return await principal_cache.set(user)
+
+
 async def get_current_user(
         db: Annotated[AsyncSession, Depends(get_db)],
         credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)
@@ -48,9 +100,14 @@ async def get_current_user(
     Cette dépendance :
     1. Extrait le token du header Authorization (via oauth2_scheme)
     2. Décode et valide le JWT
-    3. Récupère l'utilisateur depuis la base de données
+    3. Lit l'utilisateur et son profil dans le cache (principal_cache),
+       ou les charge depuis la base et les met en cache
     4. Retourne l'objet User
 
+    L'objet retourné est une copie détachée, propre à la requête : le
+    modifier ne change rien en base. Les routes qui écrivent sur
+    l'utilisateur ou son profil utilisent get_current_user_for_update.
+
     Args:
         token: Le JWT extrait automatiquement du header
         db: La session de base de données
@@ -61,35 +118,32 @@ async def get_current_user(
     Raises:
         HTTPException 401: Si le token est invalide ou l'utilisateur n'existe pas
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Impossible de valider les credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    user_id, _ = await _decode_token(credentials.credentials)
 
-    token = credentials.credentials
-
-    # 1. Décoder le token
-    payload: Optional[TokenPayload] = decode_access_token(token)
-
-    if payload is None:
-        raise credentials_exception
-
-    # 2. Extraire le user_id du payload
-    user_id: str = payload.sub
+    user = await _get_cached_user(user_id, db)
+    if user is None:
+        raise _credentials_exception()
 
-    if user_id is None:
-        raise credentials_exception
+    return user
 
-    # 3. Récupérer l'utilisateur depuis la DB
 
-    from app.models.auth import User
-    result = await db.execute(select(User).where(User.id == user_id).options(selectinload(User.profile)))
-    user = result.scalar_one_or_none()
+async def get_current_user_for_update(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)
+) -> User:
+    """
+    Comme get_current_user, mais toujours chargé depuis la base dans la
+    session de la requête : à utiliser par les routes qui modifient
+    l'utilisateur ou son profil (puis principal_cache.invalidate après
+    le commit).
 
+    Raises:
+        HTTPException 401: Si le token est invalide ou l'utilisateur n'existe pas
+    """
+    user_id, _ = await _decode_token(credentials.credentials)
+    user = await _load_user(user_id, db)
     if user is None:
-        raise credentials_exception
-
+        raise _credentials_exception()
     return user
 
 
@@ -135,15 +189,10 @@ async def get_current_user_optional(
         return None
 
     try:
-        payload = decode_access_token(token)
-        if payload is None:
-            return None
-
-        user_id = payload.sub
+        user_id, _ = await _decode_token(token)
 
-        # Requête
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
+        # Cache, sinon requête
+        user = await _get_cached_user(user_id, db)
 
         # On vérifie aussi s'il est actif pour être cohérent
         if user and not user.is_active:
@@ -155,6 +204,66 @@ async def get_current_user_optional(
         # En cas d'erreur quelconque (DB, décodage, etc.), on considère l'utilisateur comme invité
         return None
 
+
+# ============================================================
+# DÉPENDANCE : UTILISATEUR DEPUIS LES CLAIMS DU TOKEN (SANS BD)
+# ============================================================
+
+async def _claims_user(token: str, db: AsyncSession) -> UserClaims:
+    user_id, payload = await _decode_token(token)
+
+    if payload.has_user_claims:
+        return UserClaims(
+            id=user_id,
+            is_active=payload.is_active,
+            email_verified=payload.email_verified,
+            plan=payload.plan,
+        )
+
+    # Token sans claims (émis avant leur ajout, ou JWT_ACCESS_TOKEN_CLAIMS désactivé)
+    user = await _get_cached_user(user_id, db)
+    if user is None:
+        raise _credentials_exception()
+    return UserClaims(
+        id=user_id,
+        is_active=user.is_active,
+        email_verified=user.email_verified,
+        plan=await get_user_plan(user_id, db),
+    )
+
+
+async def get_claims_user(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)
+) -> UserClaims:
+    """
+    Authentifie à partir du token seul : signature, expiration, denylist
+    et claims signés (id, is_active, email_verified, plan). Aucune requête
+    en base pour un token émis avec ses claims.
+
+    Pour les routes en lecture qui n'ont besoin que de l'id et de ces
+    indicateurs ; les claims datent de l'émission du token.
+
+    Raises:
+        HTTPException 401: Si le token est invalide ou révoqué
+    """
+    return await _claims_user(credentials.credentials, db)
+
+
+async def get_claims_user_optional(
+        token: Annotated[Optional[str], Depends(oauth2_scheme_optional)],
+        db: Annotated[AsyncSession, Depends(get_db)]
+) -> Optional[UserClaims]:
+    """Comme get_claims_user, mais None si le token est absent, invalide ou le compte inactif."""
+    if token is None:
+        return None
+
+    try:
+        claims = await _claims_user(token, db)
+    except Exception:
+        return None
+    return claims if claims.is_active else None
+
 # ============================================================
 # DÉPENDANCE : UTILISATEUR VÉRIFIÉ (EMAIL VALIDÉ)
 # ============================================================
@@ -286,9 +395,6 @@ def get_pagination(
 # DÉPENDANCE : VALIDATION D'ID
 # ============================================================
 
-from uuid import UUID
-
-
 async def validate_uuid(id: str) -> UUID:
     """
     Valide qu'un ID est un UUID valide avec un message d'erreur.
@@ -318,6 +424,9 @@ Tu peux écrire:
 # Utilisateur courant (doit être connecté)
 CurrentUser = Annotated[dict, Depends(get_current_user)]
 
+# Utilisateur courant chargé dans la session (routes qui le modifient)
+CurrentUserForUpdate = Annotated[User, Depends(get_current_user_for_update)]
+
 # Utilisateur actif (connecté ET is_active=True)
 CurrentActiveUser = Annotated[dict, Depends(get_current_active_user)]
 
@@ -327,6 +436,12 @@ VerifiedUser = Annotated[dict, Depends(get_current_verified_user)]
 # Utilisateur optionnel (peut être None)
 OptionalUser = Annotated[Optional[dict], Depends(get_current_user_optional)]
 
+# Utilisateur décrit par les claims du token (aucune requête en base)
+ClaimsUser = Annotated[UserClaims, Depends(get_claims_user)]
+
+# Idem, optionnel (peut être None)
+OptionalClaimsUser = Annotated[Optional[UserClaims], Depends(get_claims_user_optional)]
+
 # Session de base de données
 DBSession = Annotated[AsyncSession, Depends(get_db)]
 
@@ -402,12 +517,9 @@ class CreditsChecker:
     def __init__(self, required_credits: int):
         self.required_credits = required_credits
 
-    async def __call__(self, current_user: CurrentUser, db: DBSession) -> UserCredits:
-        from sqlalchemy import select
-
-        stmt = select(UserCredits).where(UserCredits.user_id == current_user.id)
-        result = await db.execute(stmt)
-        credits = result.scalar_one_or_none()
+    async def __call__(self, current_user: CurrentUser, db: DBSession) -> CreditBalance:
+        # Solde en cache (invalidé à chaque écriture) : pas de requête en base si présent
+        credits = await get_cached_balance(current_user.id, db)
 
         if credits is None:
             raise HTTPException(
@@ -1,22 +1,71 @@
 
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Any
+from uuid import UUID, uuid4
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from app.config.settings import settings
+from collections import OrderedDict
 import hashlib
 import secrets
+import time
+
+
+try:
+    import argon2  # noqa: F401  (backend argon2 de passlib)
+    ARGON2_AVAILABLE = True
+except ImportError:  # dépendance optionnelle
+    ARGON2_AVAILABLE = False
 
 
 # ============================================================
-# CONFIGURATION DU HASHING (BCRYPT)
+# CONFIGURATION DU HASHING (BCRYPT / ARGON2)
 # ============================================================
 
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
+def build_password_context(
+        scheme: str = "bcrypt",
+        bcrypt_rounds: Optional[int] = None,
+        argon2_time_cost: Optional[int] = None,
+        argon2_memory_cost: Optional[int] = None,
+        argon2_parallelism: Optional[int] = None,
+) -> CryptContext:
+    """
+    Contexte passlib : `scheme` pour les nouveaux hashs, les autres schémas
+    restent vérifiables mais sont dépréciés.
+
+    Un paramètre de coût fixé est aussi le coût attendu : un hash calculé
+    avec un autre coût (ou un autre schéma) est signalé par needs_update
+    et recalculé à la prochaine connexion (voir verify_and_update_password).
+    Paramètres à None : valeurs par défaut de passlib.
+    """
+    if scheme == "argon2" and not ARGON2_AVAILABLE:
+        raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 mais le paquet argon2-cffi est absent")
+
+    schemes = [scheme] + [name for name in ("bcrypt", "argon2") if name != scheme]
+    if not ARGON2_AVAILABLE:
+        schemes.remove("argon2")
+
+    options = {}
+    if bcrypt_rounds is not None:
+        options["bcrypt__rounds"] = bcrypt_rounds
+    if argon2_time_cost is not None:
+        options["argon2__rounds"] = argon2_time_cost
+    if argon2_memory_cost is not None:
+        options["argon2__memory_cost"] = argon2_memory_cost
+    if argon2_parallelism is not None:
+        options["argon2__parallelism"] = argon2_parallelism
+
+    return CryptContext(schemes=schemes, default=scheme, deprecated="auto", **options)
+
+
+pwd_context = build_password_context(
+    scheme=settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    argon2_time_cost=settings.PASSWORD_ARGON2_TIME_COST,
+    argon2_memory_cost=settings.PASSWORD_ARGON2_MEMORY_COST,
+    argon2_parallelism=settings.PASSWORD_ARGON2_PARALLELISM,
 )
 
 # ============================================================
@@ -31,6 +80,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Vérifie le mot de passe et, s'il est correct mais que son hash n'est
+    plus au schéma ou au coût configurés, retourne aussi le nouveau hash.
+
+    Returns:
+        (valide, nouveau hash à enregistrer ou None)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 # ============================================================
 # [NOUVEAU] FONCTIONS DE HASHING DES TOKENS OPAQUES
 # ============================================================
@@ -57,11 +117,32 @@ def verify_token_hash(token: str, hashed_token: str) -> bool:
 # MODÈLES PYDANTIC POUR LES TOKENS
 # ============================================================
 
+# Claims de l'utilisateur embarqués dans l'access token
+USER_CLAIMS = ("is_active", "email_verified", "plan")
+
+
 class TokenPayload(BaseModel):
     sub: str  # user_id
     exp: datetime
     iat: datetime
     type: str = "access"
+    jti: Optional[str] = None  # identifiant du token (révocation)
+    # Claims de l'utilisateur (optionnels, voir build_user_claims)
+    is_active: Optional[bool] = None
+    email_verified: Optional[bool] = None
+    plan: Optional[str] = None
+
+    @property
+    def has_user_claims(self) -> bool:
+        return all(getattr(self, claim) is not None for claim in USER_CLAIMS)
+
+
+class UserClaims(BaseModel):
+    """Utilisateur tel que décrit par les claims signés de son access token."""
+    id: UUID
+    is_active: bool
+    email_verified: bool
+    plan: str
 
 
 class TokenResponse(BaseModel):
@@ -109,6 +190,8 @@ def create_access_token(
         - exp: expiration (maintenant + 30 min par défaut)
         - iat: timestamp de création
         - type: "access"
+        - jti: identifiant unique (révocation via la denylist)
+        - les claims de build_user_claims, si passés dans extra_data
     """
     # Calcul de l'expiration
     if expires_delta:
@@ -124,6 +207,7 @@ def create_access_token(
         "exp": expire,
         "iat": datetime.now(timezone.utc),
         "type": "access",
+        "jti": uuid4().hex,
     }
 
     # Ajout des données supplémentaires si fournies
@@ -140,6 +224,22 @@ def create_access_token(
     return encoded_jwt
 
 
+def build_user_claims(user, plan: str) -> dict[str, Any]:
+    """
+    Claims de l'utilisateur à embarquer dans l'access token (extra_data),
+    pour les routes qui s'authentifient sans base de données (ClaimsUser).
+
+    Ils reflètent l'utilisateur à l'émission du token : un changement
+    n'est visible qu'au token suivant (refresh), une révocation passe
+    par la denylist.
+    """
+    return {
+        "is_active": user.is_active,
+        "email_verified": user.email_verified,
+        "plan": plan,
+    }
+
+
 def create_refresh_token(
         subject: str,
         expires_delta: Optional[timedelta] = None
@@ -208,6 +308,80 @@ def create_tokens(user_id: str) -> TokenResponse:
     )
 
 
+# ============================================================
+# CACHE DES TOKENS DÉJÀ VÉRIFIÉS
+# ============================================================
+
+class VerifiedTokenCache:
+    """
+    LRU des access tokens déjà vérifiés : sha256(token) -> TokenPayload.
+
+    Un même access token est présenté à chaque requête pendant toute sa
+    durée de vie : seule la première présentation paie le décodage et la
+    vérification HMAC. Une entrée expire avec le token (exp). Les tokens
+    invalides ne sont jamais mis en cache ; la denylist est vérifiée
+    après, à chaque requête.
+
+    En mémoire, par worker.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, TokenPayload]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[TokenPayload]:
+        if self.max_entries <= 0:
+            return None
+
+        key = hash_token(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.expired += 1
+
+        self.misses += 1
+        return None
+
+    def set(self, token: str, payload: TokenPayload) -> None:
+        if self.max_entries <= 0:
+            return
+
+        key = hash_token(token)
+        self._entries[key] = (payload.exp.timestamp(), payload)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+verified_tokens = VerifiedTokenCache(max_entries=settings.JWT_VERIFIED_TOKEN_CACHE_MAX_ENTRIES)
+
+
 # ============================================================
 # DÉCODAGE ET VALIDATION DES TOKENS
 # ============================================================
@@ -227,6 +401,9 @@ def decode_access_token(token: str) -> Optional[TokenPayload]:
     2. Non expiré
     3. Type = "access"
 
+    Un token déjà vérifié est servi par verified_tokens jusqu'à son
+    expiration, sans nouveau décodage.
+
     Exemple:
         payload = decode_access_token(token)
         if payload:
@@ -234,6 +411,10 @@ def decode_access_token(token: str) -> Optional[TokenPayload]:
         else:
             raise HTTPException(401, "Token invalide")
     """
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(
             token,
@@ -250,9 +431,12 @@ def decode_access_token(token: str) -> Optional[TokenPayload]:
             sub=payload.get("sub"),
             exp=datetime.fromtimestamp(payload.get("exp"), tz=timezone.utc),
             iat=datetime.fromtimestamp(payload.get("iat"), tz=timezone.utc),
-            type=payload.get("type", "access")
+            type=payload.get("type", "access"),
+            jti=payload.get("jti"),
+            **{claim: payload.get(claim) for claim in USER_CLAIMS}
         )
 
+        verified_tokens.set(token, token_data)
         return token_data
 
     except JWTError:
@@ -6,6 +6,16 @@ from contextlib import asynccontextmanager
 
 
 from app.config.database import engine
+from app.services.backboard_service import backboard_service
+from app.services.backboard_thread_pool import thread_pool
+from app.services.write_behind import message_writer
+from app.services.credit_sweeper import reservation_sweeper
+from app.services.credit_cache import credit_cache
+from app.services.ledger_service import ledger_maintenance
+from app.services.refill_service import refill_job
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.token_denylist import token_denylist
 
 from app.routers import auth, profile, backboard, assessment, chat
 
@@ -20,10 +30,29 @@ async def lifespan(app: FastAPI):
     #await create_all_tables()
     print("Base de données connectée")
 
+    # Client HTTP partagé vers Backboard (keep-alive, HTTP/2)
+    await backboard_service.start()
+    await thread_pool.start()
+    await message_writer.start()
+    await reservation_sweeper.start()
+    await ledger_maintenance.start()
+    await refill_job.start()
+
     yield
 
     # Shutdown: Cleanup
 
+    # Écritures différées vidées avant la fermeture du pool BD
+    await refill_job.stop()
+    await ledger_maintenance.stop()
+    await reservation_sweeper.stop()
+    await message_writer.stop()
+    await thread_pool.stop()
+    password_hasher.shutdown()
+    await credit_cache.close()
+    await principal_cache.close()
+    await token_denylist.close()
+    await backboard_service.close()
     await engine.dispose()
 
 
@@ -0,0 +1,124 @@
+"""ledger partitions and balance snapshots
+
+Revision ID: a9c4e7b1d305
+Revises: f3a1c7d92b48
+Create Date: 2026-10-17 18:05:37.914420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e7b1d305'
+down_revision: Union[str, Sequence[str], None] = 'f3a1c7d92b48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, user_id, amount, type, description, session_id, stripe_payment_intent_id, balance_after, created_at"
+
+
+def create_ledger_table(primary_key: sa.PrimaryKeyConstraint, **kwargs) -> None:
+    op.create_table('credit_transactions',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM(name='credittransactiontypeenum', create_type=False), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('session_id', sa.UUID(), nullable=True),
+    sa.Column('stripe_payment_intent_id', sa.String(length=100), nullable=True),
+    sa.Column('balance_after', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['mentoring_sessions.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    primary_key,
+    **kwargs
+    )
+    op.create_index('idx_credit_trans_created', 'credit_transactions', ['created_at'], unique=False, postgresql_ops={'created_at': 'DESC'})
+    op.create_index(op.f('ix_credit_transactions_id'), 'credit_transactions', ['id'], unique=False)
+    op.create_index(op.f('ix_credit_transactions_type'), 'credit_transactions', ['type'], unique=False)
+    op.create_index(op.f('ix_credit_transactions_user_id'), 'credit_transactions', ['user_id'], unique=False)
+
+
+def drop_ledger_indexes(table: str) -> None:
+    op.drop_index(op.f('ix_credit_transactions_user_id'), table_name=table)
+    op.drop_index(op.f('ix_credit_transactions_type'), table_name=table)
+    op.drop_index(op.f('ix_credit_transactions_id'), table_name=table)
+    op.drop_index('idx_credit_trans_created', table_name=table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('credit_balance_snapshots',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('transactions_count', sa.Integer(), nullable=False),
+    sa.Column('snapshot_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_credit_snapshots_user_at', 'credit_balance_snapshots', ['user_id', 'snapshot_at'], unique=True, postgresql_ops={'snapshot_at': 'DESC'})
+    op.create_index(op.f('ix_credit_balance_snapshots_id'), 'credit_balance_snapshots', ['id'], unique=False)
+
+    # Ledger partitionné par mois : la table existante est recopiée dans la
+    # nouvelle (clé primaire (created_at, id), exigée par le partitionnement).
+    # La copie verrouille le ledger : à passer hors heures de pointe.
+    drop_ledger_indexes('credit_transactions')
+    op.rename_table('credit_transactions', 'credit_transactions_legacy')
+    op.execute(
+        "ALTER TABLE credit_transactions_legacy "
+        "RENAME CONSTRAINT credit_transactions_pkey TO credit_transactions_legacy_pkey"
+    )
+
+    create_ledger_table(
+        sa.PrimaryKeyConstraint('created_at', 'id'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('idx_credit_trans_user_created', 'credit_transactions', ['user_id', 'created_at'], unique=False)
+
+    # Une partition par mois, de la plus ancienne transaction à 3 mois d'avance
+    # (ensuite tenues à jour par services/ledger_service.py), plus DEFAULT
+    op.execute("""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM credit_transactions_legacy), now()
+            ) AT TIME ZONE 'UTC')::date;
+            last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF credit_transactions FOR VALUES FROM (%L) TO (%L)',
+                    'credit_transactions_p' || to_char(month, 'YYYY_MM'),
+                    month::timestamp AT TIME ZONE 'UTC',
+                    (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                month := (month + interval '1 month')::date;
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE credit_transactions_default PARTITION OF credit_transactions DEFAULT")
+
+    op.execute(f"INSERT INTO credit_transactions ({COLUMNS}) SELECT {COLUMNS} FROM credit_transactions_legacy")
+    op.drop_table('credit_transactions_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Les partitions déjà détachées par l'archivage ne sont pas réintégrées
+    op.drop_index('idx_credit_trans_user_created', table_name='credit_transactions')
+    drop_ledger_indexes('credit_transactions')
+    op.rename_table('credit_transactions', 'credit_transactions_partitioned')
+
+    create_ledger_table(sa.PrimaryKeyConstraint('id'))
+    op.execute(f"INSERT INTO credit_transactions ({COLUMNS}) SELECT {COLUMNS} FROM credit_transactions_partitioned")
+    op.execute("DROP TABLE credit_transactions_partitioned CASCADE")
+
+    op.drop_index(op.f('ix_credit_balance_snapshots_id'), table_name='credit_balance_snapshots')
+    op.drop_index('idx_credit_snapshots_user_at', table_name='credit_balance_snapshots')
+    op.drop_table('credit_balance_snapshots')
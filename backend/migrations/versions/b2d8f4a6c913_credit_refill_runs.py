@@ -0,0 +1,51 @@
+"""credit refill runs
+
+Revision ID: b2d8f4a6c913
+Revises: a9c4e7b1d305
+Create Date: 2026-10-17 19:22:48.530176
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d8f4a6c913'
+down_revision: Union[str, Sequence[str], None] = 'a9c4e7b1d305'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('credit_refill_runs',
+    sa.Column('run_date', sa.Date(), nullable=False),
+    sa.Column('cursor', sa.UUID(), nullable=True),
+    sa.Column('users_refilled', sa.Integer(), nullable=False),
+    sa.Column('credits_granted', sa.Integer(), nullable=False),
+    sa.Column('batches', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_date')
+    )
+    op.create_index(op.f('ix_credit_refill_runs_id'), 'credit_refill_runs', ['id'], unique=False)
+    # Job de recharge : parcours keyset des abonnements rechargeables
+    op.create_index(
+        'idx_user_subscriptions_refillable',
+        'user_subscriptions',
+        ['user_id'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('ACTIVE', 'TRIALING')")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_user_subscriptions_refillable', table_name='user_subscriptions')
+    op.drop_index(op.f('ix_credit_refill_runs_id'), table_name='credit_refill_runs')
+    op.drop_table('credit_refill_runs')
@@ -0,0 +1,41 @@
+"""message content and keyset index
+
+Revision ID: c41f7a2b9d10
+Revises: 8bcf52b1c040
+Create Date: 2026-10-17 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a2b9d10'
+down_revision: Union[str, Sequence[str], None] = '8bcf52b1c040'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Contenu stocké localement : l'historique n'est plus relu depuis Backboard.
+    # Nullable : les messages antérieurs sont complétés par la réconciliation.
+    op.add_column(
+        "session_messages",
+        sa.Column("content", sa.Text(), nullable=True)
+    )
+    # Pagination keyset de l'historique d'une session
+    op.create_index(
+        "idx_messages_session_created",
+        "session_messages",
+        ["session_id", "created_at", "id"],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_messages_session_created", table_name="session_messages")
+    op.drop_column("session_messages", "content")
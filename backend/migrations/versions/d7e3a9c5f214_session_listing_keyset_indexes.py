@@ -0,0 +1,59 @@
+"""session listing keyset indexes
+
+Revision ID: d7e3a9c5f214
+Revises: c41f7a2b9d10
+Create Date: 2026-10-17 14:03:52.518904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e3a9c5f214'
+down_revision: Union[str, Sequence[str], None] = 'c41f7a2b9d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Index créés sans bloquer les écritures sur mentoring_sessions
+    with op.get_context().autocommit_block():
+        # Liste paginée (keyset) filtrée par statut
+        op.create_index(
+            "idx_sessions_user_status_last_message",
+            "mentoring_sessions",
+            ["user_id", "status", sa.text("last_message_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        # Liste paginée (keyset) sans filtre
+        op.create_index(
+            "idx_sessions_user_last_message",
+            "mentoring_sessions",
+            ["user_id", sa.text("last_message_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_sessions_user_last_message",
+            table_name="mentoring_sessions",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+        op.drop_index(
+            "idx_sessions_user_status_last_message",
+            table_name="mentoring_sessions",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
@@ -0,0 +1,79 @@
+"""conversation full text search
+
+Revision ID: e5b8d2f61a37
+Revises: d7e3a9c5f214
+Create Date: 2026-10-17 15:27:09.861245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8d2f61a37'
+down_revision: Union[str, Sequence[str], None] = 'd7e3a9c5f214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def search_vector_expression(column: str) -> str:
+    # Copie figée de app.models.mentoring.search_vector_expression
+    return (
+        f"to_tsvector('french'::regconfig, coalesce({column}, '')) || "
+        f"to_tsvector('english'::regconfig, coalesce({column}, ''))"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Colonnes générées (STORED) : calculées par Postgres à l'INSERT / UPDATE.
+    # L'ajout réécrit les tables : à passer hors heures de pointe.
+    op.add_column(
+        "session_messages",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(search_vector_expression("content"), persisted=True),
+            nullable=True
+        )
+    )
+    op.add_column(
+        "mentoring_sessions",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(search_vector_expression("title"), persisted=True),
+            nullable=True
+        )
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_messages_search",
+            "session_messages",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.create_index(
+            "idx_sessions_search",
+            "mentoring_sessions",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_sessions_search", table_name="mentoring_sessions")
+    op.drop_index("idx_messages_search", table_name="session_messages")
+    op.drop_column("mentoring_sessions", "search_vector")
+    op.drop_column("session_messages", "search_vector")
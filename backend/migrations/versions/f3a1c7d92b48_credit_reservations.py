@@ -0,0 +1,57 @@
+"""credit reservations
+
+Revision ID: f3a1c7d92b48
+Revises: e5b8d2f61a37
+Create Date: 2026-10-17 16:41:52.207318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a1c7d92b48'
+down_revision: Union[str, Sequence[str], None] = 'e5b8d2f61a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('credit_reservations',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('session_id', sa.UUID(), nullable=True),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('bonus_amount', sa.Integer(), nullable=False),
+    sa.Column('settled_amount', sa.Integer(), nullable=True),
+    sa.Column('status', sa.Enum('HELD', 'SETTLED', 'RELEASED', 'EXPIRED', name='creditreservationstatusenum'), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('closed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['mentoring_sessions.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Sweeper : réservations encore bloquées, par échéance
+    op.create_index(
+        'idx_credit_reservations_held_expires',
+        'credit_reservations',
+        ['expires_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'HELD'")
+    )
+    op.create_index(op.f('ix_credit_reservations_id'), 'credit_reservations', ['id'], unique=False)
+    op.create_index(op.f('ix_credit_reservations_user_id'), 'credit_reservations', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_credit_reservations_user_id'), table_name='credit_reservations')
+    op.drop_index(op.f('ix_credit_reservations_id'), table_name='credit_reservations')
+    op.drop_index('idx_credit_reservations_held_expires', table_name='credit_reservations')
+    op.drop_table('credit_reservations')
+    sa.Enum(name='creditreservationstatusenum').drop(op.get_bind(), checkfirst=False)
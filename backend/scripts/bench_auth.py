@@ -0,0 +1,103 @@
+"""
+Micro-benchmark du coût d'authentification par requête
+======================================================
+Mesure le temps passé à authentifier une requête à partir d'un access
+token déjà émis (cas de toutes les requêtes sauf la première d'une
+session), avec et sans le cache des tokens vérifiés (verified_tokens).
+
+Deux niveaux :
+    decode   decode_access_token seul (décodage JWT + HMAC)
+    claims   dépendance get_claims_user complète (décodage, denylist,
+             claims), sans base de données
+
+Usage:
+    python -m scripts.bench_auth --iterations 20000 --tokens 100
+
+--tokens simule autant d'utilisateurs distincts qui réutilisent chacun
+leur token, présentés à tour de rôle.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.utils.dependencies import get_claims_user
+from app.utils.security import build_user_claims, create_access_token, decode_access_token, verified_tokens
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile par rang le plus proche (values triées)."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def make_tokens(count: int) -> list[str]:
+    user = SimpleNamespace(is_active=True, email_verified=True)
+    return [
+        create_access_token(subject=str(uuid.uuid4()), extra_data=build_user_claims(user, "pro"))
+        for _ in range(count)
+    ]
+
+
+async def run_level(level: str, tokens: list[str], iterations: int) -> list[float]:
+    """Durées (µs) de chaque authentification."""
+    timings = []
+    for index in range(iterations):
+        token = tokens[index % len(tokens)]
+        started = time.perf_counter()
+        if level == "decode":
+            decode_access_token(token)
+        else:
+            await get_claims_user(
+                db=None,
+                credentials=HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+            )
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> str:
+    timings = sorted(timings)
+    return (
+        f"{label:<22} moy={statistics.fmean(timings):7.1f} µs  "
+        f"p50={percentile(timings, 50):7.1f}  p99={percentile(timings, 99):7.1f}  "
+        f"({1_000_000 / statistics.fmean(timings):,.0f} auth/s)"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    tokens = make_tokens(args.tokens)
+    max_entries = verified_tokens.max_entries or args.tokens
+
+    print(f"{args.iterations} authentifications, {args.tokens} token(s) distinct(s)")
+    for level in ("decode", "claims"):
+        verified_tokens.max_entries = 0
+        uncached = await run_level(level, tokens, args.iterations)
+
+        verified_tokens.max_entries = max_entries
+        verified_tokens.clear()
+        cached = await run_level(level, tokens, args.iterations)
+
+        print(report(f"{level} sans cache", uncached))
+        print(report(f"{level} avec cache", cached))
+        print(f"{'gain':<22} x{statistics.fmean(uncached) / statistics.fmean(cached):.1f}")
+    print(f"Cache : {verified_tokens.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark de l'authentification par access token")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
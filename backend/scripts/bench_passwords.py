@@ -0,0 +1,117 @@
+"""
+Micro-benchmark du hachage des mots de passe
+============================================
+Compare, à concurrence égale, bcrypt appelé directement dans la boucle
+d'événements (comportement historique des routes /auth) et bcrypt passé
+par l'exécuteur borné (app.services.password_hasher).
+
+Pendant chaque scénario, une tâche témoin se réveille toutes les
+--tick-ms millisecondes : son retard mesure le blocage de la boucle,
+c'est-à-dire la latence ajoutée à toutes les autres requêtes du worker.
+
+Usage:
+    python -m scripts.bench_passwords --operations 200 --concurrency 20 --workers 4
+
+Scénarios:
+    inline    verify_password() appelé dans la coroutine
+    executor  await PasswordHasher.verify() (threads ou processus)
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services.password_hasher import PasswordHasher
+from app.utils.security import hash_password, verify_password
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile par rang le plus proche (values triées)."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+async def watch_loop(tick: float, lags: list[float], stop: asyncio.Event) -> None:
+    """Retard (ms) de chaque réveil de la boucle par rapport à l'attendu."""
+    while not stop.is_set():
+        expected = time.perf_counter() + tick
+        await asyncio.sleep(tick)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+async def run_scenario(name: str, verify, args, password: str, hashed: str) -> str:
+    latencies: list[float] = []
+    lags: list[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(args.operations):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            assert await verify(password, hashed)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(args.tick_ms / 1000, lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+
+    latencies.sort()
+    lags.sort()
+    return "\n".join([
+        f"Scénario      : {name}",
+        f"Opérations    : {len(latencies)} en {elapsed:.2f}s ({len(latencies) / elapsed:.1f} ops/s)",
+        "Latence (ms)  : "
+        f"p50={percentile(latencies, 50):.1f} p90={percentile(latencies, 90):.1f} "
+        f"p99={percentile(latencies, 99):.1f} max={latencies[-1]:.1f} moy={statistics.fmean(latencies):.1f}",
+        "Boucle (ms)   : "
+        f"réveils={len(lags)} p50={percentile(lags, 50):.1f} p99={percentile(lags, 99):.1f} "
+        f"max={lags[-1] if lags else 0.0:.1f}",
+    ])
+
+
+async def run(args: argparse.Namespace) -> None:
+    password = "correct horse battery staple"
+    hashed = hash_password(password)
+
+    async def inline_verify(plain: str, hashed_password: str) -> bool:
+        return verify_password(plain, hashed_password)
+
+    hasher = PasswordHasher(workers=args.workers, max_queue=args.operations, kind=args.executor)
+    try:
+        if args.scenario in ("inline", "all"):
+            print(await run_scenario("inline", inline_verify, args, password, hashed))
+            print()
+        if args.scenario in ("executor", "all"):
+            name = f"executor ({args.executor}, {hasher.workers} workers)"
+            print(await run_scenario(name, hasher.verify, args, password, hashed))
+            print(f"Métriques     : {hasher.stats()}")
+    finally:
+        hasher.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark du hachage bcrypt")
+    parser.add_argument("--scenario", choices=["inline", "executor", "all"], default="all")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--tick-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Calibration du coût de hachage des mots de passe
+================================================
+Mesure, sur l'hôte de déploiement, la latence de vérification de bcrypt
+et d'argon2 pour une grille de paramètres, et retient le réglage le plus
+coûteux (donc le plus résistant) dont la latence reste sous la cible.
+
+Les vérifications tournent sur --concurrency threads simultanés (défaut :
+PASSWORD_HASH_WORKERS), comme dans l'exécuteur de l'API : la mesure tient
+compte du partage des cœurs sous charge.
+
+Les contextes sont construits par build_password_context, exactement comme
+celui de l'API. Les hashs existants sont recalculés au nouveau coût à la
+connexion suivante de chaque utilisateur.
+
+Usage:
+    python -m scripts.calibrate_password_hash --target-ms 250
+    python -m scripts.calibrate_password_hash --scheme argon2 --target-ms 150 --percentile 95
+
+Sortie : tableau des mesures, puis les variables d'environnement à
+reporter dans le .env (PASSWORD_HASH_SCHEME, PASSWORD_BCRYPT_ROUNDS, ...).
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from app.config.settings import settings
+from app.utils.security import ARGON2_AVAILABLE, build_password_context
+
+PASSWORD = "correct horse battery staple"
+
+BCRYPT_ROUNDS = range(10, 17)
+ARGON2_MEMORY_COSTS = (19 * 1024, 46 * 1024, 64 * 1024, 128 * 1024, 256 * 1024)  # KiB
+ARGON2_TIME_COSTS = range(1, 7)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile par rang le plus proche (values triées)."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def measure(params: dict, samples: int, concurrency: int, pct: float) -> float:
+    """Latence (ms, au percentile pct) d'une vérification avec ces paramètres."""
+    context = build_password_context(**params)
+    hashed = context.hash(PASSWORD)
+
+    def verify(_) -> float:
+        started = time.perf_counter()
+        if not context.verify(PASSWORD, hashed):
+            raise RuntimeError("Vérification en échec")
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = sorted(executor.map(verify, range(samples)))
+    return percentile(timings, pct)
+
+
+def bcrypt_candidates() -> Iterator[list[dict]]:
+    """Un seul axe : le coût croît avec rounds."""
+    yield [{"scheme": "bcrypt", "bcrypt_rounds": rounds} for rounds in BCRYPT_ROUNDS]
+
+
+def argon2_candidates(parallelism: int) -> Iterator[list[dict]]:
+    """Une série par quantité de mémoire, le coût croît avec time_cost."""
+    for memory_cost in ARGON2_MEMORY_COSTS:
+        yield [
+            {
+                "scheme": "argon2",
+                "argon2_memory_cost": memory_cost,
+                "argon2_time_cost": time_cost,
+                "argon2_parallelism": parallelism,
+            }
+            for time_cost in ARGON2_TIME_COSTS
+        ]
+
+
+def strength(params: dict) -> tuple:
+    if params["scheme"] == "bcrypt":
+        return (params["bcrypt_rounds"],)
+    # À coût égal, la mémoire résiste mieux au matériel dédié
+    return (params["argon2_memory_cost"] * params["argon2_time_cost"], params["argon2_memory_cost"])
+
+
+def calibrate(series: Iterator[list[dict]], args: argparse.Namespace) -> Optional[dict]:
+    """Meilleur réglage sous la cible (None si même le plus faible la dépasse)."""
+    best = None
+    for candidates in series:
+        for params in candidates:
+            latency = measure(params, args.samples, args.concurrency, args.percentile)
+            fits = latency <= args.target_ms
+            label = ", ".join(f"{key}={value}" for key, value in params.items() if key != "scheme")
+            print(f"  {params['scheme']:<7} {label:<70} p{args.percentile:g}={latency:8.1f} ms {'ok' if fits else '-'}")
+            if not fits:
+                # Coût croissant dans la série : inutile d'aller plus loin
+                break
+            if best is None or strength(params) > strength(best):
+                best = params
+    return best
+
+
+def env_lines(params: dict) -> list[str]:
+    lines = [f"PASSWORD_HASH_SCHEME={params['scheme']}"]
+    for key, value in params.items():
+        if key != "scheme":
+            lines.append(f"PASSWORD_{key.upper()}={value}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibration du coût de hachage des mots de passe")
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2", "all"], default="all")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Latence de vérification visée")
+    parser.add_argument("--percentile", type=float, default=90.0)
+    parser.add_argument("--samples", type=int, default=20, help="Vérifications mesurées par réglage")
+    parser.add_argument("--concurrency", type=int, default=settings.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--parallelism", type=int, default=1, help="Lanes argon2")
+    args = parser.parse_args()
+
+    if args.scheme == "argon2" and not ARGON2_AVAILABLE:
+        parser.error("argon2-cffi n'est pas installé")
+
+    print(f"Schéma actuel : {settings.PASSWORD_HASH_SCHEME}")
+    print(f"Cible : p{args.percentile:g} <= {args.target_ms:g} ms, {args.concurrency} vérification(s) simultanée(s)")
+    results = {}
+    if args.scheme in ("bcrypt", "all"):
+        results["bcrypt"] = calibrate(bcrypt_candidates(), args)
+    if args.scheme in ("argon2", "all") and ARGON2_AVAILABLE:
+        results["argon2"] = calibrate(argon2_candidates(args.parallelism), args)
+
+    print()
+    for scheme, params in results.items():
+        if params is None:
+            print(f"{scheme} : aucun réglage sous la cible")
+            continue
+        print(f"{scheme} :")
+        for line in env_lines(params):
+            print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Faux serveur Backboard.io pour les benchmarks hors-ligne
+=======================================================
+Implémente les endpoints utilisés par BackboardService (threads, messages,
+streaming SSE, résultats de tools) avec latence, débit de tokens et
+injection d'erreurs configurables.
+
+Lancement:
+    python -m scripts.fake_backboard --port 9000 --latency-ms 300 --tokens-per-second 80
+
+Puis, côté API:
+    BACKBOARD_API_URL=http://localhost:9000/api uvicorn main:app
+
+La configuration peut être modifiée à chaud:
+    curl -X POST localhost:9000/_config -H 'Content-Type: application/json' -d '{"error_rate": 0.2}'
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+config = {
+    # Délai avant le premier octet (ms) + gigue aléatoire
+    "latency_ms": float(os.getenv("FAKE_BACKBOARD_LATENCY_MS", "200")),
+    "jitter_ms": float(os.getenv("FAKE_BACKBOARD_JITTER_MS", "50")),
+    # Débit de génération et taille des réponses
+    "tokens_per_second": float(os.getenv("FAKE_BACKBOARD_TOKENS_PER_SECOND", "60")),
+    "response_tokens": int(os.getenv("FAKE_BACKBOARD_RESPONSE_TOKENS", "120")),
+    # Injection d'erreurs
+    "error_rate": float(os.getenv("FAKE_BACKBOARD_ERROR_RATE", "0")),
+    "error_status": int(os.getenv("FAKE_BACKBOARD_ERROR_STATUS", "503")),
+    # Proportion de réponses qui demandent des tools
+    "tool_call_rate": float(os.getenv("FAKE_BACKBOARD_TOOL_CALL_RATE", "0")),
+}
+
+started_at = time.monotonic()
+
+stats = {
+    "requests": 0,
+    "errors_injected": 0,
+    "streams": 0,
+    "tool_rounds": 0,
+}
+
+# thread_id -> {"metadata": {...}, "messages": [...]}
+threads: dict[str, dict] = {}
+
+WORDS = (
+    "une closure capture les variables de sa portée englobante et les garde "
+    "vivantes après le retour de la fonction asyncio gather lance les "
+    "coroutines en parallèle et attend leurs résultats"
+).split()
+
+
+app = FastAPI(title="Fake Backboard", version="1.0.0")
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _simulate_latency() -> None:
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+
+def _maybe_error() -> Response | None:
+    stats["requests"] += 1
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=config["error_status"],
+            content={"detail": "Injected error"},
+        )
+    return None
+
+
+async def _read_form(request: Request) -> dict:
+    """Lit un corps application/x-www-form-urlencoded (sans python-multipart)."""
+    body = (await request.body()).decode("utf-8")
+    return {key: values[-1] for key, values in parse_qs(body).items()}
+
+
+def _tokens(count: int) -> list[str]:
+    return [random.choice(WORDS) + " " for _ in range(count)]
+
+
+def _tool_calls() -> list[dict]:
+    return [
+        {
+            "id": f"call_{uuid4().hex[:8]}",
+            "type": "function",
+            "function": {
+                "name": "suggest_exercise",
+                "arguments": json.dumps({"topic_slug": "variables", "difficulty": "easy"}),
+            },
+        },
+        {
+            "id": f"call_{uuid4().hex[:8]}",
+            "type": "function",
+            "function": {
+                "name": "check_code",
+                "arguments": json.dumps({"code": "x == 1", "language": "javascript"}),
+            },
+        },
+    ]
+
+
+async def _assistant_message(thread_id: str, content: str) -> dict:
+    """Génère une réponse complète en respectant le débit de tokens."""
+    tokens = _tokens(config["response_tokens"])
+    await asyncio.sleep(len(tokens) / config["tokens_per_second"])
+
+    message = {
+        "message_id": str(uuid4()),
+        "role": "assistant",
+        "content": "".join(tokens).strip(),
+        "input_tokens": len(content.split()),
+        "output_tokens": len(tokens),
+        "model": "claude",
+        "created_at": _now(),
+    }
+    threads.setdefault(thread_id, {"metadata": {}, "messages": []})["messages"].append(message)
+    return message
+
+
+# ============================================================
+# ENDPOINTS BACKBOARD
+# ============================================================
+
+@app.post("/api/assistants/{assistant_id}/threads")
+async def create_thread(assistant_id: str, request: Request):
+    if error := _maybe_error():
+        return error
+    await _simulate_latency()
+
+    body = await request.json() if await request.body() else {}
+    thread_id = str(uuid4())
+    threads[thread_id] = {"metadata": body.get("metadata", {}), "messages": []}
+    return {"thread_id": thread_id, "created_at": _now()}
+
+
+@app.post("/api/threads/{thread_id}/messages")
+async def post_message(thread_id: str, request: Request):
+    if error := _maybe_error():
+        return error
+
+    form = await _read_form(request)
+    content = form.get("content", "")
+    thread = threads.setdefault(thread_id, {"metadata": {}, "messages": []})
+
+    # Ancien format : résultat de tool posté comme message
+    if form.get("role") == "tool":
+        await _simulate_latency()
+        return await _assistant_message(thread_id, content)
+
+    thread["messages"].append({
+        "message_id": str(uuid4()),
+        "role": "user",
+        "content": content,
+        "created_at": _now(),
+    })
+
+    if form.get("stream", "false").lower() == "true":
+        stats["streams"] += 1
+        return StreamingResponse(_stream(thread_id, content), media_type="text/event-stream")
+
+    await _simulate_latency()
+
+    if config["tool_call_rate"] and random.random() < config["tool_call_rate"]:
+        return {
+            "status": "REQUIRES_ACTION",
+            "run_id": str(uuid4()),
+            "content": None,
+            "tool_calls": _tool_calls(),
+            "input_tokens": len(content.split()),
+            "output_tokens": 20,
+            "model": "claude",
+        }
+
+    return await _assistant_message(thread_id, content)
+
+
+async def _stream(thread_id: str, content: str):
+    await _simulate_latency()
+
+    tokens = _tokens(config["response_tokens"])
+    delay = 1 / config["tokens_per_second"]
+
+    for index, token in enumerate(tokens):
+        payload = json.dumps({"type": "content_streaming", "content": token})
+        yield f"id: {index}\ndata: {payload}\n\n".encode("utf-8")
+        await asyncio.sleep(delay)
+
+    usage = json.dumps({"input_tokens": len(content.split()), "output_tokens": len(tokens)})
+    yield f"event: usage\ndata: {usage}\n\n".encode("utf-8")
+    yield b"data: [DONE]\n\n"
+
+    threads[thread_id]["messages"].append({
+        "message_id": str(uuid4()),
+        "role": "assistant",
+        "content": "".join(tokens).strip(),
+        "output_tokens": len(tokens),
+        "created_at": _now(),
+    })
+
+
+@app.get("/api/threads/{thread_id}/messages")
+async def get_messages(thread_id: str, limit: int = 50):
+    if error := _maybe_error():
+        return error
+    await _simulate_latency()
+
+    messages = threads.get(thread_id, {"messages": []})["messages"]
+    return {"messages": messages[-limit:]}
+
+
+@app.delete("/api/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    if error := _maybe_error():
+        return error
+    await _simulate_latency()
+
+    threads.pop(thread_id, None)
+    return Response(status_code=204)
+
+
+@app.patch("/api/threads/{thread_id}")
+async def update_thread(thread_id: str, request: Request):
+    if error := _maybe_error():
+        return error
+    await _simulate_latency()
+
+    body = await request.json()
+    thread = threads.setdefault(thread_id, {"metadata": {}, "messages": []})
+    thread["metadata"].update(body.get("metadata", {}))
+    return {"thread_id": thread_id, "metadata": thread["metadata"]}
+
+
+@app.post("/api/threads/{thread_id}/runs/{run_id}/submit-tool-outputs")
+@app.post("/api/threads/{thread_id}/tool-outputs")
+async def submit_tool_outputs(thread_id: str, request: Request, run_id: str = None):
+    if error := _maybe_error():
+        return error
+    await _simulate_latency()
+
+    stats["tool_rounds"] += 1
+    body = await request.json()
+    summary = f"{len(body.get('tool_outputs', []))} tools"
+    return await _assistant_message(thread_id, summary)
+
+
+# ============================================================
+# CONTRÔLE DU FAUX SERVEUR
+# ============================================================
+
+@app.get("/_config")
+async def get_config():
+    return config
+
+
+@app.post("/_config")
+async def update_config(request: Request):
+    updates = await request.json()
+    for key, value in updates.items():
+        if key in config:
+            config[key] = type(config[key])(value)
+    return config
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {**stats, "threads": len(threads), "uptime_seconds": round(time.monotonic() - started_at, 1)}
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Faux serveur Backboard.io")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"])
+    parser.add_argument("--response-tokens", type=int, default=config["response_tokens"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--error-status", type=int, default=config["error_status"])
+    parser.add_argument("--tool-call-rate", type=float, default=config["tool_call_rate"])
+    args = parser.parse_args()
+
+    for key in config:
+        config[key] = getattr(args, key)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
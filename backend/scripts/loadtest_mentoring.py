@@ -0,0 +1,198 @@
+"""
+Load test des endpoints /mentoring
+==================================
+Pilote create_session, send_message et send_message_stream à une
+concurrence cible et rapporte débit et percentiles de latence.
+
+À utiliser contre une API dont BACKBOARD_API_URL pointe vers le faux
+serveur (scripts/fake_backboard.py) pour mesurer le chemin chat hors-ligne.
+
+Usage:
+    python -m scripts.loadtest_mentoring --email bench@example.com --password secret \\
+        --concurrency 50 --requests 500 --scenario send_message
+
+Scénarios:
+    create_session  POST /mentoring/sessions
+    send_message    POST /mentoring/sessions/{id}/messages
+    stream          POST /mentoring/sessions/{id}/messages/stream
+                    (rapporte aussi le time-to-first-byte)
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Optional
+
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile par rang le plus proche (values triées)."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class Recorder:
+    """Collecte les latences (ms) et les statuts d'un scénario."""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.ttfb: list[float] = []
+        self.statuses: dict[int, int] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, started: float, status: Optional[int] = None, ttfb: Optional[float] = None) -> None:
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        if ttfb is not None:
+            self.ttfb.append(ttfb * 1000)
+        if status is not None:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def error(self, exc: Exception) -> None:
+        name = exc.__class__.__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, scenario: str, elapsed: float, concurrency: int) -> str:
+        latencies = sorted(self.latencies)
+        lines = [
+            f"Scénario      : {scenario}",
+            f"Concurrence   : {concurrency}",
+            f"Requêtes      : {len(latencies)} en {elapsed:.2f}s",
+            f"Débit         : {len(latencies) / elapsed:.1f} req/s" if elapsed else "Débit         : n/a",
+            f"Statuts       : {dict(sorted(self.statuses.items()))}",
+        ]
+        if self.errors:
+            lines.append(f"Erreurs       : {self.errors}")
+        if latencies:
+            lines.append(
+                "Latence (ms)  : "
+                f"min={latencies[0]:.1f} p50={percentile(latencies, 50):.1f} "
+                f"p90={percentile(latencies, 90):.1f} p99={percentile(latencies, 99):.1f} "
+                f"max={latencies[-1]:.1f} moy={statistics.fmean(latencies):.1f}"
+            )
+        if self.ttfb:
+            ttfb = sorted(self.ttfb)
+            lines.append(
+                "TTFB (ms)     : "
+                f"p50={percentile(ttfb, 50):.1f} p90={percentile(ttfb, 90):.1f} "
+                f"p99={percentile(ttfb, 99):.1f}"
+            )
+        return "\n".join(lines)
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def create_session(client: httpx.AsyncClient, recorder: Recorder, message: str) -> Optional[str]:
+    started = time.perf_counter()
+    try:
+        response = await client.post("/mentoring/sessions", json={"initial_message": message})
+    except httpx.HTTPError as e:
+        recorder.error(e)
+        return None
+    recorder.record(started, response.status_code)
+    if response.status_code == 201:
+        return response.json()["session"]["id"]
+    return None
+
+
+async def send_message(client: httpx.AsyncClient, recorder: Recorder, session_id: str, message: str) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"/mentoring/sessions/{session_id}/messages", json={"content": message})
+    except httpx.HTTPError as e:
+        recorder.error(e)
+        return
+    recorder.record(started, response.status_code)
+
+
+async def send_message_stream(client: httpx.AsyncClient, recorder: Recorder, session_id: str, message: str) -> None:
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        async with client.stream(
+                "POST",
+                f"/mentoring/sessions/{session_id}/messages/stream",
+                json={"content": message},
+        ) as response:
+            async for _ in response.aiter_raw():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        recorder.error(e)
+        return
+    recorder.record(started, response.status_code, ttfb)
+
+
+async def run(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        token = args.token or await login(client, args.email, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        # Sessions de travail pour les scénarios send_message / stream
+        session_ids: list[str] = []
+        if args.scenario != "create_session":
+            warmup = Recorder()
+            pool_size = args.sessions or args.concurrency
+            created = await asyncio.gather(
+                *(create_session(client, warmup, args.message) for _ in range(pool_size))
+            )
+            session_ids = [session_id for session_id in created if session_id]
+            if not session_ids:
+                raise SystemExit(f"Impossible de créer les sessions de travail: {warmup.statuses} {warmup.errors}")
+
+        recorder = Recorder()
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for index in range(args.requests):
+            queue.put_nowait(index)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if args.scenario == "create_session":
+                    await create_session(client, recorder, args.message)
+                else:
+                    session_id = session_ids[index % len(session_ids)]
+                    if args.scenario == "stream":
+                        await send_message_stream(client, recorder, session_id, args.message)
+                    else:
+                        await send_message(client, recorder, session_id, args.message)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        print(recorder.report(args.scenario, elapsed, args.concurrency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test des endpoints /mentoring")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", help="Access token (sinon --email/--password)")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--scenario", choices=["create_session", "send_message", "stream"], default="send_message")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--sessions", type=int, help="Nombre de sessions de travail (défaut: concurrence)")
+    parser.add_argument("--message", default="C'est quoi une closure en JavaScript ?")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    if not args.token and not (args.email and args.password):
+        parser.error("--token ou --email/--password requis")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()